@@ -1,30 +1,151 @@
 import os
-from sqlalchemy import create_engine
+import asyncpg
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
+from app.utils.wkb import ewkb_to_geojson, geojson_to_ewkb
+
 load_dotenv()
 
-# Database configuration from environment variables
-DB_HOST = os.getenv("DB_HOST", "postgis")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "cmu_apsco_db")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+# Database configuration from environment variables (POSTGRES_* accepted as fallback)
+DB_HOST = os.getenv("DB_HOST", os.getenv("POSTGRES_HOST", "postgis"))
+DB_PORT = os.getenv("DB_PORT", os.getenv("POSTGRES_PORT", "5432"))
+DB_NAME = os.getenv("DB_NAME", os.getenv("POSTGRES_DB", "cmu_apsco_db"))
+DB_USER = os.getenv("DB_USER", os.getenv("POSTGRES_USER", "postgres"))
+DB_PASSWORD = os.getenv("DB_PASSWORD", os.getenv("POSTGRES_PASSWORD", "postgres"))
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Connection pool configuration
+# DB_POOL_SIZE + DB_MAX_OVERFLOW is the total connection budget of one API
+# process. It is split between the SQLAlchemy pool (auth, DB_SYNC_POOL_SIZE
+# connections), the change feed's LISTEN connection and the asyncpg pool
+# used by the survey router (the rest).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_MAX_CONNECTIONS = DB_POOL_SIZE + DB_MAX_OVERFLOW
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "2"))
+DB_LISTEN_CONNECTIONS = 1
+DB_ASYNC_POOL_SIZE = max(1, DB_MAX_CONNECTIONS - DB_SYNC_POOL_SIZE - DB_LISTEN_CONNECTIONS)
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # SQLAlchemy: reconnect connections older than this
+DB_POOL_IDLE_TIMEOUT = int(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # asyncpg: close connections idle this long
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# Create SQLAlchemy engine (auth queries only; its size is part of the budget)
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_SYNC_POOL_SIZE,
+    max_overflow=0,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Pool counters exposed by pool_status()
+POOL_METRICS = {"connects": 0, "checkouts": 0, "timeouts": 0, "peak_checked_out": 0}
+
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    POOL_METRICS["connects"] += 1
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_METRICS["checkouts"] += 1
+    POOL_METRICS["peak_checked_out"] = max(
+        POOL_METRICS["peak_checked_out"], engine.pool.checkedout())
+
+
+def record_pool_timeout():
+    """Count a request that gave up waiting for a pooled connection (either pool)"""
+    POOL_METRICS["timeouts"] += 1
+
 
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
     try:
         yield db
+    except PoolTimeoutError:
+        record_pool_timeout()
+        raise
     finally:
         db.close()
+
+
+# asyncpg pool used by the async routers (created on application startup)
+async_pool = None
+
+
+async def _init_async_connection(conn):
+    """Decode/encode PostGIS geometry as binary EWKB <-> GeoJSON dicts"""
+    await conn.set_type_codec(
+        'geometry',
+        schema='public',
+        encoder=geojson_to_ewkb,
+        decoder=ewkb_to_geojson,
+        format='binary'
+    )
+
+
+async def init_async_pool():
+    """Create the asyncpg pool with the connections left in the budget"""
+    global async_pool
+    if async_pool is None:
+        async_pool = await asyncpg.create_pool(
+            dsn=DATABASE_URL,
+            min_size=min(2, DB_ASYNC_POOL_SIZE),
+            max_size=DB_ASYNC_POOL_SIZE,
+            # asyncpg has no maximum connection age; idle connections are closed instead
+            max_inactive_connection_lifetime=DB_POOL_IDLE_TIMEOUT,
+            server_settings={"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+            init=_init_async_connection
+        )
+    return async_pool
+
+
+async def close_async_pool():
+    global async_pool
+    if async_pool is not None:
+        await async_pool.close()
+        async_pool = None
+
+
+def get_async_pool():
+    """Return the asyncpg pool, or None before startup"""
+    return async_pool
+
+
+def pool_status() -> dict:
+    """Current pool usage and saturation counters"""
+    pool = engine.pool
+    checked_out = pool.checkedout()
+    status = {
+        "max_connections": DB_MAX_CONNECTIONS,
+        "pool_size": DB_SYNC_POOL_SIZE,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "saturation": round(checked_out / DB_SYNC_POOL_SIZE, 3) if DB_SYNC_POOL_SIZE else None,
+        **POOL_METRICS
+    }
+    if async_pool is not None:
+        size = async_pool.get_size()
+        in_use = size - async_pool.get_idle_size()
+        status["async"] = {
+            "size": size,
+            "in_use": in_use,
+            "max_size": async_pool.get_max_size(),
+            "saturation": round(in_use / async_pool.get_max_size(), 3)
+        }
+    return status
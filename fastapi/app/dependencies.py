@@ -1,46 +1,143 @@
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Optional
+import os
+import time
 
-from app.database import get_db
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.database import SessionLocal, record_pool_timeout
 from app.models.user import User
 from app.utils.auth import verify_token
+from app.utils.cache import TTLCache
 
 # HTTP Bearer security scheme
 security = HTTPBearer()
 
+# Verified tokens -> email. Entries never outlive the token's `exp`.
+TOKEN_CACHE = TTLCache(
+    maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("AUTH_TOKEN_CACHE_TTL", "900"))
+)
+
+# Email -> UserSnapshot. Refreshed by /api/auth/google; the TTL bounds how
+# long other workers may serve a stale profile or a deleted user.
+USER_CACHE = TTLCache(
+    maxsize=int(os.getenv("AUTH_USER_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("AUTH_USER_CACHE_TTL", "300"))
+)
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Detached copy of a users row, safe to share between requests"""
+    id: int
+    email: str
+    google_id: str
+    name: Optional[str]
+    picture: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            google_id=user.google_id,
+            name=user.name,
+            picture=user.picture,
+            created_at=user.created_at,
+            updated_at=user.updated_at
+        )
+
+
+def cache_user(user: User) -> UserSnapshot:
+    """Store (or replace) the cached snapshot of a user after it was written"""
+    snapshot = UserSnapshot.from_user(user)
+    USER_CACHE.set(snapshot.email, snapshot)
+    return snapshot
+
+
+def _load_user(email: str) -> Optional[UserSnapshot]:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).first()
+        return UserSnapshot.from_user(user) if user is not None else None
+    except PoolTimeoutError:
+        record_pool_timeout()
+        raise
+    finally:
+        db.close()
+
+
+def _token_email(token: str) -> Optional[str]:
+    """Email (`sub`) of a valid token; decoded tokens are cached until they expire"""
+    email = TOKEN_CACHE.get(token)
+    if email is not None:
+        return email
+
+    payload = verify_token(token)
+    if payload is None or payload.get("sub") is None:
+        return None
+
+    email = payload["sub"]
+    ttl = TOKEN_CACHE.ttl
+    if payload.get("exp") is not None:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        TOKEN_CACHE.set(token, email, ttl=ttl)
+    return email
+
+
+async def _principal_for_email(email: str) -> Optional[UserSnapshot]:
+    snapshot = USER_CACHE.get(email)
+    if snapshot is None:
+        snapshot = await run_in_threadpool(_load_user, email)
+        if snapshot is not None:
+            USER_CACHE.set(email, snapshot)
+    return snapshot
+
+
+async def get_principal(token: str) -> Optional[UserSnapshot]:
+    """
+    User of a JWT, from the caches when possible
+
+    Repeated tokens cost two lock-free dict lookups; the database is only
+    queried (in a worker thread) when the user is not cached.
+
+    Args:
+        token: JWT access token
+
+    Returns:
+        UserSnapshot, or None if the token is invalid or the user does not exist
+    """
+    email = _token_email(token)
+    if email is None:
+        return None
+    return await _principal_for_email(email)
+
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> UserSnapshot:
     """
     Dependency to get the current authenticated user from JWT token
 
     Args:
         credentials: HTTP Bearer credentials containing the JWT token
-        db: Database session
 
     Returns:
-        User object
+        UserSnapshot of the user
 
     Raises:
         HTTPException: If token is invalid or user not found
     """
-    token = credentials.credentials
-
-    # Verify token
-    payload = verify_token(token)
-    if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    # Extract email from token
-    email: str = payload.get("sub")
+    # Verify token and extract email
+    email = _token_email(credentials.credentials)
     if email is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,8 +145,8 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Get user from database
-    user = db.query(User).filter(User.email == email).first()
+    # Get user from cache or database
+    user = await _principal_for_email(email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -61,33 +158,26 @@ async def get_current_user(
 
 
 async def get_current_user_optional(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
-) -> Optional[User]:
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+) -> Optional[UserSnapshot]:
     """
     Optional dependency to get the current user (doesn't raise error if not authenticated)
 
     Args:
         credentials: Optional HTTP Bearer credentials
-        db: Database session
 
     Returns:
-        User object if authenticated, None otherwise
+        UserSnapshot if authenticated, None otherwise
     """
     if credentials is None:
         return None
 
     try:
-        token = credentials.credentials
-        payload = verify_token(token)
-        if payload is None:
-            return None
-
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-
-        user = db.query(User).filter(User.email == email).first()
-        return user
+        return await get_principal(credentials.credentials)
     except Exception:
         return None
+
+
+def principal_cache_status() -> dict:
+    """Hit counters of the token and user caches"""
+    return {"tokens": TOKEN_CACHE.stats(), "users": USER_CACHE.stats()}
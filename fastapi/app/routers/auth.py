@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from google.auth import exceptions as google_exceptions
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models.user import User
 from app.schemas.auth import GoogleAuthRequest, Token, UserResponse
 from app.utils.auth import verify_google_token, create_access_token
-from app.dependencies import get_current_user
+from app.dependencies import UserSnapshot, cache_user, get_current_user
 
 router = APIRouter(
     prefix="/api/auth",
@@ -31,8 +33,14 @@ async def google_auth(
     Raises:
         HTTPException: If Google token is invalid
     """
-    # Verify Google token
-    google_user_info = verify_google_token(auth_request.token)
+    # Verify Google token (off the event loop: may download certificates)
+    try:
+        google_user_info = await run_in_threadpool(verify_google_token, auth_request.token)
+    except google_exceptions.TransportError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Could not verify Google token: {str(e)}"
+        )
 
     if google_user_info is None:
         raise HTTPException(
@@ -61,6 +69,9 @@ async def google_auth(
         user.google_id = google_user_info['google_id']
         db.commit()
 
+    # Replace the cached principal so authenticated requests see the new profile
+    cache_user(user)
+
     # Create JWT token
     access_token = create_access_token(data={"sub": user.email})
 
@@ -72,7 +83,7 @@ async def google_auth(
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Get current authenticated user information
@@ -87,7 +98,7 @@ async def get_current_user_info(
 
 
 @router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user)):
+async def logout(current_user: UserSnapshot = Depends(get_current_user)):
     """
     Logout endpoint (token should be removed on client side)
 
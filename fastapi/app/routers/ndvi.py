@@ -3,13 +3,29 @@ Google Earth Engine NDVI Router
 Provides endpoints for NDVI calculation and visualization for Chiang Mai Province
 """
 
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from typing import Optional
 from datetime import datetime, timedelta
+import asyncio
 import ee
 import json
+import math
 import os
+import time
+
+from app.utils.geometry import (
+    GeometryError, clean_geometry, count_vertices, geodesic_area_km2, simplify_for_reduction)
+from app.dependencies import UserSnapshot, get_current_user, get_current_user_optional
+from app.utils.rate_limit import (
+    COST_AREA_STATS, COST_CACHE_WARM, COST_MAP_URL, COST_PIXEL_VALUE, COST_TILE,
+    COST_TIMESERIES, client_key, custom_region_cost, enforce_rate_limit, features_cost,
+    limiter, rate_limit, wait_for_tokens)
+from app.utils.reduction_plan import DATASETS, plan_reduction
+from app.utils.tiles import (
+    EMPTY_TILE, NODATA, VIS_PARAMS, cache_key, encode_tile, find_latest_raster,
+    list_rasters, load_raster, render_tile, save_raster)
 
 router = APIRouter(prefix="/api/ndvi", tags=["NDVI"])
 
@@ -417,6 +433,166 @@ def get_modis_ndmi(start_date: str, end_date: str, study_area: str = "Chiang Mai
             status_code=500, detail=f"Error calculating NDMI: {str(e)}")
 
 
+# Native reduction scale (meters) and rounding used for each index
+INDEX_SCALES = {index_type: dataset['native_scale'] for index_type, dataset in DATASETS.items()}
+INDEX_DIGITS = {'NDVI': 4, 'NDMI': 4, 'SPI': 2}
+
+
+def stats_reducer():
+    """Combined mean/min/max/stdDev reducer shared by the statistics endpoints"""
+    return ee.Reducer.mean().combine(
+        reducer2=ee.Reducer.minMax(),
+        sharedInputs=True
+    ).combine(
+        reducer2=ee.Reducer.stdDev(),
+        sharedInputs=True
+    )
+
+
+def build_index_image(index_type: str, start_date: str, end_date: str, roi):
+    """
+    Build the (unclipped) NDVI, NDMI or SPI composite covering an EE geometry
+
+    Args:
+        index_type: NDVI, NDMI or SPI
+        start_date: Start date in YYYY-MM-DD format
+        end_date: End date in YYYY-MM-DD format
+        roi: ee.Geometry or ee.FeatureCollection used to filter the collections
+
+    Returns:
+        Single-band image named after the index
+    """
+    if index_type == 'SPI':
+        chirps = ee.ImageCollection('UCSB-CHG/CHIRPS/DAILY')
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+        historical_start = (start_dt - timedelta(days=365*10)).strftime('%Y-%m-%d')
+        historical_end = (end_dt - timedelta(days=365*10)).strftime('%Y-%m-%d')
+
+        current_precip = chirps.filterDate(start_date, end_date).filterBounds(roi).sum()
+        historical_precip = (chirps.filterDate(historical_start, historical_end)
+                             .filterBounds(roi).sum())
+        return (current_precip.subtract(historical_precip)
+                .divide(historical_precip).multiply(100).rename('SPI'))
+
+    if index_type == 'NDMI':
+        collection = (ee.ImageCollection('MODIS/061/MOD09A1')
+                      .filterBounds(roi)
+                      .filterDate(start_date, end_date)
+                      .select(['sur_refl_b02', 'sur_refl_b06']))
+        return collection.map(
+            lambda image: image.normalizedDifference(
+                ['sur_refl_b02', 'sur_refl_b06']).rename('NDMI')
+        ).mean()
+
+    collection = (ee.ImageCollection('MODIS/061/MOD13Q1')
+                  .filterBounds(roi)
+                  .filterDate(start_date, end_date)
+                  .select('NDVI'))
+    return collection.mean().multiply(0.0001).rename('NDVI')
+
+
+def format_index_stats(index_type: str, stats: dict) -> dict:
+    """Round a combined-reducer result into the statistics payload used by the API"""
+    digits = INDEX_DIGITS.get(index_type, 4)
+    mean_val = stats.get(index_type) or stats.get(f'{index_type}_mean') or 0
+
+    def value(key):
+        return round(stats.get(key) or 0, digits)
+
+    return {
+        "mean": round(mean_val, digits),
+        "min": value(f'{index_type}_min'),
+        "max": value(f'{index_type}_max'),
+        "std_dev": value(f'{index_type}_stdDev')
+    }
+
+
+def interpret_index(index_type: str, value: float) -> str:
+    """Interpret a value of any supported index"""
+    if index_type == 'SPI':
+        return interpret_spi(value)
+    if index_type == 'NDMI':
+        return interpret_ndmi(value)
+    return interpret_ndvi(value)
+
+
+def compute_area_stats(index_type: str, start_date: str, end_date: str, study_area: str) -> dict:
+    """
+    Run the statistics reduction for one study area (blocking EE call)
+
+    Returns:
+        Dictionary with region, statistics and interpretation
+    """
+    roi = get_study_area_geometry(study_area)
+    image = build_index_image(index_type, start_date, end_date, roi).clip(roi)
+    stats = image.reduceRegion(
+        reducer=stats_reducer(),
+        geometry=roi,
+        scale=INDEX_SCALES.get(index_type, 250),
+        maxPixels=1e9
+    ).getInfo()
+
+    statistics = format_index_stats(index_type, stats)
+    return {
+        "region": study_area,
+        "statistics": statistics,
+        "interpretation": interpret_index(index_type, statistics["mean"])
+    }
+
+
+def compute_features_stats(index_type: str, start_date: str, end_date: str, features: list) -> list:
+    """
+    Reduce a chunk of GeoJSON geometries with a single reduceRegions call (blocking EE call)
+
+    Args:
+        features: List of (feature_id, GeoJSON geometry) tuples
+
+    Returns:
+        List of dictionaries with id, statistics and interpretation
+    """
+    collection = ee.FeatureCollection([
+        ee.Feature(ee.Geometry(geometry), {'feature_id': feature_id})
+        for feature_id, geometry in features
+    ])
+    image = build_index_image(index_type, start_date, end_date, collection.geometry())
+    reduced = image.reduceRegions(
+        collection=collection,
+        reducer=stats_reducer(),
+        scale=INDEX_SCALES.get(index_type, 250)
+    ).getInfo()
+
+    results = []
+    for feature in reduced['features']:
+        props = feature['properties']
+        # reduceRegions names outputs after the reducer only (mean, min, ...)
+        stats = {f'{index_type}_{key}': props.get(key)
+                 for key in ('mean', 'min', 'max', 'stdDev')}
+        statistics = format_index_stats(index_type, stats)
+        results.append({
+            "id": props.get('feature_id'),
+            "statistics": statistics,
+            "interpretation": interpret_index(index_type, statistics["mean"]),
+            # False when every pixel was masked (statistics are then zeros)
+            "has_data": props.get('mean') is not None
+        })
+    return results
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+}
+
+# Maximum number of concurrent EE reductions per stream
+STREAM_CONCURRENCY = int(os.getenv("EE_STREAM_CONCURRENCY", "4"))
+
+
 @router.get("/study-areas")
 async def get_study_areas():
     """
@@ -438,7 +614,7 @@ async def get_study_areas():
     }
 
 
-@router.get("/pixel-value")
+@router.get("/pixel-value", dependencies=[Depends(rate_limit(COST_PIXEL_VALUE))])
 async def get_pixel_value(
     lng: float = Query(..., description="Longitude"),
     lat: float = Query(..., description="Latitude"),
@@ -518,51 +694,95 @@ async def get_pixel_value(
             status_code=500, detail=f"Error getting pixel value: {str(e)}")
 
 
+# Undated tile requests may fall back to a cached composite that ended at
+# most this many days ago
+RASTER_MAX_AGE_DAYS = int(os.getenv("RASTER_MAX_AGE_DAYS", "16"))
+
+
+def require_study_area(study_area: str):
+    """Reject unknown study area names (400) instead of silently using Chiang Mai"""
+    if study_area not in STUDY_AREAS:
+        raise HTTPException(status_code=400, detail=f"Unknown study area: {study_area}")
+
+
+def is_recent_raster(raster: dict) -> bool:
+    """True if a cached composite's period ended within RASTER_MAX_AGE_DAYS"""
+    try:
+        end = datetime.strptime(raster['meta']['period']['end_date'], '%Y-%m-%d')
+    except (KeyError, TypeError, ValueError):
+        return False
+    return datetime.now() - end <= timedelta(days=RASTER_MAX_AGE_DAYS)
+
+
 @router.get("/tile/{z}/{x}/{y}")
 async def get_ndvi_tile(
+    request: Request,
     z: int,
     x: int,
     y: int,
     start_date: Optional[str] = Query(
         None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    study_area: str = Query("Chiang Mai", description="Study area name")
+    study_area: str = Query("Chiang Mai", description="Study area name"),
+    index_type: str = Query("NDVI", description="Index type: NDVI, SPI, or NDMI"),
+    image_format: str = Query("png", alias="format", description="Tile format: png or webp"),
+    user: Optional[UserSnapshot] = Depends(get_current_user_optional)
 ):
     """
-    Get NDVI map tile for specified study area using MODIS data
+    Get index map tile for specified study area
 
-    Returns PNG tile for use with MapLibre GL JS
+    Served from the local raster cache (see /cache/warm) without any Earth
+    Engine call when a composite is cached. Without dates the period is the
+    last 30 days (as on the Earth Engine path); if that composite is not
+    cached, the latest cached one is used as long as it ended at most
+    RASTER_MAX_AGE_DAYS ago. X-Tile-Period tells which period was rendered.
+    Only tiles rendered by Earth Engine count against the rate limit.
+
+    Returns PNG (or WebP) tile for use with MapLibre GL JS
     """
+    index_type = index_type.upper()
+    if index_type not in VIS_PARAMS:
+        raise HTTPException(status_code=400, detail=f"Unsupported index type: {index_type}")
+    require_study_area(study_area)
+
+    dated = bool(start_date and end_date)
+    start_date, end_date = default_period(start_date, end_date)
+    raster = load_raster(cache_key(index_type, study_area, start_date, end_date))
+    if raster is None and not dated:
+        latest = find_latest_raster(index_type, study_area)
+        raster = load_raster(latest) if latest else None
+        if raster is not None and not is_recent_raster(raster):
+            raster = None
+
+    if raster is not None:
+        rgba = render_tile(raster, index_type, z, x, y)
+        if rgba is None:
+            content, media_type = EMPTY_TILE, "image/png"
+        else:
+            content, media_type = encode_tile(rgba, image_format)
+        period = raster['meta']['period']
+        return Response(content=content, media_type=media_type, headers={
+            "X-Tile-Source": "cache",
+            "X-Tile-Period": f"{period['start_date']}/{period['end_date']}",
+            # Undated URLs move on to newer composites
+            "Cache-Control": "public, max-age=3600" if dated else "public, max-age=300"
+        })
+
     if not EE_INITIALIZED:
         raise HTTPException(
             status_code=503, detail="Earth Engine not initialized. Please configure authentication.")
+    await enforce_rate_limit(request, user, COST_TILE)
 
     try:
-        # Default to last 30 days if no dates provided
-        if not end_date:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        if not start_date:
-            start_date = (datetime.now() - timedelta(days=30)
-                          ).strftime('%Y-%m-%d')
-
-        ndvi_image, roi = get_modis_ndvi(start_date, end_date, study_area)
-
-        # Visualization parameters
-        vis_params = {
-            'min': -0.2,
-            'max': 0.8,
-            'palette': [
-                '#d73027',  # Red (very low NDVI)
-                '#fc8d59',  # Orange
-                '#fee08b',  # Yellow
-                '#d9ef8b',  # Light green
-                '#91cf60',  # Green
-                '#1a9850'   # Dark green (high NDVI)
-            ]
-        }
+        if index_type == 'SPI':
+            image, roi = calculate_precipitation_anomaly(start_date, end_date, study_area)
+        elif index_type == 'NDMI':
+            image, roi = get_modis_ndmi(start_date, end_date, study_area)
+        else:
+            image, roi = get_modis_ndvi(start_date, end_date, study_area)
 
         # Get map tile URL
-        map_id = ndvi_image.getMapId(vis_params)
+        map_id = image.getMapId(VIS_PARAMS[index_type])
         tile_url = map_id['tile_fetcher'].url_format
 
         # Fetch the actual tile
@@ -571,7 +791,9 @@ async def get_ndvi_tile(
         response = requests.get(tile_request_url)
 
         if response.status_code == 200:
-            return Response(content=response.content, media_type="image/png")
+            return Response(content=response.content, media_type="image/png",
+                            headers={"X-Tile-Source": "earthengine",
+                                     "X-Tile-Period": f"{start_date}/{end_date}"})
         else:
             raise HTTPException(status_code=404, detail="Tile not found")
 
@@ -580,7 +802,95 @@ async def get_ndvi_tile(
             status_code=500, detail=f"Error generating tile: {str(e)}")
 
 
-@router.get("/stats")
+# computePixels rejects responses larger than about 48 MB
+MAX_CACHE_PIXELS = 12_000_000
+
+
+def fetch_composite(index_type: str, start_date: str, end_date: str, study_area: str) -> dict:
+    """
+    Download a composite over a study area's bounds and store it in the raster cache
+    (blocking EE call)
+
+    Returns:
+        Stored raster metadata
+    """
+    ring = STUDY_AREAS[study_area]["bounds"]["coordinates"][0]
+    west, east = min(p[0] for p in ring), max(p[0] for p in ring)
+    south, north = min(p[1] for p in ring), max(p[1] for p in ring)
+
+    # Native resolution in degrees, coarsened if the grid would be too large
+    res = INDEX_SCALES[index_type] / 111320
+    while ((east - west) / res) * ((north - south) / res) > MAX_CACHE_PIXELS:
+        res *= 2
+    width = int(math.ceil((east - west) / res))
+    height = int(math.ceil((north - south) / res))
+
+    roi = get_study_area_geometry(study_area)
+    image = (build_index_image(index_type, start_date, end_date, roi)
+             .clip(roi).unmask(NODATA).toFloat())
+    array = ee.data.computePixels({
+        'expression': image,
+        'fileFormat': 'NUMPY_NDARRAY',
+        'grid': {
+            'dimensions': {'width': width, 'height': height},
+            'affineTransform': {
+                'scaleX': res, 'shearX': 0, 'translateX': west,
+                'shearY': 0, 'scaleY': -res, 'translateY': north
+            },
+            'crsCode': 'EPSG:4326'
+        }
+    })
+
+    return save_raster(
+        cache_key(index_type, study_area, start_date, end_date),
+        array[index_type],
+        [west, north - height * res, west + width * res, north],
+        {
+            "index_type": index_type,
+            "study_area": study_area,
+            "period": {"start_date": start_date, "end_date": end_date},
+            "resolution_degrees": res
+        }
+    )
+
+
+@router.post("/cache/warm", dependencies=[Depends(get_current_user), Depends(rate_limit(COST_CACHE_WARM))])
+async def warm_raster_cache(
+    index_type: str = Query("NDVI", description="Index type: NDVI, SPI, or NDMI"),
+    study_area: str = Query("Chiang Mai", description="Study area name"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
+):
+    """
+    Download a composite once so /tile can render it locally
+
+    Returns the cached raster metadata
+    """
+    if not EE_INITIALIZED:
+        raise HTTPException(
+            status_code=503, detail="Earth Engine not initialized. Please configure authentication.")
+
+    index_type = index_type.upper()
+    if index_type not in VIS_PARAMS:
+        raise HTTPException(status_code=400, detail=f"Unsupported index type: {index_type}")
+    require_study_area(study_area)
+
+    start_date, end_date = default_period(start_date, end_date)
+    try:
+        meta = await run_in_threadpool(fetch_composite, index_type, start_date, end_date, study_area)
+        return {"success": True, "raster": meta}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error caching composite: {str(e)}")
+
+
+@router.get("/cache")
+async def get_raster_cache():
+    """List composites available for local tile rendering"""
+    return {"rasters": list_rasters()}
+
+
+@router.get("/stats", dependencies=[Depends(rate_limit(COST_AREA_STATS))])
 async def get_ndvi_stats(
     start_date: Optional[str] = Query(
         None, description="Start date (YYYY-MM-DD)"),
@@ -646,7 +956,7 @@ async def get_ndvi_stats(
             status_code=500, detail=f"Error calculating statistics: {str(e)}")
 
 
-@router.get("/timeseries")
+@router.get("/timeseries", dependencies=[Depends(rate_limit(COST_TIMESERIES))])
 async def get_ndvi_timeseries(
     start_date: Optional[str] = Query(
         None, description="Start date (YYYY-MM-DD)"),
@@ -726,7 +1036,7 @@ async def get_ndvi_timeseries(
             status_code=500, detail=f"Error generating time series: {str(e)}")
 
 
-@router.get("/spi/stats")
+@router.get("/spi/stats", dependencies=[Depends(rate_limit(COST_AREA_STATS))])
 async def get_spi_stats(
     start_date: Optional[str] = Query(
         None, description="Start date (YYYY-MM-DD)"),
@@ -789,7 +1099,7 @@ async def get_spi_stats(
             status_code=500, detail=f"Error calculating SPI statistics: {str(e)}")
 
 
-@router.get("/spi/map-url")
+@router.get("/spi/map-url", dependencies=[Depends(rate_limit(COST_MAP_URL))])
 async def get_spi_map_url(
     start_date: Optional[str] = Query(
         None, description="Start date (YYYY-MM-DD)"),
@@ -816,20 +1126,7 @@ async def get_spi_map_url(
         spi_image, roi = calculate_precipitation_anomaly(
             start_date, end_date, study_area)
 
-        # Visualization parameters for SPI
-        vis_params = {
-            'min': -50,
-            'max': 50,
-            'palette': [
-                '#8B0000',  # Dark red (severe drought)
-                '#FF0000',  # Red (moderate drought)
-                '#FFA500',  # Orange (mild drought)
-                '#FFFF00',  # Yellow (near normal)
-                '#90EE90',  # Light green (slightly wet)
-                '#008000',  # Green (moderately wet)
-                '#0000FF'   # Blue (very wet)
-            ]
-        }
+        vis_params = VIS_PARAMS['SPI']
 
         # Get map tile URL
         map_id = spi_image.getMapId(vis_params)
@@ -853,8 +1150,8 @@ async def get_spi_map_url(
             "zoom": study_area_info["zoom"],
             "legend": {
                 "title": "Precipitation Anomaly (%)",
-                "min": -50,
-                "max": 50,
+                "min": vis_params['min'],
+                "max": vis_params['max'],
                 "colors": vis_params['palette'],
                 "labels": [
                     "Severe drought",
@@ -873,7 +1170,7 @@ async def get_spi_map_url(
             status_code=500, detail=f"Error generating SPI map URL: {str(e)}")
 
 
-@router.get("/ndmi/stats")
+@router.get("/ndmi/stats", dependencies=[Depends(rate_limit(COST_AREA_STATS))])
 async def get_ndmi_stats(
     start_date: Optional[str] = Query(
         None, description="Start date (YYYY-MM-DD)"),
@@ -938,7 +1235,7 @@ async def get_ndmi_stats(
             status_code=500, detail=f"Error calculating NDMI statistics: {str(e)}")
 
 
-@router.get("/ndmi/map-url")
+@router.get("/ndmi/map-url", dependencies=[Depends(rate_limit(COST_MAP_URL))])
 async def get_ndmi_map_url(
     start_date: Optional[str] = Query(
         None, description="Start date (YYYY-MM-DD)"),
@@ -964,20 +1261,7 @@ async def get_ndmi_map_url(
 
         ndmi_image, roi = get_modis_ndmi(start_date, end_date, study_area)
 
-        # Visualization parameters for NDMI
-        vis_params = {
-            'min': -0.6,
-            'max': 0.6,
-            'palette': [
-                '#8B4513',  # Brown (very dry)
-                '#D2691E',  # Chocolate (dry)
-                '#F4A460',  # Sandy brown (slightly dry)
-                '#FFFF00',  # Yellow (moderate)
-                '#90EE90',  # Light green (high moisture)
-                '#008000',  # Green (very high moisture)
-                '#006400'   # Dark green (saturated)
-            ]
-        }
+        vis_params = VIS_PARAMS['NDMI']
 
         # Get map tile URL
         map_id = ndmi_image.getMapId(vis_params)
@@ -1001,8 +1285,8 @@ async def get_ndmi_map_url(
             "zoom": study_area_info["zoom"],
             "legend": {
                 "title": "Moisture Index (NDMI)",
-                "min": -0.6,
-                "max": 0.6,
+                "min": vis_params['min'],
+                "max": vis_params['max'],
                 "colors": vis_params['palette'],
                 "labels": [
                     "Very dry",
@@ -1021,7 +1305,7 @@ async def get_ndmi_map_url(
             status_code=500, detail=f"Error generating NDMI map URL: {str(e)}")
 
 
-@router.get("/map-url")
+@router.get("/map-url", dependencies=[Depends(rate_limit(COST_MAP_URL))])
 async def get_ndvi_map_url(
     start_date: Optional[str] = Query(
         None, description="Start date (YYYY-MM-DD)"),
@@ -1047,19 +1331,7 @@ async def get_ndvi_map_url(
 
         ndvi_image, roi = get_modis_ndvi(start_date, end_date, study_area)
 
-        # Visualization parameters
-        vis_params = {
-            'min': -0.2,
-            'max': 0.8,
-            'palette': [
-                '#d73027',  # Red (very low NDVI)
-                '#fc8d59',  # Orange
-                '#fee08b',  # Yellow
-                '#d9ef8b',  # Light green
-                '#91cf60',  # Green
-                '#1a9850'   # Dark green (high NDVI)
-            ]
-        }
+        vis_params = VIS_PARAMS['NDVI']
 
         # Get map tile URL
         map_id = ndvi_image.getMapId(vis_params)
@@ -1083,8 +1355,8 @@ async def get_ndvi_map_url(
             "zoom": study_area_info["zoom"],
             "legend": {
                 "title": "NDVI Values",
-                "min": -0.2,
-                "max": 0.8,
+                "min": vis_params['min'],
+                "max": vis_params['max'],
                 "colors": vis_params['palette'],
                 "labels": [
                     "Bare soil / Water",
@@ -1153,7 +1425,11 @@ def interpret_ndmi(ndmi_value: float) -> str:
 
 
 @router.post("/stats/custom")
-async def get_ndvi_stats_custom(request: dict):
+async def get_ndvi_stats_custom(
+    request: dict,
+    http_request: Request,
+    user: Optional[UserSnapshot] = Depends(get_current_user_optional)
+):
     """
     Get NDVI statistics for a custom drawn polygon
 
@@ -1161,6 +1437,9 @@ async def get_ndvi_stats_custom(request: dict):
     - start_date: Start date (YYYY-MM-DD)
     - end_date: End date (YYYY-MM-DD)
     - geometry: GeoJSON polygon geometry
+
+    Rate-limit tokens grow with the planned pixels, images and vertices
+    (custom_region_cost); dry runs are free.
     """
     if not EE_INITIALIZED:
         raise HTTPException(
@@ -1178,23 +1457,14 @@ async def get_ndvi_stats_custom(request: dict):
 
         print(f"[NDVI Custom Stats] Processing request for {start_date} to {end_date}")
 
-        # Create EE geometry from GeoJSON with validation
-        try:
-            roi = ee.Geometry(geometry)
-            # Validate geometry area (not too large)
-            area_km2 = roi.area().divide(1e6).getInfo()
-            print(f"[NDVI Custom Stats] Polygon area: {area_km2:.2f} km²")
-
-            if area_km2 > 100000:  # 100,000 km²
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Polygon too large ({area_km2:.0f} km²). Maximum area is 100,000 km²."
-                )
-        except Exception as geom_error:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid geometry: {str(geom_error)}"
-            )
+        # Validate, repair and simplify the polygon locally, then plan the reduction
+        roi_geometry, area_km2, plan = prepare_custom_region('NDVI', geometry, request)
+        print(f"[NDVI Custom Stats] Polygon area: {area_km2:.2f} km²")
+        if request.get('dry_run'):
+            return {"dry_run": True, "area_km2": round(area_km2, 2), "plan": plan}
+        await enforce_rate_limit(http_request, user, custom_region_cost(plan))
+
+        roi = ee.Geometry(roi_geometry)
 
         # Get MODIS NDVI with optimized settings
         collection = (ee.ImageCollection('MODIS/061/MOD13Q1')
@@ -1216,9 +1486,6 @@ async def get_ndvi_stats_custom(request: dict):
         ndvi_composite = collection.mean().clip(roi)
         ndvi_scaled = ndvi_composite.multiply(0.0001)
 
-        # Calculate statistics with optimized scale based on area
-        scale = 250 if area_km2 < 1000 else 500  # Use coarser resolution for large areas
-
         stats = ndvi_scaled.reduceRegion(
             reducer=ee.Reducer.mean().combine(
                 reducer2=ee.Reducer.minMax(),
@@ -1228,9 +1495,9 @@ async def get_ndvi_stats_custom(request: dict):
                 sharedInputs=True
             ),
             geometry=roi,
-            scale=scale,
-            maxPixels=1e9,
-            bestEffort=True  # Allows computation to complete even with large areas
+            scale=plan['scale'],
+            tileScale=plan['tile_scale'],
+            maxPixels=1e9
         ).getInfo()
 
         mean_val = stats.get('NDVI', 0)
@@ -1263,6 +1530,7 @@ async def get_ndvi_stats_custom(request: dict):
             },
             "interpretation": interpret_ndvi(mean_val),
             "area_km2": round(area_km2, 2),
+            "plan": plan,
             "image_count": count,
             "tile_url": tile_url,
             "bounds": geometry.get('coordinates', [[]])[0] if geometry.get('type') == 'Polygon' else None
@@ -1279,7 +1547,11 @@ async def get_ndvi_stats_custom(request: dict):
 
 
 @router.post("/spi/stats/custom")
-async def get_spi_stats_custom(request: dict):
+async def get_spi_stats_custom(
+    request: dict,
+    http_request: Request,
+    user: Optional[UserSnapshot] = Depends(get_current_user_optional)
+):
     """
     Get SPI statistics for a custom drawn polygon
 
@@ -1287,6 +1559,9 @@ async def get_spi_stats_custom(request: dict):
     - start_date: Start date (YYYY-MM-DD)
     - end_date: End date (YYYY-MM-DD)
     - geometry: GeoJSON polygon geometry
+
+    Rate-limit tokens grow with the planned pixels, images and vertices
+    (custom_region_cost); dry runs are free.
     """
     if not EE_INITIALIZED:
         raise HTTPException(
@@ -1304,24 +1579,14 @@ async def get_spi_stats_custom(request: dict):
 
         print(f"[SPI Custom Stats] Processing request for {start_date} to {end_date}")
 
-        # Create EE geometry from GeoJSON with validation
-        try:
-            roi = ee.Geometry(geometry)
-            area_km2 = roi.area().divide(1e6).getInfo()
-            print(f"[SPI Custom Stats] Polygon area: {area_km2:.2f} km²")
-
-            if area_km2 > 100000:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Polygon too large ({area_km2:.0f} km²). Maximum area is 100,000 km²."
-                )
-        except HTTPException:
-            raise
-        except Exception as geom_error:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid geometry: {str(geom_error)}"
-            )
+        # Validate, repair and simplify the polygon locally, then plan the reduction
+        roi_geometry, area_km2, plan = prepare_custom_region('SPI', geometry, request)
+        print(f"[SPI Custom Stats] Polygon area: {area_km2:.2f} km²")
+        if request.get('dry_run'):
+            return {"dry_run": True, "area_km2": round(area_km2, 2), "plan": plan}
+        await enforce_rate_limit(http_request, user, custom_region_cost(plan))
+
+        roi = ee.Geometry(roi_geometry)
 
         # Load CHIRPS precipitation data
         chirps = ee.ImageCollection('UCSB-CHG/CHIRPS/DAILY')
@@ -1351,9 +1616,6 @@ async def get_spi_stats_custom(request: dict):
         anomaly = current_precip.subtract(historical_precip).divide(
             historical_precip).multiply(100).rename('SPI')
 
-        # Calculate statistics with optimized scale
-        scale = 5000 if area_km2 < 1000 else 10000
-
         stats = anomaly.reduceRegion(
             reducer=ee.Reducer.mean().combine(
                 reducer2=ee.Reducer.minMax(),
@@ -1363,9 +1625,9 @@ async def get_spi_stats_custom(request: dict):
                 sharedInputs=True
             ),
             geometry=roi,
-            scale=scale,
-            maxPixels=1e9,
-            bestEffort=True
+            scale=plan['scale'],
+            tileScale=plan['tile_scale'],
+            maxPixels=1e9
         ).getInfo()
 
         mean_val = stats.get('SPI', 0)
@@ -1398,6 +1660,7 @@ async def get_spi_stats_custom(request: dict):
             },
             "interpretation": interpret_spi(mean_val),
             "area_km2": round(area_km2, 2),
+            "plan": plan,
             "tile_url": tile_url,
             "bounds": geometry.get('coordinates', [[]])[0] if geometry.get('type') == 'Polygon' else None
         }
@@ -1413,7 +1676,11 @@ async def get_spi_stats_custom(request: dict):
 
 
 @router.post("/ndmi/stats/custom")
-async def get_ndmi_stats_custom(request: dict):
+async def get_ndmi_stats_custom(
+    request: dict,
+    http_request: Request,
+    user: Optional[UserSnapshot] = Depends(get_current_user_optional)
+):
     """
     Get NDMI statistics for a custom drawn polygon
 
@@ -1421,6 +1688,9 @@ async def get_ndmi_stats_custom(request: dict):
     - start_date: Start date (YYYY-MM-DD)
     - end_date: End date (YYYY-MM-DD)
     - geometry: GeoJSON polygon geometry
+
+    Rate-limit tokens grow with the planned pixels, images and vertices
+    (custom_region_cost); dry runs are free.
     """
     if not EE_INITIALIZED:
         raise HTTPException(
@@ -1438,24 +1708,14 @@ async def get_ndmi_stats_custom(request: dict):
 
         print(f"[NDMI Custom Stats] Processing request for {start_date} to {end_date}")
 
-        # Create EE geometry from GeoJSON with validation
-        try:
-            roi = ee.Geometry(geometry)
-            area_km2 = roi.area().divide(1e6).getInfo()
-            print(f"[NDMI Custom Stats] Polygon area: {area_km2:.2f} km²")
-
-            if area_km2 > 100000:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Polygon too large ({area_km2:.0f} km²). Maximum area is 100,000 km²."
-                )
-        except HTTPException:
-            raise
-        except Exception as geom_error:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid geometry: {str(geom_error)}"
-            )
+        # Validate, repair and simplify the polygon locally, then plan the reduction
+        roi_geometry, area_km2, plan = prepare_custom_region('NDMI', geometry, request)
+        print(f"[NDMI Custom Stats] Polygon area: {area_km2:.2f} km²")
+        if request.get('dry_run'):
+            return {"dry_run": True, "area_km2": round(area_km2, 2), "plan": plan}
+        await enforce_rate_limit(http_request, user, custom_region_cost(plan))
+
+        roi = ee.Geometry(roi_geometry)
 
         # Load MODIS Surface Reflectance
         collection = (ee.ImageCollection('MODIS/061/MOD09A1')
@@ -1482,9 +1742,6 @@ async def get_ndmi_stats_custom(request: dict):
         ndmi_collection = collection.map(calculate_ndmi)
         ndmi_composite = ndmi_collection.mean().clip(roi)
 
-        # Calculate statistics with optimized scale
-        scale = 500 if area_km2 < 1000 else 1000
-
         stats = ndmi_composite.reduceRegion(
             reducer=ee.Reducer.mean().combine(
                 reducer2=ee.Reducer.minMax(),
@@ -1494,9 +1751,9 @@ async def get_ndmi_stats_custom(request: dict):
                 sharedInputs=True
             ),
             geometry=roi,
-            scale=scale,
-            maxPixels=1e9,
-            bestEffort=True
+            scale=plan['scale'],
+            tileScale=plan['tile_scale'],
+            maxPixels=1e9
         ).getInfo()
 
         mean_val = stats.get('NDMI', 0)
@@ -1529,6 +1786,7 @@ async def get_ndmi_stats_custom(request: dict):
             },
             "interpretation": interpret_ndmi(mean_val),
             "area_km2": round(area_km2, 2),
+            "plan": plan,
             "image_count": count,
             "tile_url": tile_url,
             "bounds": geometry.get('coordinates', [[]])[0] if geometry.get('type') == 'Polygon' else None
@@ -1544,11 +1802,267 @@ async def get_ndmi_stats_custom(request: dict):
             status_code=500, detail=f"Error calculating NDMI statistics: {str(e)}")
 
 
+# Largest polygon accepted by the custom statistics endpoints
+MAX_CUSTOM_AREA_KM2 = 100000
+
+
+def prepare_custom_region(index_type: str, geometry: dict, request: dict):
+    """
+    Validate, repair and simplify a drawn polygon in-process and plan its reduction
+
+    Args:
+        index_type: NDVI, NDMI or SPI
+        geometry: GeoJSON geometry from the request
+        request: Request body (may carry pixel_budget)
+
+    Returns:
+        Tuple of (simplified GeoJSON geometry, geodesic area in km², reduction plan)
+
+    Raises:
+        HTTPException: 400 if the geometry is invalid or too large
+    """
+    repairs = []
+    try:
+        cleaned = clean_geometry(geometry, repairs)
+    except GeometryError as geom_error:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid geometry: {str(geom_error)}")
+
+    area_km2 = geodesic_area_km2(cleaned)
+    if area_km2 > MAX_CUSTOM_AREA_KM2:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Polygon too large ({area_km2:.0f} km²). Maximum area is 100,000 km²."
+        )
+
+    try:
+        plan = plan_reduction(index_type, area_km2, request.get('start_date'),
+                              request.get('end_date'), request.get('pixel_budget'))
+    except ValueError as plan_error:
+        raise HTTPException(status_code=400, detail=str(plan_error))
+
+    simplified = simplify_for_reduction(cleaned)
+    plan["vertices"] = {
+        "input": count_vertices(cleaned),
+        "simplified": count_vertices(simplified)
+    }
+    if repairs:
+        plan["repairs"] = repairs
+    return simplified, area_km2, plan
+
+
+def default_period(start_date: Optional[str], end_date: Optional[str], days: int = 30):
+    """Fill in a missing analysis period with the last `days` days"""
+    if not end_date:
+        end_date = datetime.now().strftime('%Y-%m-%d')
+    if not start_date:
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    return start_date, end_date
+
+
+@router.get("/stats/stream")
+async def stream_area_stats(
+    request: Request,
+    index_type: str = Query("NDVI", description="Index type: NDVI, SPI, or NDMI"),
+    study_areas: Optional[str] = Query(
+        None, description="Comma-separated study area names (default: all)"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    user: Optional[UserSnapshot] = Depends(get_current_user_optional)
+):
+    """
+    Stream statistics for several study areas as Server-Sent Events
+
+    Emits a `start` event, one `area` (or `error`) event per study area as soon
+    as its reduction completes, and a final `summary` event. Each area costs
+    COST_AREA_STATS tokens: the first is charged up front (429 when the
+    bucket is empty), the others wait for the bucket to refill.
+    """
+    if not EE_INITIALIZED:
+        raise HTTPException(
+            status_code=503, detail="Earth Engine not initialized. Please configure authentication.")
+
+    index_type = index_type.upper()
+    if index_type not in INDEX_SCALES:
+        raise HTTPException(status_code=400, detail=f"Unsupported index type: {index_type}")
+
+    start_date, end_date = default_period(start_date, end_date)
+    if study_areas:
+        areas = [name.strip() for name in study_areas.split(',') if name.strip()]
+    else:
+        areas = list(STUDY_AREAS.keys())
+    if not areas:
+        raise HTTPException(status_code=400, detail="No study areas given")
+
+    key = client_key(request, user)
+    await enforce_rate_limit(request, user, COST_AREA_STATS)
+
+    async def event_stream():
+        semaphore = asyncio.Semaphore(STREAM_CONCURRENCY)
+        started = time.monotonic()
+
+        async def run(area_index, area_name):
+            async with semaphore:
+                if area_index > 0:
+                    await wait_for_tokens(key, COST_AREA_STATS)
+                try:
+                    return await run_in_threadpool(
+                        compute_area_stats, index_type, start_date, end_date, area_name)
+                except Exception as e:
+                    return {"region": area_name, "error": str(e)}
+
+        yield sse_event("start", {
+            "index_type": index_type,
+            "period": {"start_date": start_date, "end_date": end_date},
+            "total": len(areas)
+        })
+
+        tasks = [asyncio.create_task(run(i, name)) for i, name in enumerate(areas)]
+        completed = []
+        failed = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if "error" in result:
+                    failed.append(result["region"])
+                    yield sse_event("error", result)
+                else:
+                    completed.append(result)
+                    yield sse_event("area", result)
+        finally:
+            # Client went away: don't keep reducing areas nobody will read
+            for task in tasks:
+                task.cancel()
+
+        means = [r["statistics"]["mean"] for r in completed]
+        yield sse_event("summary", {
+            "completed": len(completed),
+            "failed": failed,
+            "mean_of_means": round(sum(means) / len(means), INDEX_DIGITS[index_type]) if means else None,
+            "elapsed_seconds": round(time.monotonic() - started, 2)
+        })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/stats/custom/stream")
+async def stream_features_stats(
+    request: dict,
+    http_request: Request,
+    user: Optional[UserSnapshot] = Depends(get_current_user_optional)
+):
+    """
+    Stream statistics for many polygons (e.g. survey parcels) in chunks as Server-Sent Events
+
+    Expects JSON body with:
+    - index_type: NDVI, NDMI or SPI (default NDVI)
+    - start_date: Start date (YYYY-MM-DD)
+    - end_date: End date (YYYY-MM-DD)
+    - features: GeoJSON features (or bare geometries); `id` is echoed back
+    - chunk_size: Number of polygons per EE reduction (default 50)
+
+    Each chunk costs tokens by its polygon and vertex counts (features_cost).
+    The first chunk is charged up front (429 when the bucket cannot pay);
+    later chunks wait for the bucket to refill, so large batches are paced
+    instead of being reduced at once.
+    """
+    if not EE_INITIALIZED:
+        raise HTTPException(
+            status_code=503, detail="Earth Engine not initialized. Please configure authentication.")
+
+    index_type = request.get('index_type') or 'NDVI'
+    start_date = request.get('start_date')
+    end_date = request.get('end_date')
+    features = request.get('features') or []
+    try:
+        chunk_size = max(1, min(int(request.get('chunk_size') or 50), 500))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="chunk_size must be an integer")
+
+    if not isinstance(index_type, str) or index_type.upper() not in INDEX_SCALES:
+        raise HTTPException(status_code=400, detail=f"Unsupported index type: {index_type}")
+    index_type = index_type.upper()
+    if not isinstance(features, list):
+        raise HTTPException(status_code=400, detail="features must be an array")
+    if not features:
+        raise HTTPException(status_code=400, detail="Features are required")
+    if not isinstance(start_date, str) or not isinstance(end_date, str) or not start_date or not end_date:
+        raise HTTPException(status_code=400, detail="Start date and end date are required")
+
+    # Reject invalid polygons (and non-object items) locally and drop GPS-noise vertices
+    items = []
+    rejected = []
+    for position, feature in enumerate(features):
+        is_feature = isinstance(feature, dict) and feature.get('type') == 'Feature'
+        feature_id = feature.get('id', position) if is_feature else position
+        try:
+            cleaned = clean_geometry(feature)
+        except GeometryError as geom_error:
+            rejected.append({"id": feature_id, "error": str(geom_error)})
+            continue
+        items.append((feature_id, simplify_for_reduction(cleaned)))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    costs = [features_cost(len(chunk), sum(count_vertices(geom) for _, geom in chunk))
+             for chunk in chunks]
+
+    key = client_key(http_request, user)
+    if costs:
+        await enforce_rate_limit(http_request, user, costs[0])
+
+    async def event_stream():
+        semaphore = asyncio.Semaphore(STREAM_CONCURRENCY)
+        started = time.monotonic()
+
+        async def run(chunk_index, chunk):
+            async with semaphore:
+                if chunk_index > 0:
+                    await wait_for_tokens(key, costs[chunk_index])
+                try:
+                    results = await run_in_threadpool(
+                        compute_features_stats, index_type, start_date, end_date, chunk)
+                    return {"chunk": chunk_index, "results": results}
+                except Exception as e:
+                    return {"chunk": chunk_index, "ids": [fid for fid, _ in chunk], "error": str(e)}
+
+        yield sse_event("start", {
+            "index_type": index_type,
+            "period": {"start_date": start_date, "end_date": end_date},
+            "total_features": len(items),
+            "total_chunks": len(chunks),
+            "rejected": rejected
+        })
+
+        tasks = [asyncio.create_task(run(i, chunk)) for i, chunk in enumerate(chunks)]
+        done_features = 0
+        failed_chunks = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if "error" in result:
+                    failed_chunks.append(result["chunk"])
+                    yield sse_event("error", result)
+                else:
+                    done_features += len(result["results"])
+                    yield sse_event("chunk", result)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        yield sse_event("summary", {
+            "completed_features": done_features,
+            "failed_chunks": failed_chunks,
+            "elapsed_seconds": round(time.monotonic() - started, 2)
+        })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.get("/health")
 async def ndvi_health_check():
     """Check if Earth Engine is initialized and working"""
     return {
         "earth_engine_initialized": EE_INITIALIZED,
         "status": "operational" if EE_INITIALIZED else "not configured",
-        "message": "Earth Engine is ready" if EE_INITIALIZED else "Please configure GEE authentication"
+        "message": "Earth Engine is ready" if EE_INITIALIZED else "Please configure GEE authentication",
+        "rate_limit": limiter.status()
     }
@@ -1,43 +1,154 @@
 """
 Survey Router
 Provides endpoints for survey form functionality including saving parcels and calculating indices
+
+All queries run on the shared asyncpg pool, so the event loop never blocks on
+Postgres. asyncpg prepares and caches every statement per connection, and
+the `geom` column is exchanged as binary EWKB (see app.utils.wkb) instead
+of WKT/GeoJSON text.
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime, date
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from contextlib import asynccontextmanager
+from datetime import datetime, date, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from decimal import Decimal
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
 import os
+import re
+import asyncpg
 import ee
 
-router = APIRouter(prefix="/api/survey", tags=["Survey"])
+from app.database import DB_POOL_TIMEOUT, get_async_pool, init_async_pool, record_pool_timeout
+from app.dependencies import get_current_user
+from app.utils.cache import TTLCache
+from app.utils.parcel_export import EXPORT_FORMATS, export_encoder, export_query
+from app.utils.parcel_import import IMPORT_FORMATS, guess_format, import_parcels, iter_import_rows
+from app.utils.rate_limit import COST_STATS_REFRESH, rate_limit
+from app.workers.change_feed import change_feed
+from app.workers.enrichment import queue_status, wake_enrichment_worker
 
-# Database connection parameters
-DB_CONFIG = {
-    "host": os.getenv("POSTGRES_HOST", "postgis"),
-    "database": os.getenv("POSTGRES_DB", "cmu_apsco_db"),
-    "user": os.getenv("POSTGRES_USER", "postgres"),
-    "password": os.getenv("POSTGRES_PASSWORD", "postgres"),
-    "port": int(os.getenv("POSTGRES_PORT", 5432))
-}
+router = APIRouter(prefix="/api/survey", tags=["Survey"])
 
 
-def get_db_connection():
-    """Get PostgreSQL database connection"""
+@asynccontextmanager
+async def get_db_connection():
+    """Acquire an asyncpg connection from the shared pool"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
+        pool = get_async_pool() or await init_async_pool()
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Database connection error: {str(e)}")
 
+    try:
+        conn = await pool.acquire(timeout=DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        record_pool_timeout()
+        raise HTTPException(
+            status_code=503, detail="Database busy, please retry",
+            headers={"Retry-After": "1"})
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+class QueryParams(list):
+    """Collects query arguments and hands out asyncpg placeholders ($1, $2, ...)"""
+
+    def add(self, value) -> str:
+        self.append(value)
+        return f"${len(self)}"
+
+
+def parse_date(value: Optional[str], field: str) -> Optional[date]:
+    """Parse a YYYY-MM-DD string (asyncpg requires date objects for DATE columns)"""
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail=f"{field} must be a date in YYYY-MM-DD format")
+
+
+def record_to_dict(record) -> dict:
+    """Convert an asyncpg record to a JSON-serializable dict"""
+    result = dict(record)
+    for key, value in result.items():
+        if isinstance(value, Decimal):
+            result[key] = float(value)
+        elif isinstance(value, (date, datetime)):
+            result[key] = value.isoformat()
+    return result
+
+
+async def get_data_version(conn):
+    """Current survey_data_version row (version, updated_at), bumped by every change to survey_parcels"""
+    return await conn.fetchrow("SELECT version, updated_at FROM survey_data_version")
+
+
+def conditional_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    """ETag/Last-Modified headers; clients must revalidate before reusing a response"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            # TIMESTAMP columns hold the database server's UTC time
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Evaluate If-None-Match (weak comparison) or, when absent, If-Modified-Since
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+async def data_version_validators(request: Request):
+    """
+    ETag and Last-Modified of responses derived from the whole table
+
+    The ETag combines the data version with the query string, so every
+    filter/page combination has its own validator. Costs one primary key
+    lookup.
+    """
+    async with get_db_connection() as conn:
+        row = await get_data_version(conn)
+    query_hash = hashlib.sha1(request.url.query.encode()).hexdigest()[:12]
+    etag = f'W/"v{row["version"]}-{query_hash}"'
+    return etag, row["updated_at"]
+
 
 class SurveyParcelCreate(BaseModel):
     parcel_name: str
     description: Optional[str] = None
-    geometry: dict  # GeoJSON geometry
+    geometry: dict  # GeoJSON Polygon or MultiPolygon
     surveyor_name: Optional[str] = None
     selected_index: str  # NDVI, NDMI, or SPI
     index_date_start: str  # YYYY-MM-DD
@@ -56,6 +167,7 @@ class SurveyParcelCreate(BaseModel):
 class SurveyParcelUpdate(BaseModel):
     parcel_name: Optional[str] = None
     description: Optional[str] = None
+    geometry: Optional[dict] = None  # GeoJSON Polygon or MultiPolygon
     surveyor_name: Optional[str] = None
     selected_index: Optional[str] = None
     index_date_start: Optional[str] = None
@@ -71,300 +183,1216 @@ class SurveyParcelUpdate(BaseModel):
     notes: Optional[str] = None
 
 
+# Geometry types accepted for parcels
+PARCEL_GEOMETRY_TYPES = ("Polygon", "MultiPolygon")
+
+# Columns returned by the list and detail endpoints (geom decoded to GeoJSON by the codec)
+PARCEL_COLUMNS = """
+    id, parcel_name, description, surveyor_name,
+    selected_index, index_date_start, index_date_end,
+    index_mean, index_min, index_max, index_std_dev,
+    interpretation, area_hectares, province, land_use,
+    crop_type, notes, survey_date, created_at
+"""
+
+# Duplicate detection: parcels overlapping a new geometry with an
+# intersection-over-union at or above the threshold are duplicates.
+# warn: save and return them, reject: 409, merge: update the best match
+DUPLICATE_POLICIES = ("warn", "reject", "merge")
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "warn")
+DUPLICATE_IOU_THRESHOLD = float(os.getenv("DUPLICATE_IOU_THRESHOLD", "0.8"))
+DUPLICATE_MAX_CANDIDATES = 10
+
+# Only parcels whose bounding box overlaps the new geometry (GIST index) and
+# whose area is close enough to ever reach the threshold get an intersection
+DUPLICATE_CANDIDATES_SQL = """
+    SELECT id, parcel_name, survey_date, area_hectares, iou
+    FROM (
+        SELECT p.id, p.parcel_name, p.survey_date, p.area_hectares::float8 AS area_hectares,
+               survey_parcel_iou(p.geom, c.geom) AS iou
+        FROM (SELECT survey_clean_geometry($1) AS geom) c
+        JOIN survey_parcels p ON p.geom && c.geom
+        WHERE ST_Intersects(p.geom, c.geom)
+          AND survey_parcel_iou_bound(p.geom, c.geom) >= $2
+          AND ($3::int IS NULL OR p.id <> $3)
+    ) candidates
+    WHERE iou >= $2
+    ORDER BY iou DESC, id
+    LIMIT $4
+"""
+
+
+def duplicate_settings(policy: Optional[str], iou_threshold: Optional[float]):
+    """Duplicate policy and IoU threshold of a request (defaults from the environment)"""
+    policy = policy or DUPLICATE_POLICY
+    if policy not in DUPLICATE_POLICIES:
+        raise HTTPException(
+            status_code=400, detail=f"duplicate_policy must be one of: {', '.join(DUPLICATE_POLICIES)}")
+    return policy, DUPLICATE_IOU_THRESHOLD if iou_threshold is None else iou_threshold
+
+
+async def find_duplicate_parcels(conn, geometry: dict, iou_threshold: float,
+                                 exclude_id: Optional[int] = None) -> List[dict]:
+    """
+    Existing parcels overlapping a geometry with an IoU >= iou_threshold
+
+    Args:
+        conn: asyncpg connection
+        geometry: GeoJSON Polygon or MultiPolygon (repaired as it would be on save)
+        iou_threshold: Minimum intersection-over-union
+        exclude_id: Parcel to ignore (the one being updated)
+
+    Returns:
+        Candidates ordered by IoU, best first
+    """
+    rows = await conn.fetch(
+        DUPLICATE_CANDIDATES_SQL, geometry, iou_threshold, exclude_id, DUPLICATE_MAX_CANDIDATES)
+    return [record_to_dict(row) for row in rows]
+
+
+def duplicate_conflict(duplicates: List[dict]) -> HTTPException:
+    return HTTPException(status_code=409, detail={
+        "message": "Parcel duplicates an existing parcel",
+        "duplicates": duplicates
+    })
+
+
+# Update the best duplicate with a redrawn parcel. Submitted values win;
+# optional ones left out keep the existing values. Index statistics are
+# kept when the index and period are unchanged (the geometries overlap by
+# at least the IoU threshold), otherwise cleared for re-enrichment.
+MERGE_DUPLICATE_SQL = """
+    UPDATE survey_parcels SET
+        parcel_name = $2,
+        description = coalesce($3, description),
+        geom = survey_clean_geometry($4),
+        surveyor_name = coalesce($5, surveyor_name),
+        index_mean = CASE WHEN $9::float8 IS NOT NULL THEN $9::float8
+            WHEN selected_index = $6 AND index_date_start = $7 AND index_date_end = $8 THEN index_mean END,
+        index_min = CASE WHEN $9::float8 IS NOT NULL THEN $10::float8
+            WHEN selected_index = $6 AND index_date_start = $7 AND index_date_end = $8 THEN index_min END,
+        index_max = CASE WHEN $9::float8 IS NOT NULL THEN $11::float8
+            WHEN selected_index = $6 AND index_date_start = $7 AND index_date_end = $8 THEN index_max END,
+        index_std_dev = CASE WHEN $9::float8 IS NOT NULL THEN $12::float8
+            WHEN selected_index = $6 AND index_date_start = $7 AND index_date_end = $8 THEN index_std_dev END,
+        selected_index = $6,
+        index_date_start = $7,
+        index_date_end = $8,
+        interpretation = coalesce($13, interpretation),
+        province = coalesce($14, province),
+        land_use = coalesce($15, land_use),
+        crop_type = coalesce($16, crop_type),
+        notes = coalesce($17, notes)
+    WHERE id = $1
+    RETURNING id, parcel_name, area_hectares, created_at, index_mean
+"""
+
+
 @router.post("/parcels")
-async def create_survey_parcel(parcel: SurveyParcelCreate):
+async def create_survey_parcel(
+    parcel: SurveyParcelCreate,
+    duplicate_policy: Optional[str] = Query(None, description="warn, reject or merge (default: DUPLICATE_POLICY)"),
+    iou_threshold: Optional[float] = Query(None, gt=0, le=1, description="Minimum IoU of a duplicate (default: DUPLICATE_IOU_THRESHOLD)")
+):
     """
     Create a new survey parcel with geometry and drought index data
+
+    The geometry may be a Polygon (with holes) or a MultiPolygon. It is
+    repaired in PostgreSQL (survey_clean_geometry: ST_MakeValid, polygonal
+    parts only, coordinates snapped to 1e-7 degrees) rather than rejected.
+
+    Existing parcels overlapping it with an IoU of at least `iou_threshold`
+    are duplicates. Depending on `duplicate_policy` the parcel is saved and
+    the duplicates listed (warn), refused with 409 (reject) or saved over
+    the best matching duplicate (merge).
     """
-    conn = get_db_connection()
+    if parcel.geometry.get("type") not in PARCEL_GEOMETRY_TYPES:
+        raise HTTPException(
+            status_code=400, detail="geometry must be a GeoJSON Polygon or MultiPolygon")
+
+    policy, iou_threshold = duplicate_settings(duplicate_policy, iou_threshold)
+    index_date_start = parse_date(parcel.index_date_start, "index_date_start")
+    index_date_end = parse_date(parcel.index_date_end, "index_date_end")
+    values = (
+        parcel.parcel_name,
+        parcel.description,
+        parcel.geometry,
+        parcel.surveyor_name,
+        parcel.selected_index,
+        index_date_start,
+        index_date_end,
+        parcel.index_mean,
+        parcel.index_min,
+        parcel.index_max,
+        parcel.index_std_dev,
+        parcel.interpretation,
+        parcel.province,
+        parcel.land_use,
+        parcel.crop_type,
+        parcel.notes
+    )
+
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Convert GeoJSON geometry to WKT
-            coordinates = parcel.geometry['coordinates'][0]
-            wkt_coords = ', '.join([f"{lon} {lat}" for lon, lat in coordinates])
-            wkt = f"POLYGON(({wkt_coords}))"
-
-            # Insert parcel
-            cur.execute("""
-                INSERT INTO survey_parcels
-                (parcel_name, description, geom, surveyor_name, selected_index,
-                 index_date_start, index_date_end, index_mean, index_min, index_max,
-                 index_std_dev, interpretation, province, land_use, crop_type, notes)
-                VALUES (%s, %s, ST_GeomFromText(%s, 4326), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id, parcel_name, area_hectares, created_at
-            """, (
-                parcel.parcel_name,
-                parcel.description,
-                wkt,
-                parcel.surveyor_name,
-                parcel.selected_index,
-                parcel.index_date_start,
-                parcel.index_date_end,
-                parcel.index_mean,
-                parcel.index_min,
-                parcel.index_max,
-                parcel.index_std_dev,
-                parcel.interpretation,
-                parcel.province,
-                parcel.land_use,
-                parcel.crop_type,
-                parcel.notes
-            ))
-
-            result = cur.fetchone()
-            conn.commit()
-
-            return {
-                "success": True,
-                "message": "Survey parcel created successfully",
-                "data": {
-                    "id": result['id'],
-                    "parcel_name": result['parcel_name'],
-                    "area_hectares": float(result['area_hectares']) if result['area_hectares'] else None,
-                    "created_at": result['created_at'].isoformat()
-                }
+        async with get_db_connection() as conn:
+            async with conn.transaction():
+                if policy != "warn":
+                    # Serialize checked inserts so two uploads of the same
+                    # field cannot both pass the check
+                    await conn.execute("SELECT pg_advisory_xact_lock(hashtext('survey_parcel_duplicates'))")
+                duplicates = await find_duplicate_parcels(conn, parcel.geometry, iou_threshold)
+
+                if duplicates and policy == "reject":
+                    raise duplicate_conflict(duplicates)
+
+                merged_into = None
+                if duplicates and policy == "merge":
+                    merged_into = duplicates[0]['id']
+                    result = await conn.fetchrow(MERGE_DUPLICATE_SQL, merged_into, *values)
+                else:
+                    # Geometry is sent as binary EWKB through the geometry codec
+                    result = await conn.fetchrow("""
+                        INSERT INTO survey_parcels
+                        (parcel_name, description, geom, surveyor_name, selected_index,
+                         index_date_start, index_date_end, index_mean, index_min, index_max,
+                         index_std_dev, interpretation, province, land_use, crop_type, notes)
+                        VALUES ($1, $2, survey_clean_geometry($3), $4, $5, $6, $7, $8::float8, $9::float8, $10::float8,
+                                $11::float8, $12, $13, $14, $15, $16)
+                        RETURNING id, parcel_name, area_hectares, created_at, index_mean
+                    """, *values)
+
+        MVT_CACHE.clear()
+        if result['index_mean'] is None:
+            wake_enrichment_worker()
+
+        return {
+            "success": True,
+            "message": (f"Survey parcel merged into existing parcel {merged_into}" if merged_into
+                        else "Survey parcel created successfully"),
+            "data": {
+                "id": result['id'],
+                "parcel_name": result['parcel_name'],
+                "area_hectares": float(result['area_hectares']) if result['area_hectares'] else None,
+                "created_at": result['created_at'].isoformat(),
+                "merged_into": merged_into,
+                "duplicates": duplicates
             }
+        }
 
+    except HTTPException:
+        raise
+    except asyncpg.DataError as e:
+        # Raised by the geometry codec for malformed coordinates
+        raise HTTPException(status_code=400, detail=f"Invalid geometry: {str(e)}")
+    except asyncpg.NotNullViolationError as e:
+        if e.column_name != "geom":
+            raise HTTPException(
+                status_code=400, detail=f"Missing value: {e.column_name}")
+        raise HTTPException(
+            status_code=400, detail="Geometry has no polygonal area after repair")
     except Exception as e:
-        conn.rollback()
         raise HTTPException(
             status_code=500, detail=f"Error creating survey parcel: {str(e)}")
+
+
+@router.post("/parcels/import")
+async def import_survey_parcels(
+    file: UploadFile = File(..., description="GeoJSON FeatureCollection, GeoJSON sequence or CSV with a WKT column"),
+    import_format: Optional[str] = Query(None, alias="format", description="geojson, geojsonseq or csv (default: from file name)"),
+    dry_run: bool = Query(False, description="Validate only, do not insert"),
+    all_or_nothing: bool = Query(False, description="Insert nothing if any row is invalid")
+):
+    """
+    Bulk import survey parcels
+
+    Rows are streamed into a staging table with COPY, validated in SQL and
+    merged into survey_parcels in one transaction. Invalid rows are skipped
+    (or abort the import with `all_or_nothing`) and reported with their row
+    number: the feature index for GeoJSON, the line number for CSV and
+    GeoJSON sequences.
+    """
+    import_format = import_format or guess_format(file.filename)
+    if import_format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        rows = iter_import_rows(stream, import_format)
+        async with get_db_connection() as conn:
+            result = await import_parcels(
+                conn, rows, dry_run=dry_run, all_or_nothing=all_or_nothing)
+
+        if result["inserted"]:
+            MVT_CACHE.clear()
+            wake_enrichment_worker()
+
+        return {
+            "success": True,
+            "message": f"Imported {result['inserted']} of {result['received']} parcels",
+            "data": result
+        }
+
+    except HTTPException:
+        raise
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid import file: {str(e)}")
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error importing survey parcels: {str(e)}")
     finally:
-        conn.close()
+        stream.detach()
+
+
+def encode_token(values: list) -> str:
+    """Encode a list of JSON values as an opaque URL-safe token"""
+    payload = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_token(token: str) -> list:
+    """Decode a token produced by encode_token (raises ValueError if malformed)"""
+    padded = token + '=' * (-len(token) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded))
+    if not isinstance(values, list):
+        raise ValueError("token is not a list")
+    return values
+
+
+def encode_cursor(created_at: datetime, parcel_id: int) -> str:
+    """Encode the (created_at, id) position of a parcel as an opaque cursor"""
+    return encode_token([created_at.isoformat(), parcel_id])
+
+
+def decode_cursor(cursor: str):
+    """Decode a cursor produced by encode_cursor into (created_at, id)"""
+    try:
+        created_at, parcel_id = decode_token(cursor)
+        return datetime.fromisoformat(created_at), int(parcel_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_bbox(bbox: str) -> List[float]:
+    """Parse a minLon,minLat,maxLon,maxLat string"""
+    try:
+        values = [float(v) for v in bbox.split(',')]
+    except ValueError:
+        values = []
+    if (len(values) != 4 or values[0] >= values[2] or values[1] >= values[3]
+            or not (-180 <= values[0] and values[2] <= 180 and -90 <= values[1] and values[3] <= 90)):
+        raise HTTPException(
+            status_code=400, detail="bbox must be minLon,minLat,maxLon,maxLat")
+    return values
+
+
+def zoom_tolerance(zoom: float):
+    """
+    Simplification tolerance (degrees) and coordinate precision for a map zoom
+
+    The tolerance is the width of one 256px-tile pixel at that zoom, so the
+    simplified outline is indistinguishable on screen.
+    """
+    tolerance = 360.0 / (256 * 2 ** zoom)
+    decimals = max(1, min(9, math.ceil(-math.log10(tolerance)) + 1))
+    return tolerance, decimals
+
+
+def parcel_filters(params: QueryParams, index_type: Optional[str], province: Optional[str],
+                   envelope: Optional[List[float]], season: Optional[int] = None) -> str:
+    """
+    SQL conditions (each starting with AND) for the shared parcel filters
+
+    `season` restricts survey_date to one year, which lets PostgreSQL scan
+    only that year's partition of survey_parcels.
+    """
+    filters = ""
+
+    if season is not None:
+        filters += " AND survey_date >= make_date({0}, 1, 1) AND survey_date < make_date({0} + 1, 1, 1)".format(
+            params.add(season))
+
+    if envelope:
+        filters += " AND geom && ST_MakeEnvelope({}, {}, {}, {}, 4326)".format(
+            *[params.add(v) for v in envelope])
+
+    if index_type:
+        filters += f" AND selected_index = {params.add(index_type)}"
+
+    if province:
+        filters += f" AND province = {params.add(province)}"
+
+    return filters
 
 
 @router.get("/parcels")
 async def get_survey_parcels(
+    request: Request,
+    response: Response,
     limit: int = Query(100, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
     index_type: Optional[str] = Query(None),
-    province: Optional[str] = Query(None)
+    province: Optional[str] = Query(None),
+    season: Optional[int] = Query(None, ge=1900, le=2200, description="Survey season year (scans only that partition)"),
+    bbox: Optional[str] = Query(None, description="Viewport as minLon,minLat,maxLon,maxLat"),
+    zoom: Optional[float] = Query(None, ge=0, le=24, description="Map zoom used to simplify geometries"),
+    response_format: str = Query("json", alias="format", description="json or geojson (FeatureCollection)"),
+    precision: int = Query(6, ge=0, le=15, description="GeoJSON coordinate decimals (geojson format)")
 ):
     """
     Get list of survey parcels with optional filtering
+
+    Pages can be fetched with limit/offset or, at constant cost regardless of
+    depth, by passing the previous response's `next_cursor` (keyset
+    pagination on created_at, id).
+
+    With `bbox` only parcels intersecting the viewport are returned (GIST
+    index); with `zoom` geometries are simplified to about one screen pixel
+    and coordinates snapped to match.
+
+    With `format=geojson` PostgreSQL builds the whole FeatureCollection and
+    the JSON text is passed through without being parsed in Python.
+
+    Responses carry an ETag derived from the table's data version; a request
+    with a matching If-None-Match gets 304 without running the query.
     """
-    conn = get_db_connection()
+    if response_format not in ("json", "geojson"):
+        raise HTTPException(status_code=400, detail="format must be json or geojson")
+
+    keyset = decode_cursor(cursor) if cursor else None
+    envelope = parse_bbox(bbox) if bbox else None
+
+    etag, last_modified = await data_version_validators(request)
+    headers = conditional_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Build query with filters
-            query = """
-                SELECT
-                    id, parcel_name, description, surveyor_name,
-                    selected_index, index_date_start, index_date_end,
-                    index_mean, index_min, index_max, index_std_dev,
-                    interpretation, area_hectares, province, land_use,
-                    crop_type, notes, survey_date, created_at,
-                    ST_AsGeoJSON(geom) as geometry
+        params = QueryParams()
+
+        if zoom is not None:
+            tolerance, decimals = zoom_tolerance(zoom)
+            simplified_sql = f"ST_SimplifyPreserveTopology(geom, {params.add(tolerance)})"
+            precision = min(precision, decimals)
+        else:
+            simplified_sql = "geom"
+
+        # Build filters
+        filters = parcel_filters(params, index_type, province, envelope, season)
+
+        if keyset:
+            filters += f" AND (created_at, id) < ({params.add(keyset[0])}, {params.add(keyset[1])})"
+
+        limit_sql = params.add(limit)
+        page_sql = f" ORDER BY created_at DESC, id DESC LIMIT {limit_sql}"
+        if not keyset:
+            page_sql += f" OFFSET {params.add(offset)}"
+
+        if response_format == "geojson":
+            async with get_db_connection() as conn:
+                feature_collection = await conn.fetchval(f"""
+                    WITH page AS (
+                        SELECT {PARCEL_COLUMNS}, {simplified_sql} AS geometry
+                        FROM survey_parcels
+                        WHERE 1=1 {filters}
+                        {page_sql}
+                    )
+                    SELECT json_build_object(
+                        'type', 'FeatureCollection',
+                        'count', count(*),
+                        'next_cursor', CASE WHEN count(*) = {limit_sql} THEN
+                            translate(rtrim(encode(convert_to(
+                                ((array_agg(json_build_array(created_at, id)
+                                            ORDER BY created_at, id))[1])::text,
+                                'UTF8'), 'base64'), '='), E'+/\\n', '-_')
+                        END,
+                        'features', COALESCE(json_agg(json_build_object(
+                            'type', 'Feature',
+                            'id', id,
+                            'geometry', ST_AsGeoJSON(geometry, {params.add(precision)})::json,
+                            'properties', to_jsonb(page) - 'geometry'
+                        ) ORDER BY created_at DESC, id DESC), '[]')
+                    )::text
+                    FROM page
+                """, *params)
+            return Response(content=feature_collection, media_type="application/geo+json", headers=headers)
+
+        if zoom is not None:
+            geometry_sql = f"ST_SnapToGrid({simplified_sql}, {params.add(10.0 ** -decimals)})"
+        else:
+            geometry_sql = "geom"
+
+        async with get_db_connection() as conn:
+            parcels = await conn.fetch(f"""
+                SELECT {PARCEL_COLUMNS}, {geometry_sql} as geometry
                 FROM survey_parcels
-                WHERE 1=1
-            """
-            params = []
-
-            if index_type:
-                query += " AND selected_index = %s"
-                params.append(index_type)
-
-            if province:
-                query += " AND province = %s"
-                params.append(province)
-
-            query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
-
-            cur.execute(query, params)
-            parcels = cur.fetchall()
-
-            # Convert to JSON-serializable format
-            result = []
-            for parcel in parcels:
-                parcel_dict = dict(parcel)
-                # Parse geometry JSON
-                if parcel_dict['geometry']:
-                    import json
-                    parcel_dict['geometry'] = json.loads(parcel_dict['geometry'])
-                # Convert decimals to floats
-                for key in ['index_mean', 'index_min', 'index_max', 'index_std_dev', 'area_hectares']:
-                    if parcel_dict[key] is not None:
-                        parcel_dict[key] = float(parcel_dict[key])
-                # Convert dates to ISO format
-                for key in ['index_date_start', 'index_date_end']:
-                    if parcel_dict[key]:
-                        parcel_dict[key] = parcel_dict[key].isoformat()
-                if parcel_dict['survey_date']:
-                    parcel_dict['survey_date'] = parcel_dict['survey_date'].isoformat()
-                if parcel_dict['created_at']:
-                    parcel_dict['created_at'] = parcel_dict['created_at'].isoformat()
-                result.append(parcel_dict)
-
-            return {
-                "success": True,
-                "count": len(result),
-                "parcels": result
-            }
+                WHERE 1=1 {filters}
+                {page_sql}
+            """, *params)
+
+        next_cursor = None
+        if len(parcels) == limit and parcels[-1]['created_at']:
+            next_cursor = encode_cursor(parcels[-1]['created_at'], parcels[-1]['id'])
 
+        result = [record_to_dict(parcel) for parcel in parcels]
+
+        return {
+            "success": True,
+            "count": len(result),
+            "parcels": result,
+            "next_cursor": next_cursor
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error fetching survey parcels: {str(e)}")
-    finally:
-        conn.close()
 
 
-@router.get("/parcels/{parcel_id}")
-async def get_survey_parcel(parcel_id: int):
+# Columns returned by the search endpoint
+SEARCH_COLUMNS = """
+    id, parcel_name, description, surveyor_name, selected_index,
+    index_mean, interpretation, area_hectares, province, land_use,
+    crop_type, notes, created_at
+"""
+SEARCH_MAX_TERMS = 10
+
+
+def search_terms(q: str) -> List[str]:
+    """Words of a search query (letters, digits and Thai characters, including vowel marks)"""
+    return re.findall(r'[\w\u0e00-\u0e7f]+', q.lower())[:SEARCH_MAX_TERMS]
+
+
+@router.get("/search")
+async def search_survey_parcels(
+    q: str = Query(..., min_length=1, max_length=200, description="Search text"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    fuzzy: bool = Query(True, description="Also match similar spellings (trigram word similarity)"),
+    index_type: Optional[str] = Query(None),
+    province: Optional[str] = Query(None),
+    season: Optional[int] = Query(None, ge=1900, le=2200, description="Survey season year (scans only that partition)"),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat")
+):
     """
-    Get a specific survey parcel by ID
+    Search parcels by name, crop, surveyor, description and notes
+
+    Every query word is matched as a prefix against the weighted full-text
+    column (GIN index); with `fuzzy` the text is also matched by trigram word
+    similarity so misspellings are found. Results are ranked (name matches
+    first) and paged with `next_cursor` on (rank, id).
     """
-    conn = get_db_connection()
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="q must contain at least one word")
+
+    envelope = parse_bbox(bbox) if bbox else None
+    keyset = None
+    if cursor:
+        try:
+            rank, parcel_id = decode_token(cursor)
+            keyset = (float(rank), int(parcel_id))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    params = QueryParams()
+    tsquery_sql = f"to_tsquery('simple', {params.add(' & '.join(term + ':*' for term in terms))})"
+    text_sql = params.add(' '.join(terms))
+    match_sql = f"search_vector @@ {tsquery_sql}"
+    if fuzzy:
+        match_sql = f"({match_sql} OR {text_sql} <% search_text)"
+    filters = parcel_filters(params, index_type, province, envelope, season)
+    keyset_sql = ""
+    if keyset:
+        keyset_sql = f"WHERE (rank, id) < ({params.add(keyset[0])}::float8, {params.add(keyset[1])})"
+
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT
-                    id, parcel_name, description, surveyor_name,
-                    selected_index, index_date_start, index_date_end,
-                    index_mean, index_min, index_max, index_std_dev,
-                    interpretation, area_hectares, province, land_use,
-                    crop_type, notes, survey_date, created_at, updated_at,
-                    ST_AsGeoJSON(geom) as geometry
-                FROM survey_parcels
-                WHERE id = %s
-            """, (parcel_id,))
+        async with get_db_connection() as conn:
+            results = await conn.fetch(f"""
+                SELECT {SEARCH_COLUMNS}, rank,
+                    ts_headline('simple', coalesce(description, '') || ' ' || coalesce(notes, ''),
+                                {tsquery_sql}, 'MaxFragments=1, MaxWords=20, MinWords=5') AS headline
+                FROM (
+                    SELECT {SEARCH_COLUMNS},
+                        (ts_rank_cd(search_vector, {tsquery_sql})
+                         + word_similarity({text_sql}, search_text))::float8 AS rank
+                    FROM survey_parcels
+                    WHERE {match_sql} {filters}
+                ) matches
+                {keyset_sql}
+                ORDER BY rank DESC, id DESC
+                LIMIT {params.add(limit)}
+            """, *params)
+
+        next_cursor = None
+        if len(results) == limit:
+            next_cursor = encode_token([results[-1]['rank'], results[-1]['id']])
+
+        return {
+            "success": True,
+            "query": q,
+            "count": len(results),
+            "results": [record_to_dict(result) for result in results],
+            "next_cursor": next_cursor
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error searching survey parcels: {str(e)}")
+
+
+# Rows fetched from the export cursor per round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+
+@router.get("/parcels/export")
+async def export_survey_parcels(
+    export_format: str = Query("geojsonseq", alias="format", description="geojsonseq, geojson, csv, arrow or parquet"),
+    index_type: Optional[str] = Query(None),
+    province: Optional[str] = Query(None),
+    season: Optional[int] = Query(None, ge=1900, le=2200, description="Survey season year (scans only that partition)"),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    precision: int = Query(6, ge=0, le=15, description="GeoJSON coordinate decimals")
+):
+    """
+    Export survey parcels as a streamed download
+
+    Rows are read through a server-side cursor EXPORT_BATCH_SIZE at a time
+    and encoded as they arrive, so memory use stays constant however many
+    parcels are exported. Formats: GeoJSON text sequence (default), GeoJSON
+    FeatureCollection, CSV with WKT, Arrow IPC stream and GeoParquet (the
+    last two need pyarrow).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    try:
+        encoder = export_encoder(export_format)
+    except ImportError:
+        raise HTTPException(
+            status_code=501, detail=f"{export_format} export requires pyarrow")
+
+    envelope = parse_bbox(bbox) if bbox else None
+    params = QueryParams()
+    where_sql = "WHERE 1=1" + parcel_filters(params, index_type, province, envelope, season)
+    precision_sql = params.add(precision) if export_format in ("geojson", "geojsonseq") else ""
+    query = export_query(export_format, where_sql, precision_sql)
+
+    # Arrow/Parquet encoding of a batch is CPU-bound; keep it off the event loop
+    if export_format in ("arrow", "parquet"):
+        async def encode(method, *args):
+            return await run_in_threadpool(method, *args)
+    else:
+        async def encode(method, *args):
+            return method(*args)
+
+    async def stream():
+        # The connection is acquired only once the body is sent and held
+        # until the last chunk, so a client that goes away before that never
+        # ties up a pooled connection
+        try:
+            yield await encode(encoder.start)
+            async with get_db_connection() as conn:
+                async with conn.transaction(readonly=True):
+                    cursor = await conn.cursor(query, *params)
+                    while True:
+                        records = await cursor.fetch(EXPORT_BATCH_SIZE)
+                        if not records:
+                            break
+                        chunk = await encode(encoder.write, records)
+                        if chunk:
+                            yield chunk
+            yield await encode(encoder.finish)
+        except Exception as e:
+            print(f"Error exporting survey parcels: {str(e)}")
+            raise
+
+    media_type, extension = EXPORT_FORMATS[export_format]
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="survey_parcels.{extension}"'}
+    )
+
+
+def duplicate_clusters(pairs) -> List[dict]:
+    """Group duplicate pairs into clusters (connected components, union-find)"""
+    parent = {}
+
+    def find(parcel_id):
+        parent.setdefault(parcel_id, parcel_id)
+        while parent[parcel_id] != parcel_id:
+            parent[parcel_id] = parent[parent[parcel_id]]
+            parcel_id = parent[parcel_id]
+        return parcel_id
+
+    for pair in pairs:
+        parent[find(pair['a'])] = find(pair['b'])
+
+    clusters = {}
+    for pair in pairs:
+        cluster = clusters.setdefault(find(pair['a']), {"parcel_ids": set(), "pairs": []})
+        cluster["parcel_ids"].update((pair['a'], pair['b']))
+        cluster["pairs"].append(pair)
+
+    return sorted(
+        ({"parcel_ids": sorted(cluster["parcel_ids"]),
+          "max_iou": max(pair['iou'] for pair in cluster["pairs"]),
+          "pairs": cluster["pairs"]} for cluster in clusters.values()),
+        key=lambda cluster: cluster["parcel_ids"][0])
+
+
+@router.get("/parcels/duplicates")
+async def get_duplicate_parcels(
+    iou_threshold: Optional[float] = Query(None, gt=0, le=1, description="Minimum IoU of a duplicate (default: DUPLICATE_IOU_THRESHOLD)"),
+    index_type: Optional[str] = Query(None),
+    province: Optional[str] = Query(None),
+    season: Optional[int] = Query(None, ge=1900, le=2200, description="Survey season year (scans only that partition)"),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    limit: int = Query(1000, ge=1, le=10000, description="Maximum number of duplicate pairs")
+):
+    """
+    Find clusters of duplicate parcels in the whole table
+
+    Spatial self-join: every parcel probes the GIST index for later parcels
+    (higher id) whose bounding box overlaps it, so each pair is examined
+    once and intersections are only computed for overlapping pairs of
+    similar size. Pairs with an IoU >= iou_threshold are grouped into
+    clusters of parcels that are all (transitively) duplicates.
+    """
+    _, iou_threshold = duplicate_settings(None, iou_threshold)
+    envelope = parse_bbox(bbox) if bbox else None
+
+    params = QueryParams()
+    threshold_sql = params.add(iou_threshold)
+    # Used for both sides of the join; unqualified columns resolve to the
+    # innermost survey_parcels reference
+    filters = parcel_filters(params, index_type, province, envelope, season)
+
+    try:
+        async with get_db_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT a.id AS a, b.id AS b, b.iou
+                FROM survey_parcels a
+                CROSS JOIN LATERAL (
+                    SELECT id, iou
+                    FROM (
+                        SELECT p.id, survey_parcel_iou(a.geom, p.geom) AS iou
+                        FROM survey_parcels p
+                        WHERE p.geom && a.geom AND p.id > a.id
+                          AND ST_Intersects(p.geom, a.geom)
+                          AND survey_parcel_iou_bound(a.geom, p.geom) >= {threshold_sql}
+                          {filters}
+                    ) candidates
+                    WHERE iou >= {threshold_sql}
+                ) b
+                WHERE 1=1 {filters}
+                ORDER BY a.id, b.id
+                LIMIT {params.add(limit + 1)}
+            """, *params)
+
+        pairs = [{"a": row['a'], "b": row['b'], "iou": row['iou']} for row in rows[:limit]]
+        clusters = duplicate_clusters(pairs)
+
+        return {
+            "success": True,
+            "iou_threshold": iou_threshold,
+            "pair_count": len(pairs),
+            "truncated": len(rows) > limit,
+            "cluster_count": len(clusters),
+            "clusters": clusters
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error finding duplicate parcels: {str(e)}")
 
-            parcel = cur.fetchone()
 
-            if not parcel:
+# Vector tile settings
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MVT_MAX_ZOOM = 22
+MVT_CACHE = TTLCache(
+    maxsize=int(os.getenv("MVT_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("MVT_CACHE_TTL", "60"))
+)
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_survey_parcel_tile(
+    z: int,
+    x: int,
+    y: int,
+    index_type: Optional[str] = Query(None),
+    province: Optional[str] = Query(None)
+):
+    """
+    Get survey parcels as a Mapbox Vector Tile (layer `parcels`)
+
+    The tile is built by PostGIS (ST_AsMVT) using the GIST index on geom and
+    carries the index attributes needed for styling.
+    """
+    if not 0 <= z <= MVT_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f"Invalid tile {z}/{x}/{y}")
+
+    cache_key = (z, x, y, index_type, province)
+    tile = MVT_CACHE.get(cache_key)
+    cache_status = "HIT"
+
+    if tile is None:
+        cache_status = "MISS"
+        params = QueryParams([z, x, y, MVT_EXTENT, MVT_BUFFER, MVT_BUFFER / MVT_EXTENT])
+        filters = ""
+        if index_type:
+            filters += f" AND p.selected_index = {params.add(index_type)}"
+        if province:
+            filters += f" AND p.province = {params.add(province)}"
+
+        try:
+            async with get_db_connection() as conn:
+                tile = await conn.fetchval(f"""
+                    WITH mvtgeom AS (
+                        SELECT
+                            ST_AsMVTGeom(
+                                ST_Transform(p.geom, 3857),
+                                ST_TileEnvelope($1, $2, $3), $4, $5, true
+                            ) AS geom,
+                            p.id, p.parcel_name, p.selected_index,
+                            p.index_mean::float8 AS index_mean,
+                            p.index_min::float8 AS index_min,
+                            p.index_max::float8 AS index_max,
+                            p.interpretation,
+                            p.area_hectares::float8 AS area_hectares,
+                            p.province, p.land_use, p.crop_type
+                        FROM survey_parcels p
+                        WHERE p.geom && ST_Transform(
+                            ST_TileEnvelope($1, $2, $3, margin => $6), 4326)
+                        {filters}
+                    )
+                    SELECT ST_AsMVT(mvtgeom, 'parcels', $4, 'geom', 'id')
+                    FROM mvtgeom
+                    WHERE geom IS NOT NULL
+                """, *params)
+                tile = bytes(tile or b"")
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error generating parcel tile: {str(e)}")
+
+        MVT_CACHE.set(cache_key, tile)
+
+    headers = {
+        "Cache-Control": f"public, max-age={int(MVT_CACHE.ttl)}",
+        "X-Cache": cache_status
+    }
+    if not tile:
+        return Response(status_code=204, headers=headers)
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+
+# Hexagon binning settings (sizes are hexagon edge lengths in Web Mercator meters)
+HEXBIN_MIN_SIZE_KM = 0.1
+HEXBIN_MAX_SIZE_KM = 500
+HEXBIN_CELLS_PER_TILE = 8
+HEXBIN_CACHE = TTLCache(
+    maxsize=int(os.getenv("HEXBIN_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("HEXBIN_CACHE_TTL", "3600"))
+)
+
+# Parcels reduced to a representative point in EPSG:3857 and assigned to the
+# hexagon containing it (a LATERAL ST_HexagonGrid over the point only yields
+# the cells touching it, so no empty grid is ever generated)
+HEXBIN_CELLS_SQL = """
+    SELECT h.i, h.j, h.geom,
+        count(*) AS parcel_count,
+        sum(p.area_hectares)::float8 AS area_hectares,
+        (avg(p.index_mean) FILTER (WHERE p.selected_index = 'NDVI'))::float8 AS ndvi_mean,
+        (avg(p.index_mean) FILTER (WHERE p.selected_index = 'NDMI'))::float8 AS ndmi_mean,
+        (avg(p.index_mean) FILTER (WHERE p.selected_index = 'SPI'))::float8 AS spi_mean
+    FROM (
+        SELECT ST_Transform(ST_PointOnSurface(geom), 3857) AS point,
+               area_hectares, index_mean, selected_index
+        FROM survey_parcels
+        WHERE 1=1 {filters}
+    ) p
+    CROSS JOIN LATERAL (
+        SELECT i, j, geom FROM ST_HexagonGrid({size}::float8, p.point)
+        WHERE ST_Intersects(geom, p.point)
+        ORDER BY i, j
+        LIMIT 1
+    ) h
+    GROUP BY h.i, h.j, h.geom
+"""
+
+
+@router.get("/hexbins")
+async def get_survey_hexbins(
+    size_km: float = Query(10, ge=HEXBIN_MIN_SIZE_KM, le=HEXBIN_MAX_SIZE_KM, description="Hexagon edge length in km"),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    index_type: Optional[str] = Query(None),
+    province: Optional[str] = Query(None),
+    season: Optional[int] = Query(None, ge=1900, le=2200, description="Survey season year (scans only that partition)"),
+    precision: int = Query(5, ge=0, le=15, description="GeoJSON coordinate decimals")
+):
+    """
+    Get parcels binned into a hexagon grid as a GeoJSON FeatureCollection
+
+    Each cell carries the parcel count, total area and mean NDVI/NDMI/SPI of
+    the parcels whose representative point falls inside it. Only cells with
+    parcels are returned. Results are cached until the survey data changes.
+    """
+    envelope = parse_bbox(bbox) if bbox else None
+
+    try:
+        async with get_db_connection() as conn:
+            version = (await get_data_version(conn))['version']
+            cache_key = ("geojson", version, size_km, tuple(envelope or ()), index_type, province, season, precision)
+            collection = HEXBIN_CACHE.get(cache_key)
+            cache_status = "HIT"
+
+            if collection is None:
+                cache_status = "MISS"
+                params = QueryParams()
+                filters = parcel_filters(params, index_type, province, envelope, season)
+                cells_sql = HEXBIN_CELLS_SQL.format(
+                    filters=filters, size=params.add(size_km * 1000))
+                collection = await conn.fetchval(f"""
+                    SELECT json_build_object(
+                        'type', 'FeatureCollection',
+                        'size_km', {params.add(size_km)}::float8,
+                        'data_version', {params.add(version)}::bigint,
+                        'features', COALESCE(json_agg(json_build_object(
+                            'type', 'Feature',
+                            'id', cells.i || ':' || cells.j,
+                            'geometry', ST_AsGeoJSON(ST_Transform(cells.geom, 4326), {params.add(precision)})::json,
+                            'properties', json_build_object(
+                                'parcel_count', cells.parcel_count,
+                                'area_hectares', round(cells.area_hectares::numeric, 2),
+                                'ndvi_mean', round(cells.ndvi_mean::numeric, 4),
+                                'ndmi_mean', round(cells.ndmi_mean::numeric, 4),
+                                'spi_mean', round(cells.spi_mean::numeric, 2)
+                            )
+                        ) ORDER BY cells.i, cells.j), '[]')
+                    )::text
+                    FROM ({cells_sql}) cells
+                """, *params)
+                HEXBIN_CACHE.set(cache_key, collection)
+
+        return Response(
+            content=collection,
+            media_type="application/geo+json",
+            headers={"X-Cache": cache_status, "X-Data-Version": str(version)}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error binning survey parcels: {str(e)}")
+
+
+@router.get("/hexbins/{z}/{x}/{y}.mvt")
+async def get_survey_hexbin_tile(
+    z: int,
+    x: int,
+    y: int,
+    size_km: Optional[float] = Query(None, ge=HEXBIN_MIN_SIZE_KM, le=HEXBIN_MAX_SIZE_KM,
+                                     description="Hexagon edge length in km (default: about 8 cells per tile)"),
+    index_type: Optional[str] = Query(None),
+    province: Optional[str] = Query(None),
+    season: Optional[int] = Query(None, ge=1900, le=2200, description="Survey season year (scans only that partition)")
+):
+    """
+    Get hexagon-binned parcels as a Mapbox Vector Tile (layer `hexbins`)
+
+    The grid is aligned globally, so cells crossing tile edges carry the same
+    values in every tile. Tiles are cached until the survey data changes.
+    """
+    if not 0 <= z <= MVT_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f"Invalid tile {z}/{x}/{y}")
+
+    if size_km is None:
+        tile_width_m = 40075016.686 / 2 ** z
+        size_km = max(HEXBIN_MIN_SIZE_KM, min(HEXBIN_MAX_SIZE_KM, tile_width_m / HEXBIN_CELLS_PER_TILE / 1000))
+
+    try:
+        async with get_db_connection() as conn:
+            version = (await get_data_version(conn))['version']
+            cache_key = ("mvt", version, z, x, y, size_km, index_type, province, season)
+            tile = HEXBIN_CACHE.get(cache_key)
+            cache_status = "HIT"
+
+            if tile is None:
+                cache_status = "MISS"
+                params = QueryParams([z, x, y, MVT_EXTENT])
+                size_sql = params.add(size_km * 1000)
+                # Parcels just outside the tile can still fall in a cell that overlaps it
+                filters = (f" AND geom && ST_Transform(ST_Expand(ST_TileEnvelope($1, $2, $3), "
+                           f"2 * {size_sql}::float8), 4326)")
+                filters += parcel_filters(params, index_type, province, None, season)
+                cells_sql = HEXBIN_CELLS_SQL.format(filters=filters, size=size_sql)
+                tile = await conn.fetchval(f"""
+                    WITH mvtgeom AS (
+                        SELECT
+                            ST_AsMVTGeom(cells.geom, ST_TileEnvelope($1, $2, $3), $4, 0, true) AS geom,
+                            cells.i, cells.j, cells.parcel_count, cells.area_hectares,
+                            cells.ndvi_mean, cells.ndmi_mean, cells.spi_mean
+                        FROM ({cells_sql}) cells
+                        WHERE cells.geom && ST_TileEnvelope($1, $2, $3)
+                    )
+                    SELECT ST_AsMVT(mvtgeom, 'hexbins', $4, 'geom')
+                    FROM mvtgeom
+                    WHERE geom IS NOT NULL
+                """, *params)
+                tile = bytes(tile or b"")
+                HEXBIN_CACHE.set(cache_key, tile)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error generating hexbin tile: {str(e)}")
+
+    headers = {"X-Cache": cache_status, "X-Data-Version": str(version)}
+    if not tile:
+        return Response(status_code=204, headers=headers)
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+
+# Attributes a point lookup may project (id is always returned)
+LOOKUP_FIELDS = (
+    'parcel_name', 'description', 'surveyor_name', 'selected_index',
+    'index_date_start', 'index_date_end', 'index_mean', 'index_min',
+    'index_max', 'index_std_dev', 'interpretation', 'area_hectares',
+    'province', 'land_use', 'crop_type', 'notes', 'survey_date',
+    'created_at', 'updated_at'
+)
+LOOKUP_DEFAULT_FIELDS = 'parcel_name,selected_index,index_mean,interpretation,area_hectares,province,crop_type'
+LOOKUP_MAX_DISTANCE_M = 5000
+
+# Shortest length of one degree of latitude / longitude at the equator (metres)
+METERS_PER_DEGREE_LAT = 110574
+METERS_PER_DEGREE_LON = 111320
+
+
+def parse_lookup_fields(fields: str) -> List[str]:
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in LOOKUP_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}; allowed: {', '.join(LOOKUP_FIELDS)}")
+    return list(dict.fromkeys(names))
+
+
+@router.get("/parcels/lookup")
+async def lookup_survey_parcels(
+    lon: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    k: int = Query(5, ge=1, le=50, description="Maximum number of parcels"),
+    max_distance: float = Query(200, ge=0, le=LOOKUP_MAX_DISTANCE_M, description="Search radius in metres"),
+    fields: str = Query(LOOKUP_DEFAULT_FIELDS, description="Comma-separated attributes to return"),
+    include_geometry: bool = Query(False),
+    season: Optional[int] = Query(None, ge=1900, le=2200, description="Survey season year (scans only that partition)")
+):
+    """
+    Parcels at or near a location (e.g. a GPS fix)
+
+    Returns up to `k` parcels within `max_distance` metres, nearest first,
+    each with `contains_point` and its geodesic `distance_m` (0 inside);
+    `parcel` is the parcel containing the point, if any. Candidates come
+    from the GIST index: a bounding box of the search radius limits the
+    scan and the `<->` operator returns them in distance order, so only
+    `k` parcels get an exact distance.
+    """
+    columns = ['id'] + parse_lookup_fields(fields)
+    columns_sql = ', '.join(f"p.{name}" for name in columns)
+    if include_geometry:
+        columns_sql += ", p.geom AS geometry"
+
+    # Radius as degrees; longitude degrees shrink with the latitude
+    delta_lat = max_distance / METERS_PER_DEGREE_LAT
+    delta_lon = max_distance / (METERS_PER_DEGREE_LON * max(math.cos(math.radians(lat)), 0.01))
+
+    params = QueryParams()
+    point_sql = f"ST_SetSRID(ST_MakePoint({params.add(lon)}, {params.add(lat)}), 4326)"
+    filters = parcel_filters(params, None, None, None, season)
+
+    try:
+        async with get_db_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT *
+                FROM (
+                    SELECT {columns_sql},
+                           ST_Intersects(p.geom, {point_sql}) AS contains_point,
+                           ST_Distance(p.geom::geography, {point_sql}::geography) AS distance_m
+                    FROM survey_parcels p
+                    WHERE p.geom && ST_Expand({point_sql}, {params.add(delta_lon)}::float8, {params.add(delta_lat)}::float8)
+                          {filters}
+                    ORDER BY p.geom <-> {point_sql}
+                    LIMIT {params.add(k)}
+                ) nearest
+                WHERE distance_m <= {params.add(max_distance)}::float8
+                ORDER BY distance_m, id
+            """, *params)
+
+        parcels = [record_to_dict(row) for row in rows]
+        return {
+            "success": True,
+            "point": [lon, lat],
+            "parcel": next((parcel for parcel in parcels if parcel['contains_point']), None),
+            "count": len(parcels),
+            "data": parcels
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error looking up survey parcels: {str(e)}")
+
+
+@router.get("/parcels/{parcel_id}")
+async def get_survey_parcel(parcel_id: int, request: Request, response: Response):
+    """
+    Get a specific survey parcel by ID
+
+    The parcel's updated_at is checked first (primary key lookup); if it
+    matches the client's If-None-Match / If-Modified-Since the response is
+    304 and the parcel is not loaded.
+    """
+    try:
+        async with get_db_connection() as conn:
+            updated_at = await conn.fetchval(
+                "SELECT coalesce(updated_at, created_at) FROM survey_parcels WHERE id = $1",
+                parcel_id)
+            if updated_at is None:
                 raise HTTPException(
                     status_code=404, detail=f"Survey parcel {parcel_id} not found")
 
-            # Convert to JSON-serializable format
-            parcel_dict = dict(parcel)
-            if parcel_dict['geometry']:
-                import json
-                parcel_dict['geometry'] = json.loads(parcel_dict['geometry'])
-
-            # Convert decimals to floats
-            for key in ['index_mean', 'index_min', 'index_max', 'index_std_dev', 'area_hectares']:
-                if parcel_dict[key] is not None:
-                    parcel_dict[key] = float(parcel_dict[key])
-
-            # Convert dates to ISO format
-            for key in ['index_date_start', 'index_date_end']:
-                if parcel_dict[key]:
-                    parcel_dict[key] = parcel_dict[key].isoformat()
-            for key in ['survey_date', 'created_at', 'updated_at']:
-                if parcel_dict[key]:
-                    parcel_dict[key] = parcel_dict[key].isoformat()
-
-            return {
-                "success": True,
-                "parcel": parcel_dict
-            }
+            etag = f'W/"p{parcel_id}-{updated_at.isoformat()}"'
+            headers = conditional_headers(etag, updated_at)
+            if is_not_modified(request, etag, updated_at):
+                return Response(status_code=304, headers=headers)
+
+            parcel = await conn.fetchrow(f"""
+                SELECT {PARCEL_COLUMNS}, updated_at, geom as geometry
+                FROM survey_parcels
+                WHERE id = $1
+            """, parcel_id)
+
+        if not parcel:
+            raise HTTPException(
+                status_code=404, detail=f"Survey parcel {parcel_id} not found")
+
+        response.headers.update(headers)
+        return {
+            "success": True,
+            "parcel": record_to_dict(parcel)
+        }
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error fetching survey parcel: {str(e)}")
-    finally:
-        conn.close()
+
+
+# Columns that need an explicit type for asyncpg when updated
+UPDATE_CASTS = {
+    'index_mean': '::float8',
+    'index_min': '::float8',
+    'index_max': '::float8',
+    'index_std_dev': '::float8'
+}
 
 
 @router.put("/parcels/{parcel_id}")
-async def update_survey_parcel(parcel_id: int, parcel: SurveyParcelUpdate):
+async def update_survey_parcel(
+    parcel_id: int,
+    parcel: SurveyParcelUpdate,
+    duplicate_policy: Optional[str] = Query(None, description="warn or reject (default: DUPLICATE_POLICY, merge acts as warn)"),
+    iou_threshold: Optional[float] = Query(None, gt=0, le=1, description="Minimum IoU of a duplicate (default: DUPLICATE_IOU_THRESHOLD)")
+):
     """
     Update an existing survey parcel
+
+    A new geometry is repaired like on create and checked for duplicates
+    among the other parcels; with the reject policy the update fails with 409.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Build update query dynamically based on provided fields
-            update_fields = []
-            params = []
-
-            if parcel.parcel_name is not None:
-                update_fields.append("parcel_name = %s")
-                params.append(parcel.parcel_name)
-            if parcel.description is not None:
-                update_fields.append("description = %s")
-                params.append(parcel.description)
-            if parcel.surveyor_name is not None:
-                update_fields.append("surveyor_name = %s")
-                params.append(parcel.surveyor_name)
-            if parcel.selected_index is not None:
-                update_fields.append("selected_index = %s")
-                params.append(parcel.selected_index)
-            if parcel.index_date_start is not None:
-                update_fields.append("index_date_start = %s")
-                params.append(parcel.index_date_start)
-            if parcel.index_date_end is not None:
-                update_fields.append("index_date_end = %s")
-                params.append(parcel.index_date_end)
-            if parcel.index_mean is not None:
-                update_fields.append("index_mean = %s")
-                params.append(parcel.index_mean)
-            if parcel.index_min is not None:
-                update_fields.append("index_min = %s")
-                params.append(parcel.index_min)
-            if parcel.index_max is not None:
-                update_fields.append("index_max = %s")
-                params.append(parcel.index_max)
-            if parcel.index_std_dev is not None:
-                update_fields.append("index_std_dev = %s")
-                params.append(parcel.index_std_dev)
-            if parcel.interpretation is not None:
-                update_fields.append("interpretation = %s")
-                params.append(parcel.interpretation)
-            if parcel.province is not None:
-                update_fields.append("province = %s")
-                params.append(parcel.province)
-            if parcel.land_use is not None:
-                update_fields.append("land_use = %s")
-                params.append(parcel.land_use)
-            if parcel.crop_type is not None:
-                update_fields.append("crop_type = %s")
-                params.append(parcel.crop_type)
-            if parcel.notes is not None:
-                update_fields.append("notes = %s")
-                params.append(parcel.notes)
-
-            if not update_fields:
+    policy, iou_threshold = duplicate_settings(duplicate_policy, iou_threshold)
+
+    # Build update query dynamically based on provided fields
+    params = QueryParams()
+    update_fields = []
+    for field, value in parcel.model_dump(exclude_none=True).items():
+        if field == 'geometry':
+            if value.get("type") not in PARCEL_GEOMETRY_TYPES:
                 raise HTTPException(
-                    status_code=400, detail="No fields to update")
+                    status_code=400, detail="geometry must be a GeoJSON Polygon or MultiPolygon")
+            update_fields.append(f"geom = survey_clean_geometry({params.add(value)})")
+            continue
+        if field in ('index_date_start', 'index_date_end'):
+            value = parse_date(value, field)
+        update_fields.append(f"{field} = {params.add(value)}{UPDATE_CASTS.get(field, '')}")
 
-            params.append(parcel_id)
-            query = f"""
-                UPDATE survey_parcels
-                SET {', '.join(update_fields)}
-                WHERE id = %s
-                RETURNING id, parcel_name, updated_at
-            """
+    if not update_fields:
+        raise HTTPException(
+            status_code=400, detail="No fields to update")
 
-            cur.execute(query, params)
-            result = cur.fetchone()
+    try:
+        async with get_db_connection() as conn:
+            async with conn.transaction():
+                duplicates = []
+                if parcel.geometry is not None:
+                    if policy == "reject":
+                        await conn.execute("SELECT pg_advisory_xact_lock(hashtext('survey_parcel_duplicates'))")
+                    duplicates = await find_duplicate_parcels(
+                        conn, parcel.geometry, iou_threshold, exclude_id=parcel_id)
+                    if duplicates and policy == "reject":
+                        raise duplicate_conflict(duplicates)
 
-            if not result:
-                raise HTTPException(
-                    status_code=404, detail=f"Survey parcel {parcel_id} not found")
+                result = await conn.fetchrow(f"""
+                    UPDATE survey_parcels
+                    SET {', '.join(update_fields)}
+                    WHERE id = {params.add(parcel_id)}
+                    RETURNING id, parcel_name, updated_at
+                """, *params)
+
+        if not result:
+            raise HTTPException(
+                status_code=404, detail=f"Survey parcel {parcel_id} not found")
 
-            conn.commit()
+        MVT_CACHE.clear()
 
-            return {
-                "success": True,
-                "message": "Survey parcel updated successfully",
-                "data": {
-                    "id": result['id'],
-                    "parcel_name": result['parcel_name'],
-                    "updated_at": result['updated_at'].isoformat()
-                }
+        return {
+            "success": True,
+            "message": "Survey parcel updated successfully",
+            "data": {
+                "id": result['id'],
+                "parcel_name": result['parcel_name'],
+                "updated_at": result['updated_at'].isoformat(),
+                "duplicates": duplicates
             }
+        }
 
     except HTTPException:
         raise
+    except asyncpg.DataError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid value: {str(e)}")
+    except asyncpg.NotNullViolationError:
+        raise HTTPException(
+            status_code=400, detail="Geometry has no polygonal area after repair")
     except Exception as e:
-        conn.rollback()
         raise HTTPException(
             status_code=500, detail=f"Error updating survey parcel: {str(e)}")
-    finally:
-        conn.close()
 
 
 @router.delete("/parcels/{parcel_id}")
@@ -372,68 +1400,339 @@ async def delete_survey_parcel(parcel_id: int):
     """
     Delete a survey parcel
     """
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "DELETE FROM survey_parcels WHERE id = %s RETURNING id", (parcel_id,))
-            result = cur.fetchone()
+        async with get_db_connection() as conn:
+            result = await conn.fetchval(
+                "DELETE FROM survey_parcels WHERE id = $1 RETURNING id", parcel_id)
 
-            if not result:
-                raise HTTPException(
-                    status_code=404, detail=f"Survey parcel {parcel_id} not found")
+        if not result:
+            raise HTTPException(
+                status_code=404, detail=f"Survey parcel {parcel_id} not found")
 
-            conn.commit()
+        MVT_CACHE.clear()
 
-            return {
-                "success": True,
-                "message": f"Survey parcel {parcel_id} deleted successfully"
-            }
+        return {
+            "success": True,
+            "message": f"Survey parcel {parcel_id} deleted successfully"
+        }
 
     except HTTPException:
         raise
     except Exception as e:
-        conn.rollback()
         raise HTTPException(
             status_code=500, detail=f"Error deleting survey parcel: {str(e)}")
-    finally:
-        conn.close()
+
+
+# Group columns of survey_parcel_aggregates and their grouping_id bit in
+# survey_parcel_percentiles
+STATS_GROUP_COLUMNS = {
+    'province': 8,
+    'selected_index': 4,
+    'crop_type': 2,
+    'land_use': 1
+}
+
+# Seconds between refreshes of the percentile materialized view (0 disables)
+STATS_REFRESH_INTERVAL = int(os.getenv("STATS_REFRESH_INTERVAL", "900"))
+
+
+def parse_group_by(group_by: Optional[str]) -> List[str]:
+    """Validate a comma-separated list of stats group columns"""
+    columns = [c.strip() for c in (group_by or "").split(",") if c.strip()]
+    invalid = [c for c in columns if c not in STATS_GROUP_COLUMNS]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by columns must be among: {', '.join(STATS_GROUP_COLUMNS)}")
+    return list(dict.fromkeys(columns))
+
+
+def stats_filters(params: QueryParams, **values) -> str:
+    """Equality filters on group columns ('' matches parcels where the value is NULL)"""
+    filters = ""
+    for column, value in values.items():
+        if value is not None:
+            filters += f" AND {column} = {params.add(value)}"
+    return filters
 
 
 @router.get("/stats")
-async def get_survey_stats():
+async def get_survey_stats(request: Request, response: Response):
     """
     Get survey statistics (total parcels, by index type, etc.)
+
+    Read from the trigger-maintained survey_parcel_aggregates table; answers
+    304 when the data version matches the client's ETag.
     """
-    conn = get_db_connection()
+    etag, last_modified = await data_version_validators(request)
+    headers = conditional_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
+        async with get_db_connection() as conn:
+            stats = await conn.fetchrow("""
                 SELECT
-                    COUNT(*) as total_parcels,
-                    COUNT(CASE WHEN selected_index = 'NDVI' THEN 1 END) as ndvi_count,
-                    COUNT(CASE WHEN selected_index = 'NDMI' THEN 1 END) as ndmi_count,
-                    COUNT(CASE WHEN selected_index = 'SPI' THEN 1 END) as spi_count,
-                    SUM(area_hectares) as total_area_hectares,
-                    AVG(area_hectares) as avg_area_hectares
-                FROM survey_parcels
+                    coalesce(sum(parcel_count), 0)::bigint as total_parcels,
+                    coalesce(sum(parcel_count) FILTER (WHERE selected_index = 'NDVI'), 0)::bigint as ndvi_count,
+                    coalesce(sum(parcel_count) FILTER (WHERE selected_index = 'NDMI'), 0)::bigint as ndmi_count,
+                    coalesce(sum(parcel_count) FILTER (WHERE selected_index = 'SPI'), 0)::bigint as spi_count,
+                    sum(area_hectares_sum) as total_area_hectares,
+                    sum(area_hectares_sum) / nullif(sum(parcel_count), 0) as avg_area_hectares
+                FROM survey_parcel_aggregates
             """)
 
-            stats = cur.fetchone()
+        return {
+            "success": True,
+            "stats": record_to_dict(stats)
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error fetching survey stats: {str(e)}")
+
+
+@router.get("/stats/grouped")
+async def get_survey_grouped_stats(
+    request: Request,
+    response: Response,
+    group_by: str = Query("province,selected_index", description="Comma-separated: province, selected_index, crop_type, land_use"),
+    province: Optional[str] = Query(None),
+    index_type: Optional[str] = Query(None),
+    crop_type: Optional[str] = Query(None),
+    land_use: Optional[str] = Query(None)
+):
+    """
+    Get parcel counts, areas and mean index values per group
+
+    Groups are rolled up from survey_parcel_aggregates, so the cost depends
+    on the number of groups, not on the number of parcels. A missing
+    province, crop type or land use is reported as null.
+    """
+    columns = parse_group_by(group_by)
+    etag, last_modified = await data_version_validators(request)
+    headers = conditional_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    params = QueryParams()
+    filters = stats_filters(params, province=province, selected_index=index_type,
+                            crop_type=crop_type, land_use=land_use)
+    select_sql = "".join(f"nullif({c}, '') AS {c}, " for c in columns)
+    group_sql = f"GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}" if columns else ""
 
-            # Convert decimals to floats
-            result = dict(stats)
-            for key in ['total_area_hectares', 'avg_area_hectares']:
-                if result[key] is not None:
-                    result[key] = float(result[key])
+    try:
+        async with get_db_connection() as conn:
+            groups = await conn.fetch(f"""
+                SELECT {select_sql}
+                    sum(parcel_count)::bigint AS parcel_count,
+                    sum(area_hectares_sum)::float8 AS total_area_hectares,
+                    (sum(area_hectares_sum) / nullif(sum(parcel_count), 0))::float8 AS avg_area_hectares,
+                    (sum(index_mean_sum) / nullif(sum(index_mean_count), 0))::float8 AS avg_index_mean
+                FROM survey_parcel_aggregates
+                WHERE 1=1 {filters}
+                {group_sql}
+            """, *params)
 
-            return {
-                "success": True,
-                "stats": result
-            }
+        return {
+            "success": True,
+            "group_by": columns,
+            "groups": [record_to_dict(group) for group in groups if group['parcel_count']]
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Error fetching survey stats: {str(e)}")
+            status_code=500, detail=f"Error fetching grouped survey stats: {str(e)}")
+
+
+@router.get("/stats/percentiles")
+async def get_survey_stats_percentiles(
+    group_by: Optional[str] = Query(None, description="Comma-separated: province, selected_index, crop_type, land_use"),
+    province: Optional[str] = Query(None),
+    index_type: Optional[str] = Query(None),
+    crop_type: Optional[str] = Query(None),
+    land_use: Optional[str] = Query(None)
+):
+    """
+    Get index mean and area percentiles per group
+
+    Served from the survey_parcel_percentiles materialized view, refreshed
+    every STATS_REFRESH_INTERVAL seconds; `refreshed_at` tells how current
+    the numbers are. Filters apply to grouped columns only.
+    """
+    columns = parse_group_by(group_by)
+    grouping_id = sum(bit for column, bit in STATS_GROUP_COLUMNS.items() if column not in columns)
+    params = QueryParams()
+    filters = stats_filters(params, **{
+        column: value for column, value in (
+            ('province', province), ('selected_index', index_type),
+            ('crop_type', crop_type), ('land_use', land_use)
+        ) if column in columns
+    })
+    select_sql = "".join(f"nullif({c}, '') AS {c}, " for c in columns)
+    order_sql = f"ORDER BY {', '.join(columns)}" if columns else ""
+
+    try:
+        async with get_db_connection() as conn:
+            groups = await conn.fetch(f"""
+                SELECT {select_sql}
+                    parcel_count, index_mean_p10, index_mean_p25, index_mean_p50,
+                    index_mean_p75, index_mean_p90, area_hectares_p50, refreshed_at
+                FROM survey_parcel_percentiles
+                WHERE grouping_id = {params.add(grouping_id)} {filters}
+                {order_sql}
+            """, *params)
+
+        return {
+            "success": True,
+            "group_by": columns,
+            "groups": [record_to_dict(group) for group in groups]
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error fetching survey percentiles: {str(e)}")
+
+
+async def ensure_season_partitions():
+    """Create the current and next season partitions of survey_parcels if missing"""
+    year = date.today().year
+    async with get_db_connection() as conn:
+        return [
+            await conn.fetchval("SELECT survey_parcels_create_partition($1)", season)
+            for season in (year, year + 1)
+        ]
+
+
+# Held (per process and across workers) while the percentile view refreshes
+_percentile_refresh_lock = asyncio.Lock()
+
+
+async def refresh_stats_percentiles() -> bool:
+    """
+    Refresh the percentile view without blocking readers
+
+    Returns:
+        False if a refresh was already running (in this or another worker)
+        and this one was skipped
+    """
+    if _percentile_refresh_lock.locked():
+        return False
+    async with _percentile_refresh_lock:
+        async with get_db_connection() as conn:
+            async with conn.transaction():
+                if not await conn.fetchval(
+                        "SELECT pg_try_advisory_xact_lock(hashtext('survey_parcel_percentiles'))"):
+                    return False
+                # Refreshing rescans survey_parcels, which can exceed the API statement timeout
+                await conn.execute("SET LOCAL statement_timeout = 0")
+                await conn.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY survey_parcel_percentiles")
+    return True
+
+
+@router.post("/stats/percentiles/refresh", dependencies=[
+    Depends(get_current_user), Depends(rate_limit(COST_STATS_REFRESH))])
+async def refresh_survey_stats_percentiles():
+    """
+    Refresh the percentile materialized view now
+
+    Requires authentication. A request arriving while a refresh is already
+    running is not queued: the running refresh will publish fresh data.
+    """
+    try:
+        refreshed = await refresh_stats_percentiles()
+        return {
+            "success": True,
+            "refreshed": refreshed,
+            "message": "Survey percentiles refreshed" if refreshed
+                       else "A percentile refresh is already running"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error refreshing survey percentiles: {str(e)}")
+
+
+@router.websocket("/ws")
+async def survey_changes_websocket(websocket: WebSocket, bbox: Optional[str] = None):
+    """
+    Push parcel changes to the client as they are committed
+
+    Each message is a compact JSON event: {"id", "op", "bbox", "updated_at"}
+    for single changes, {"op": "bulk", "action", "count", "bbox"} for large
+    statements and {"op": "resync"} when events may have been missed. Only
+    changes intersecting the subscribed bbox are sent; the client can move
+    its viewport by sending {"bbox": [minLon, minLat, maxLon, maxLat]}
+    (or null for every change).
+    """
+    try:
+        envelope = parse_bbox(bbox) if bbox else None
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+
+    await websocket.accept()
+    subscription = change_feed.subscribe(envelope)
+
+    async def send_events():
+        while True:
+            await websocket.send_text(await subscription.get())
+
+    async def receive_viewports():
+        while True:
+            message = await websocket.receive_json()
+            viewport = message.get("bbox") if isinstance(message, dict) else None
+            try:
+                subscription.bbox = parse_bbox(",".join(map(str, viewport))) if viewport else None
+            except HTTPException as e:
+                await websocket.send_text(json.dumps({"op": "error", "detail": e.detail}))
+
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_viewports())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
     finally:
-        conn.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        change_feed.unsubscribe(subscription)
+
+
+@router.get("/enrichment")
+async def get_enrichment_status():
+    """
+    Get the background enrichment queue status
+
+    Parcels saved without index statistics wait in the queue until the
+    worker computes them; `failed` counts parcels that ran out of attempts.
+    """
+    try:
+        return {
+            "success": True,
+            "queue": await queue_status()
+        }
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error fetching enrichment status: {str(e)}")
+
+
+async def refresh_stats_periodically():
+    """Background task refreshing the percentile view every STATS_REFRESH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(STATS_REFRESH_INTERVAL)
+        try:
+            await refresh_stats_percentiles()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Stats] Percentile refresh failed: {e}")
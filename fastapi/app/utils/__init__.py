@@ -1,3 +1,4 @@
 from .auth import create_access_token, verify_token, verify_google_token
+from .reduction_plan import plan_reduction
 
-__all__ = ["create_access_token", "verify_token", "verify_google_token"]
+__all__ = ["create_access_token", "verify_token", "verify_google_token", "plan_reduction"]
@@ -1,9 +1,13 @@
 import os
+import re
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional, Tuple
+import requests
 from jose import JWTError, jwt
-from google.oauth2 import id_token
-from google.auth.transport import requests
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt as google_jwt
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +20,99 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(
 
 # Google OAuth Configuration
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Google's ID token signing certificates ({key id: x509 PEM})
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_CERTS_TIMEOUT = float(os.getenv("GOOGLE_CERTS_TIMEOUT", "10"))
+# Used when the response has no Cache-Control max-age
+GOOGLE_CERTS_DEFAULT_TTL = 3600
+# Unknown key ids trigger a refetch at most this often (keys are rotated
+# ahead of use, so this only limits forged tokens forcing downloads)
+GOOGLE_CERTS_MIN_REFRESH = 60
+
+# Long-lived pooled HTTP session (keep-alive to googleapis.com)
+_http_session = requests.Session()
+
+
+def fetch_google_certs() -> Tuple[dict, Optional[float]]:
+    """
+    Download Google's signing certificates
+
+    Returns:
+        ({key id: certificate}, max-age in seconds from Cache-Control or None)
+
+    Raises:
+        google.auth.exceptions.TransportError: If the download fails
+    """
+    try:
+        response = _http_session.get(GOOGLE_CERTS_URL, timeout=GOOGLE_CERTS_TIMEOUT)
+        response.raise_for_status()
+        certs = response.json()
+    except (requests.RequestException, ValueError) as e:
+        raise google_exceptions.TransportError(f"Could not fetch Google certificates: {e}")
+
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    return certs, float(match.group(1)) if match else None
+
+
+class GoogleCertCache:
+    """
+    In-process cache of Google's signing certificates
+
+    Certificates are kept for the max-age Google sends, so tokens are
+    verified locally and the certificates are downloaded about once per
+    max-age. `fetcher` returns (certs, max_age) and can be replaced, e.g. by
+    a local stand-in in tests.
+    """
+
+    def __init__(self, fetcher: Callable[[], Tuple[dict, Optional[float]]] = fetch_google_certs):
+        self.fetcher = fetcher
+        self._certs = None
+        self._expires = 0.0
+        self._fetched = 0.0
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def get(self, key_id: Optional[str] = None) -> dict:
+        """
+        Current certificates, refetched when expired or missing `key_id`
+
+        Raises:
+            google.auth.exceptions.TransportError: If a needed download fails
+        """
+        certs = self._certs
+        if self._is_current(certs, key_id):
+            return certs
+
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            certs = self._certs
+            if self._is_current(certs, key_id):
+                return certs
+            now = time.monotonic()
+            if certs is not None and now < self._expires and now - self._fetched < GOOGLE_CERTS_MIN_REFRESH:
+                # Unknown key id, refetched recently: the token is not Google's
+                return certs
+
+            certs, max_age = self.fetcher()
+            self.fetches += 1
+            self._fetched = now
+            self._expires = now + (GOOGLE_CERTS_DEFAULT_TTL if max_age is None else max_age)
+            self._certs = certs
+            return certs
+
+    def _is_current(self, certs: Optional[dict], key_id: Optional[str]) -> bool:
+        return (certs is not None and time.monotonic() < self._expires
+                and (key_id is None or key_id in certs))
+
+    def clear(self):
+        with self._lock:
+            self._certs = None
+            self._expires = 0.0
+
+
+google_certs = GoogleCertCache()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -63,6 +160,10 @@ def verify_google_token(token: str) -> Optional[dict]:
     """
     Verify a Google ID token
 
+    The signature is checked locally against the cached certificates; the
+    network is only used when they expire or rotate. Blocking (certificate
+    download, RSA verification), so call it from a worker thread in async code.
+
     Args:
         token: Google ID token string
 
@@ -70,15 +171,15 @@ def verify_google_token(token: str) -> Optional[dict]:
         User info from Google or None if invalid
     """
     try:
-        # Verify the token
-        idinfo = id_token.verify_oauth2_token(
+        key_id = jwt.get_unverified_header(token).get('kid')
+        idinfo = google_jwt.decode(
             token,
-            requests.Request(),
-            GOOGLE_CLIENT_ID
+            certs=google_certs.get(key_id),
+            audience=GOOGLE_CLIENT_ID
         )
 
         # Verify the issuer
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
+        if idinfo['iss'] not in GOOGLE_ISSUERS:
             return None
 
         return {
@@ -87,6 +188,6 @@ def verify_google_token(token: str) -> Optional[dict]:
             'name': idinfo.get('name'),
             'picture': idinfo.get('picture')
         }
-    except ValueError:
+    except (ValueError, KeyError, JWTError):
         # Invalid token
         return None
@@ -0,0 +1,325 @@
+"""
+Local GeoJSON geometry pipeline
+
+Validates, repairs and simplifies drawn polygons and computes their geodesic
+area in-process, so invalid or oversized polygons are rejected without an
+Earth Engine round trip and EE receives fewer vertices to clip against.
+"""
+
+import math
+from typing import List, Optional
+
+# WGS84 equatorial radius (meters), as used by EE/Turf spherical area
+EARTH_RADIUS = 6378137.0
+METERS_PER_DEGREE = 111320.0
+
+# Coordinate precision kept after repair (1e-7 degrees is about 1 cm)
+COORDINATE_DECIMALS = 7
+
+
+class GeometryError(ValueError):
+    """Raised when a geometry cannot be used for analysis"""
+
+
+def _clean_ring(ring, is_shell: bool, repairs: List[str]) -> Optional[list]:
+    """Validate one linear ring, dropping duplicate vertices and closing it"""
+    if not isinstance(ring, (list, tuple)):
+        raise GeometryError("Ring must be an array of positions")
+
+    points = []
+    for position in ring:
+        if not isinstance(position, (list, tuple)) or len(position) < 2:
+            raise GeometryError("Positions must be [longitude, latitude] pairs")
+        lon, lat = position[0], position[1]
+        if not all(isinstance(v, (int, float)) and math.isfinite(v) for v in (lon, lat)):
+            raise GeometryError("Coordinates must be finite numbers")
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            raise GeometryError(f"Coordinate out of range: [{lon}, {lat}]")
+        point = [round(float(lon), COORDINATE_DECIMALS), round(float(lat), COORDINATE_DECIMALS)]
+        if points and points[-1] == point:
+            continue
+        points.append(point)
+
+    if len(points) < len(ring):
+        repairs.append("removed duplicate vertices")
+    if len(points) > 1 and points[0] != points[-1]:
+        if ring and list(ring[0][:2]) != list(ring[-1][:2]):
+            repairs.append("closed open ring")
+        points.append(points[0])
+
+    if len(points) < 4:
+        if is_shell:
+            raise GeometryError("Polygon must have at least 3 distinct vertices")
+        repairs.append("dropped degenerate hole")
+        return None
+    return points
+
+
+def _signed_area(ring) -> float:
+    """Planar signed area (positive for counter-clockwise rings)"""
+    total = 0.0
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        total += x1 * y2 - x2 * y1
+    return total / 2
+
+
+def _orient(ring, counter_clockwise: bool, repairs: List[str]) -> list:
+    """Orient a ring following RFC 7946 (shells CCW, holes CW)"""
+    area = _signed_area(ring)
+    if area == 0:
+        raise GeometryError("Polygon ring has zero area")
+    if (area > 0) != counter_clockwise:
+        repairs.append("reoriented ring")
+        return ring[::-1]
+    return ring
+
+
+def _polygons(geometry: dict) -> list:
+    """Return the list of polygon coordinate arrays of a Polygon or MultiPolygon"""
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    return geometry['coordinates']
+
+
+def _segments_cross(p1, p2, q1, q2) -> bool:
+    """True if segments p1-p2 and q1-q2 properly cross each other"""
+    def orientation(a, b, c):
+        value = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        return (value > 0) - (value < 0)
+
+    o1 = orientation(p1, p2, q1)
+    o2 = orientation(p1, p2, q2)
+    o3 = orientation(q1, q2, p1)
+    o4 = orientation(q1, q2, p2)
+    return o1 * o2 < 0 and o3 * o4 < 0
+
+
+def find_self_intersection(geometry: dict) -> Optional[list]:
+    """
+    Find a crossing between two edges of a (multi)polygon
+
+    Uses a sweep over edges sorted by minimum longitude, so typical field
+    polygons are checked in close to O(n log n).
+
+    Returns:
+        [longitude, latitude] near the crossing, or None if the rings are simple
+    """
+    segments = []
+    ring_id = 0
+    for polygon in _polygons(geometry):
+        for ring in polygon:
+            last = len(ring) - 2
+            for i, (a, b) in enumerate(zip(ring, ring[1:])):
+                segments.append((min(a[0], b[0]), max(a[0], b[0]),
+                                 min(a[1], b[1]), max(a[1], b[1]),
+                                 ring_id, i, last, a, b))
+            ring_id += 1
+
+    segments.sort(key=lambda s: s[0])
+    active = []
+    for segment in segments:
+        minx, _, miny, maxy, ring, index, last, a, b = segment
+        active = [s for s in active if s[1] >= minx]
+        for other in active:
+            if other[2] > maxy or other[3] < miny:
+                continue
+            if other[4] == ring:
+                gap = abs(other[5] - index)
+                if gap == 1 or gap == last:
+                    continue  # adjacent edges share a vertex
+            if _segments_cross(a, b, other[7], other[8]):
+                return [round((a[0] + b[0]) / 2, 6), round((a[1] + b[1]) / 2, 6)]
+        active.append(segment)
+    return None
+
+
+def clean_geometry(geometry: dict, repairs: Optional[List[str]] = None) -> dict:
+    """
+    Validate and repair a GeoJSON Polygon or MultiPolygon
+
+    Accepts a bare geometry or a Feature. Repairs duplicate vertices, open
+    rings, degenerate holes, ring orientation and excess coordinate precision.
+
+    Args:
+        geometry: GeoJSON geometry or Feature
+        repairs: Optional list that receives a description of each repair made
+
+    Raises:
+        GeometryError: If the geometry is not a usable polygon
+    """
+    if not isinstance(geometry, dict):
+        raise GeometryError("Geometry must be a GeoJSON object")
+    if geometry.get('type') == 'Feature':
+        geometry = geometry.get('geometry') or {}
+        if not isinstance(geometry, dict):
+            raise GeometryError("Feature geometry must be a GeoJSON object")
+
+    geom_type = geometry.get('type')
+    if geom_type not in ('Polygon', 'MultiPolygon'):
+        raise GeometryError(f"Expected Polygon or MultiPolygon, got {geom_type}")
+    coordinates = geometry.get('coordinates')
+    if not isinstance(coordinates, list) or not coordinates:
+        raise GeometryError("Geometry has no coordinates")
+
+    if repairs is None:
+        repairs = []
+    polygons = []
+    for polygon in ([coordinates] if geom_type == 'Polygon' else coordinates):
+        if not isinstance(polygon, list) or not polygon:
+            raise GeometryError("Polygon has no rings")
+        shell = _orient(_clean_ring(polygon[0], True, repairs), True, repairs)
+        holes = []
+        for ring in polygon[1:]:
+            hole = _clean_ring(ring, False, repairs)
+            if hole is not None:
+                holes.append(_orient(hole, False, repairs))
+        polygons.append([shell] + holes)
+
+    cleaned = {
+        'type': geom_type,
+        'coordinates': polygons[0] if geom_type == 'Polygon' else polygons
+    }
+
+    crossing = find_self_intersection(cleaned)
+    if crossing is not None:
+        raise GeometryError(f"Polygon edges cross near {crossing}")
+
+    repairs[:] = sorted(set(repairs))
+    return cleaned
+
+
+def _ring_geodesic_area(ring) -> float:
+    """Area of a closed ring on the sphere in square meters"""
+    points = ring[:-1]
+    n = len(points)
+    if n < 3:
+        return 0.0
+    total = 0.0
+    for i in range(n):
+        lon_prev = points[i - 1][0]
+        lon_next = points[(i + 1) % n][0]
+        total += math.radians(lon_next - lon_prev) * math.sin(math.radians(points[i][1]))
+    return abs(total * EARTH_RADIUS * EARTH_RADIUS / 2)
+
+
+def geodesic_area_km2(geometry: dict) -> float:
+    """Geodesic area of a Polygon or MultiPolygon in square kilometers"""
+    area = 0.0
+    for polygon in _polygons(geometry):
+        area += _ring_geodesic_area(polygon[0])
+        for hole in polygon[1:]:
+            area -= _ring_geodesic_area(hole)
+    return area / 1e6
+
+
+def count_vertices(geometry: dict) -> int:
+    """Total number of positions in a Polygon or MultiPolygon"""
+    return sum(len(ring) for polygon in _polygons(geometry) for ring in polygon)
+
+
+def _douglas_peucker(points, tolerance: float) -> List[int]:
+    """Indices of the points kept by Douglas-Peucker on an open polyline"""
+    keep = {0, len(points) - 1}
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        (x1, y1), (x2, y2) = points[start], points[end]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        max_dist, index = 0.0, None
+        for i in range(start + 1, end):
+            px, py = points[i]
+            if length_sq == 0:
+                dist = math.hypot(px - x1, py - y1)
+            else:
+                dist = abs(dy * px - dx * py + x2 * y1 - y2 * x1) / math.sqrt(length_sq)
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > tolerance:
+            keep.add(index)
+            stack.append((start, index))
+            stack.append((index, end))
+    return sorted(keep)
+
+
+def _simplify_ring(ring, tolerance_m: float) -> list:
+    """Simplify a closed ring, keeping the original if it would collapse"""
+    if len(ring) <= 4:
+        return ring
+    lat0 = math.radians(sum(p[1] for p in ring) / len(ring))
+    kx = METERS_PER_DEGREE * math.cos(lat0)
+    projected = [(p[0] * kx, p[1] * METERS_PER_DEGREE) for p in ring]
+
+    # Split the closed ring at the vertex farthest from the start
+    x0, y0 = projected[0]
+    split = max(range(len(projected)),
+                key=lambda i: (projected[i][0] - x0) ** 2 + (projected[i][1] - y0) ** 2)
+    if split in (0, len(ring) - 1):
+        return ring
+    first = _douglas_peucker(projected[:split + 1], tolerance_m)
+    second = _douglas_peucker(projected[split:], tolerance_m)
+    indices = first + [split + i for i in second[1:]]
+
+    simplified = [ring[i] for i in indices]
+    if len(simplified) < 4 or _signed_area(simplified) == 0:
+        return ring
+    return simplified
+
+
+def simplify_geometry(geometry: dict, tolerance_m: float) -> dict:
+    """
+    Simplify a cleaned Polygon or MultiPolygon with Douglas-Peucker
+
+    Args:
+        geometry: Geometry returned by clean_geometry
+        tolerance_m: Maximum vertex displacement in meters
+
+    Returns:
+        New geometry with the same type
+    """
+    if tolerance_m <= 0:
+        return geometry
+    polygons = [[_simplify_ring(ring, tolerance_m) for ring in polygon]
+                for polygon in _polygons(geometry)]
+    return {
+        'type': geometry['type'],
+        'coordinates': polygons[0] if geometry['type'] == 'Polygon' else polygons
+    }
+
+
+# Default vertex displacement allowed before Earth Engine reductions. Pixel
+# inclusion depends on the exact boundary, so only GPS-level noise is removed.
+SIMPLIFY_TOLERANCE_M = 1.0
+
+# Largest relative area change accepted from simplification
+SIMPLIFY_MAX_AREA_CHANGE = 0.01
+
+
+def simplify_for_reduction(geometry: dict, tolerance_m: float = SIMPLIFY_TOLERANCE_M) -> dict:
+    """
+    Simplify a cleaned geometry, keeping the original when it degenerates
+
+    Douglas-Peucker does not preserve topology, so the result is validated
+    again with clean_geometry (crossing edges, collapsed rings) and its area
+    compared with the original's.
+
+    Args:
+        geometry: Geometry returned by clean_geometry
+        tolerance_m: Maximum vertex displacement in meters
+
+    Returns:
+        The simplified geometry, or `geometry` unchanged if simplification
+        made it invalid or changed its area by more than SIMPLIFY_MAX_AREA_CHANGE
+    """
+    simplified = simplify_geometry(geometry, tolerance_m)
+    if simplified == geometry:
+        return geometry
+    try:
+        simplified = clean_geometry(simplified)
+    except GeometryError:
+        return geometry
+
+    area = geodesic_area_km2(geometry)
+    if area <= 0 or abs(geodesic_area_km2(simplified) - area) / area > SIMPLIFY_MAX_AREA_CHANGE:
+        return geometry
+    return simplified
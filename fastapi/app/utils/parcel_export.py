@@ -0,0 +1,266 @@
+"""
+Streaming survey parcel export
+
+Encoders turn batches of rows fetched from a server-side cursor into bytes
+as they arrive, so an export never holds more than one batch (or one
+Parquet row group) in memory. Arrow IPC and GeoParquet need pyarrow.
+"""
+
+import csv
+import io
+import json
+
+# Attribute columns of an export (numerics cast to float8 so every format
+# gets plain floats)
+EXPORT_COLUMNS = [
+    ('id', 'id', 'int'),
+    ('parcel_name', 'parcel_name', 'str'),
+    ('description', 'description', 'str'),
+    ('surveyor_name', 'surveyor_name', 'str'),
+    ('selected_index', 'selected_index', 'str'),
+    ('index_date_start', 'index_date_start', 'date'),
+    ('index_date_end', 'index_date_end', 'date'),
+    ('index_mean', 'index_mean::float8', 'float'),
+    ('index_min', 'index_min::float8', 'float'),
+    ('index_max', 'index_max::float8', 'float'),
+    ('index_std_dev', 'index_std_dev::float8', 'float'),
+    ('interpretation', 'interpretation', 'str'),
+    ('area_hectares', 'area_hectares::float8', 'float'),
+    ('province', 'province', 'str'),
+    ('land_use', 'land_use', 'str'),
+    ('crop_type', 'crop_type', 'str'),
+    ('notes', 'notes', 'str'),
+    ('survey_date', 'survey_date', 'timestamp'),
+    ('created_at', 'created_at', 'timestamp'),
+    ('updated_at', 'updated_at', 'timestamp')
+]
+
+EXPORT_COLUMNS_SQL = ', '.join(
+    f"{sql} AS {name}" if sql != name else name for name, sql, _ in EXPORT_COLUMNS)
+
+# format: (media type, file extension)
+EXPORT_FORMATS = {
+    'geojsonseq': ('application/geo+json-seq', 'geojsonl'),
+    'geojson': ('application/geo+json', 'geojson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+# Rows per Parquet row group (the only buffering done by any encoder)
+PARQUET_ROW_GROUP_SIZE = 50000
+
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every batch"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class GeoJSONSeqEncoder:
+    """RFC 8142 GeoJSON text sequence; rows hold one Feature (JSON text) each"""
+
+    def start(self) -> bytes:
+        return b''
+
+    def write(self, records) -> bytes:
+        return ''.join(f"\x1e{record[0]}\n" for record in records).encode()
+
+    def finish(self) -> bytes:
+        return b''
+
+
+class GeoJSONEncoder:
+    """FeatureCollection written incrementally; rows hold one Feature each"""
+
+    def __init__(self):
+        self.first = True
+
+    def start(self) -> bytes:
+        return b'{"type":"FeatureCollection","features":['
+
+    def write(self, records) -> bytes:
+        if not records:
+            return b''
+        text = ','.join(record[0] for record in records)
+        if not self.first:
+            text = ',' + text
+        self.first = False
+        return text.encode()
+
+    def finish(self) -> bytes:
+        return b']}'
+
+
+class CSVEncoder:
+    """CSV with the attribute columns and a trailing `wkt` geometry column"""
+
+    def start(self) -> bytes:
+        return self.write([[name for name, _, _ in EXPORT_COLUMNS] + ['wkt']])
+
+    def write(self, records) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        return buffer.getvalue().encode()
+
+    def finish(self) -> bytes:
+        return b''
+
+
+def arrow_schema(geoparquet: bool = False):
+    """
+    Arrow schema of an export, geometry stored as WKB
+
+    The geometry column is tagged as `geoarrow.wkb`; GeoParquet files also
+    carry the `geo` file metadata.
+    """
+    import pyarrow as pa
+
+    types = {
+        'int': pa.int32(),
+        'str': pa.string(),
+        'float': pa.float64(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us')
+    }
+    fields = [pa.field(name, types[kind]) for name, _, kind in EXPORT_COLUMNS]
+    fields.append(pa.field('geometry', pa.binary(), metadata={
+        'ARROW:extension:name': 'geoarrow.wkb',
+        'ARROW:extension:metadata': '{}'
+    }))
+    metadata = None
+    if geoparquet:
+        metadata = {'geo': json.dumps({
+            'version': '1.0.0',
+            'primary_column': 'geometry',
+            'columns': {'geometry': {'encoding': 'WKB', 'geometry_types': ['Polygon', 'MultiPolygon']}}
+        })}
+    return pa.schema(fields, metadata=metadata)
+
+
+def _record_batch(schema, records):
+    import pyarrow as pa
+
+    columns = list(zip(*records)) if records else [[] for _ in schema]
+    return pa.record_batch(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema)
+
+
+class ArrowEncoder:
+    """Arrow IPC stream, one record batch per fetched batch"""
+
+    def __init__(self):
+        import pyarrow as pa
+
+        self.sink = _ByteSink()
+        self.schema = arrow_schema()
+        self.writer = pa.ipc.new_stream(self.sink, self.schema)
+
+    def start(self) -> bytes:
+        return self.sink.drain()
+
+    def write(self, records) -> bytes:
+        if records:
+            self.writer.write_batch(_record_batch(self.schema, records))
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+class ParquetEncoder:
+    """GeoParquet 1.0 file written row group by row group"""
+
+    def __init__(self):
+        import pyarrow.parquet as pq
+
+        self.sink = _ByteSink()
+        self.schema = arrow_schema(geoparquet=True)
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression='zstd')
+        self.pending = []
+
+    def start(self) -> bytes:
+        return self.sink.drain()
+
+    def write(self, records) -> bytes:
+        self.pending.extend(records)
+        if len(self.pending) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+        return self.sink.drain()
+
+    def _flush(self):
+        if self.pending:
+            self.writer.write_batch(_record_batch(self.schema, self.pending))
+            self.pending = []
+
+    def finish(self) -> bytes:
+        self._flush()
+        self.writer.close()
+        return self.sink.drain()
+
+
+def export_encoder(export_format: str):
+    """
+    Encoder for an export format
+
+    Raises:
+        ValueError: If the format is unknown
+        ImportError: If the format needs pyarrow and it is not installed
+    """
+    encoders = {
+        'geojsonseq': GeoJSONSeqEncoder,
+        'geojson': GeoJSONEncoder,
+        'csv': CSVEncoder,
+        'arrow': ArrowEncoder,
+        'parquet': ParquetEncoder
+    }
+    if export_format not in encoders:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    return encoders[export_format]()
+
+
+def export_query(export_format: str, where_sql: str, precision_sql: str) -> str:
+    """
+    Export query over survey_parcels for a format, ordered by id
+
+    GeoJSON formats get one Feature per row built by PostgreSQL, CSV gets
+    WKT and the Arrow formats get WKB.
+    """
+    if export_format in ('geojson', 'geojsonseq'):
+        return f"""
+            SELECT json_build_object(
+                'type', 'Feature',
+                'id', e.id,
+                'geometry', ST_AsGeoJSON(e.geom, {precision_sql})::json,
+                'properties', to_jsonb(e) - 'geom'
+            )::text
+            FROM (SELECT {EXPORT_COLUMNS_SQL}, geom FROM survey_parcels {where_sql}) e
+            ORDER BY e.id
+        """
+    geometry_sql = "ST_AsText(geom) AS wkt" if export_format == 'csv' else "ST_AsBinary(geom) AS geometry"
+    return f"""
+        SELECT {EXPORT_COLUMNS_SQL}, {geometry_sql}
+        FROM survey_parcels {where_sql}
+        ORDER BY id
+    """
@@ -0,0 +1,349 @@
+"""
+Bulk survey parcel import
+
+Parcels are streamed into a temporary staging table with COPY, validated
+with set-based SQL and merged into survey_parcels in one INSERT ... SELECT,
+all inside a single transaction. Shared by the /api/survey/parcels/import
+endpoint and the import_parcels.py command line script.
+"""
+
+import csv
+import itertools
+import json
+from typing import AsyncIterator, Iterable, Iterator, Optional, TextIO
+
+import ijson
+from fastapi.concurrency import run_in_threadpool
+
+# Parcel attributes accepted from GeoJSON properties or CSV columns
+IMPORT_FIELDS = [
+    'parcel_name', 'description', 'surveyor_name', 'selected_index',
+    'index_date_start', 'index_date_end', 'index_mean', 'index_min',
+    'index_max', 'index_std_dev', 'interpretation', 'province',
+    'land_use', 'crop_type', 'notes'
+]
+
+# Staging columns filled by COPY (everything arrives as text)
+COPY_COLUMNS = ['row_number', 'geom_text'] + IMPORT_FIELDS
+
+# CSV columns that may hold the WKT (or GeoJSON) geometry
+GEOMETRY_COLUMNS = ('wkt', 'geometry', 'geom')
+
+IMPORT_FORMATS = ('geojson', 'geojsonseq', 'csv')
+
+# Rows parsed per worker-thread round trip while feeding COPY
+IMPORT_BATCH_SIZE = 500
+
+# Per-row errors returned to the caller; the counts always cover every row
+MAX_REPORTED_ERRORS = 1000
+
+NUMBER_PATTERN = r'^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]{1,3})?\s*$'
+
+# Column limits of survey_parcels (02_create_survey_table.sql); values beyond
+# them are reported per row instead of failing the whole INSERT
+TEXT_LIMITS = {
+    'parcel_name': 255,
+    'surveyor_name': 255,
+    'province': 100,
+    'land_use': 100,
+    'crop_type': 100
+}
+STATISTIC_FIELDS = ('index_mean', 'index_min', 'index_max', 'index_std_dev')
+STATISTIC_LIMIT = 1000000  # NUMERIC(10, 4)
+AREA_HECTARES_LIMIT = 100000000  # NUMERIC(12, 4), computed by a trigger
+
+# Largest absolute statistic of a row, as stored (rounded to 4 decimals)
+_STATISTIC_MAX_SQL = 'greatest({})'.format(', '.join(
+    f"abs(round(coalesce({field}, '0')::numeric, 4))" for field in STATISTIC_FIELDS))
+
+_TEXT_LIMIT_CASES = ''.join(
+    f"        WHEN char_length({field}) > {limit} THEN '{field} must be at most {limit} characters'\n"
+    for field, limit in TEXT_LIMITS.items())
+
+
+def _text(value) -> Optional[str]:
+    """COPY value for an attribute (None and blank strings become NULL)"""
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    value = str(value)
+    return value if value.strip() else None
+
+
+def _feature_row(row_number: int, feature: dict) -> tuple:
+    if not isinstance(feature, dict):
+        return (row_number, None) + (None,) * len(IMPORT_FIELDS)
+    if feature.get('type') != 'Feature':
+        # Bare geometries are accepted without attributes
+        feature = {'geometry': feature}
+    geometry = feature.get('geometry')
+    properties = feature.get('properties') or {}
+    return (row_number, json.dumps(geometry) if geometry else None) + tuple(
+        _text(properties.get(field)) for field in IMPORT_FIELDS)
+
+
+class _Utf8Reader:
+    """Bytes view of a text stream for ijson (the text layer strips any BOM)"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size).encode('utf-8')
+
+
+def iter_geojson_rows(stream: TextIO) -> Iterator[tuple]:
+    """
+    Staging rows from a GeoJSON FeatureCollection
+
+    The document is parsed incrementally: each feature is yielded as soon as
+    it has been read, so memory use does not grow with the file size.
+
+    Raises:
+        ValueError: If the document is not a FeatureCollection
+    """
+    events = ijson.parse(_Utf8Reader(stream), use_float=True)
+    document_type = None
+    row_number = 0
+    try:
+        prefix, event, value = next(events, (None, None, None))
+        if event != 'start_map':
+            raise ValueError("GeoJSON upload must be a FeatureCollection")
+        for prefix, event, value in events:
+            if prefix == 'type' and event == 'string':
+                document_type = value
+            elif prefix == 'features.item' and event in ('start_map', 'start_array'):
+                # Build this feature from its events, then hand it to COPY
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+                for prefix, event, value in events:
+                    builder.event(event, value)
+                    if event in ('start_map', 'start_array'):
+                        depth += 1
+                    elif event in ('end_map', 'end_array'):
+                        depth -= 1
+                        if depth == 0:
+                            break
+                row_number += 1
+                yield _feature_row(row_number, builder.value)
+            elif prefix == 'features.item':
+                # Scalar in the features array: reported as a row without geometry
+                row_number += 1
+                yield _feature_row(row_number, value)
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid GeoJSON: {e}")
+    if document_type != 'FeatureCollection':
+        raise ValueError("GeoJSON upload must be a FeatureCollection")
+
+
+def iter_geojsonseq_rows(stream: TextIO) -> Iterator[tuple]:
+    """
+    Staging rows from newline-delimited GeoJSON (RFC 8142 or one Feature per line)
+
+    The file is read line by line, so memory use does not grow with its size.
+    Lines that are not valid JSON are kept as rows without a geometry so they
+    are reported with their line number.
+    """
+    for row_number, line in enumerate(stream, start=1):
+        line = line.strip().lstrip('\x1e')
+        if not line:
+            continue
+        try:
+            feature = json.loads(line)
+        except json.JSONDecodeError:
+            feature = None
+        yield _feature_row(row_number, feature)
+
+
+def iter_csv_rows(stream: TextIO) -> Iterator[tuple]:
+    """
+    Staging rows from a CSV file with a header and a WKT geometry column
+
+    The geometry is read from the first of the `wkt`, `geometry` or `geom`
+    columns; row numbers are the CSV line numbers.
+
+    Raises:
+        ValueError: If no geometry column is present
+    """
+    reader = csv.DictReader(stream)
+    header = [name.strip().lower() for name in reader.fieldnames or []]
+    reader.fieldnames = header
+    geometry_column = next((name for name in GEOMETRY_COLUMNS if name in header), None)
+    if geometry_column is None:
+        raise ValueError(f"CSV must have one of the columns: {', '.join(GEOMETRY_COLUMNS)}")
+    for row in reader:
+        yield (reader.line_num, _text(row.get(geometry_column))) + tuple(
+            _text(row.get(field)) for field in IMPORT_FIELDS)
+
+
+def iter_import_rows(stream: TextIO, import_format: str) -> Iterator[tuple]:
+    """
+    Staging rows for an uploaded file
+
+    Raises:
+        ValueError: If the format is unknown or the file is malformed
+    """
+    readers = {
+        'geojson': iter_geojson_rows,
+        'geojsonseq': iter_geojsonseq_rows,
+        'csv': iter_csv_rows
+    }
+    if import_format not in readers:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+    return readers[import_format](stream)
+
+
+def guess_format(filename: Optional[str]) -> str:
+    """Import format from a file name extension (defaults to geojson)"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.geojsonl', '.geojsonseq', '.ndjson', '.jsonl')):
+        return 'geojsonseq'
+    return 'geojson'
+
+
+STAGING_TABLE_SQL = """
+    CREATE TEMP TABLE survey_parcels_import (
+        row_number INTEGER,
+        geom_text TEXT,
+        parcel_name TEXT,
+        description TEXT,
+        surveyor_name TEXT,
+        selected_index TEXT,
+        index_date_start TEXT,
+        index_date_end TEXT,
+        index_mean TEXT,
+        index_min TEXT,
+        index_max TEXT,
+        index_std_dev TEXT,
+        interpretation TEXT,
+        province TEXT,
+        land_use TEXT,
+        crop_type TEXT,
+        notes TEXT,
+        geom GEOMETRY,
+        start_date DATE,
+        end_date DATE,
+        error TEXT
+    ) ON COMMIT DROP
+"""
+
+VALIDATE_SQL = f"""
+    UPDATE survey_parcels_import SET
+        geom = survey_try_geometry(geom_text),
+        start_date = survey_try_date(index_date_start),
+        end_date = survey_try_date(index_date_end);
+
+    UPDATE survey_parcels_import SET error = CASE
+        WHEN parcel_name IS NULL THEN 'parcel_name is required'
+        WHEN geom_text IS NULL THEN 'geometry is required'
+        WHEN geom IS NULL THEN 'geometry could not be parsed'
+        WHEN GeometryType(geom) NOT IN ('POLYGON', 'MULTIPOLYGON')
+            THEN 'geometry must be a Polygon or MultiPolygon, got ' || GeometryType(geom)
+        WHEN coalesce(upper(selected_index), '') NOT IN ('NDVI', 'NDMI', 'SPI')
+            THEN 'selected_index must be NDVI, NDMI or SPI'
+        WHEN start_date IS NULL OR end_date IS NULL
+            THEN 'index_date_start and index_date_end must be dates in YYYY-MM-DD format'
+        WHEN NOT (coalesce(index_mean, '0') ~ '{NUMBER_PATTERN}'
+                  AND coalesce(index_min, '0') ~ '{NUMBER_PATTERN}'
+                  AND coalesce(index_max, '0') ~ '{NUMBER_PATTERN}'
+                  AND coalesce(index_std_dev, '0') ~ '{NUMBER_PATTERN}')
+            THEN 'index statistics must be numeric'
+        -- Only reached for numeric values, so the casts cannot fail
+        WHEN {_STATISTIC_MAX_SQL} >= {STATISTIC_LIMIT}
+            THEN 'index statistics must be between -{STATISTIC_LIMIT} and {STATISTIC_LIMIT}'
+{_TEXT_LIMIT_CASES}    END;
+
+    -- Repair instead of rejecting invalid polygons
+    UPDATE survey_parcels_import SET geom = survey_clean_geometry(geom)
+    WHERE error IS NULL;
+
+    UPDATE survey_parcels_import SET error = 'geometry has no polygonal area after repair'
+    WHERE error IS NULL AND geom IS NULL;
+
+    UPDATE survey_parcels_import SET error = 'geometry is too large (area must be below {AREA_HECTARES_LIMIT} hectares)'
+    WHERE error IS NULL AND ST_Area(geom::geography) / 10000 >= {AREA_HECTARES_LIMIT};
+"""
+
+MERGE_SQL = """
+    INSERT INTO survey_parcels
+    (parcel_name, description, geom, surveyor_name, selected_index,
+     index_date_start, index_date_end, index_mean, index_min, index_max,
+     index_std_dev, interpretation, province, land_use, crop_type, notes)
+    SELECT parcel_name, description, geom, surveyor_name, upper(selected_index),
+           start_date, end_date, index_mean::numeric, index_min::numeric,
+           index_max::numeric, index_std_dev::numeric, interpretation,
+           province, land_use, crop_type, notes
+    FROM survey_parcels_import
+    WHERE error IS NULL
+    ORDER BY row_number
+"""
+
+
+async def iter_rows_in_threadpool(rows: Iterable[tuple],
+                                  batch_size: int = IMPORT_BATCH_SIZE) -> AsyncIterator[tuple]:
+    """
+    Rows of a blocking iterator, read and parsed in a worker thread a batch at a time
+
+    Keeps file reads and JSON/CSV parsing of large uploads off the event loop.
+    """
+    rows = iter(rows)
+    while True:
+        batch = await run_in_threadpool(list, itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        for row in batch:
+            yield row
+
+
+async def import_parcels(conn, rows: Iterable[tuple], dry_run: bool = False,
+                         all_or_nothing: bool = False) -> dict:
+    """
+    COPY parcels into a staging table, validate them and merge the valid ones
+
+    Args:
+        conn: asyncpg connection (not inside a transaction)
+        rows: Staging rows from iter_import_rows() (read in a worker thread)
+        dry_run: Validate only, roll everything back
+        all_or_nothing: Insert nothing if any row is invalid
+
+    Returns:
+        Dict with received/valid/invalid/inserted counts and per-row errors
+    """
+    async with conn.transaction():
+        await conn.execute(STAGING_TABLE_SQL)
+        await conn.copy_records_to_table(
+            'survey_parcels_import', records=iter_rows_in_threadpool(rows),
+            columns=COPY_COLUMNS)
+        await conn.execute(VALIDATE_SQL)
+
+        counts = await conn.fetchrow("""
+            SELECT count(*) AS received, count(*) FILTER (WHERE error IS NOT NULL) AS invalid
+            FROM survey_parcels_import
+        """)
+        errors = await conn.fetch("""
+            SELECT row_number AS row, error
+            FROM survey_parcels_import
+            WHERE error IS NOT NULL
+            ORDER BY row_number
+            LIMIT $1
+        """, MAX_REPORTED_ERRORS)
+
+        inserted = 0
+        if not dry_run and not (all_or_nothing and counts['invalid']):
+            status = await conn.execute(MERGE_SQL)
+            # Command tag is "INSERT 0 <rows>"
+            inserted = int(status.split()[-1])
+
+    return {
+        "received": counts['received'],
+        "valid": counts['received'] - counts['invalid'],
+        "invalid": counts['invalid'],
+        "inserted": inserted,
+        "dry_run": dry_run,
+        "errors": [dict(error) for error in errors],
+        "errors_truncated": counts['invalid'] > len(errors)
+    }
@@ -0,0 +1,243 @@
+"""
+Token-bucket rate limiting
+
+Each caller (authenticated user, otherwise client IP) has a bucket of
+RATE_LIMIT_BURST tokens refilled at RATE_LIMIT_RATE tokens per second.
+Routes spend a route-specific cost per request, so an Earth Engine
+reduction over a drawn polygon drains the bucket much faster than a map
+tile. Streamed batch endpoints pay for their first batch up front (429 if
+the bucket cannot) and are paced by the refill rate afterwards. Buckets
+live in process memory, or in Redis (RATE_LIMIT_REDIS_URL,
+needs the `redis` package) when several workers must share them.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request
+
+from app.dependencies import UserSnapshot, get_current_user_optional
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "2"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "120"))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+# Use the first X-Forwarded-For address (only behind a trusted proxy)
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+
+# Tokens spent per Earth Engine call
+COST_TILE = float(os.getenv("RATE_LIMIT_COST_TILE", "1"))  # only tiles rendered by EE
+COST_PIXEL_VALUE = float(os.getenv("RATE_LIMIT_COST_PIXEL_VALUE", "2"))
+COST_MAP_URL = float(os.getenv("RATE_LIMIT_COST_MAP_URL", "5"))
+COST_AREA_STATS = float(os.getenv("RATE_LIMIT_COST_AREA_STATS", "10"))  # per study area
+COST_TIMESERIES = float(os.getenv("RATE_LIMIT_COST_TIMESERIES", "20"))
+COST_CUSTOM_STATS = float(os.getenv("RATE_LIMIT_COST_CUSTOM_STATS", "20"))
+COST_CACHE_WARM = float(os.getenv("RATE_LIMIT_COST_CACHE_WARM", "60"))
+# Full-table survey_parcels rescan (percentile view refresh)
+COST_STATS_REFRESH = float(os.getenv("RATE_LIMIT_COST_STATS_REFRESH", "60"))
+# Polygon reductions are charged by size (COST_CUSTOM_STATS is the floor
+# for a single drawn polygon)
+COST_FEATURE = float(os.getenv("RATE_LIMIT_COST_FEATURE", "0.5"))
+COST_PER_1000_VERTICES = float(os.getenv("RATE_LIMIT_COST_PER_1000_VERTICES", "1"))
+# Pixels read by EE: the reduction's pixels times the composited images
+COST_PER_MILLION_PIXELS = float(os.getenv("RATE_LIMIT_COST_PER_MILLION_PIXELS", "2"))
+
+# Buckets kept by the in-memory backend (least recently used are dropped)
+MEMORY_MAX_BUCKETS = 10000
+
+
+class MemoryBuckets:
+    """Buckets in this process; each uvicorn worker limits on its own"""
+
+    def __init__(self, maxsize: int = MEMORY_MAX_BUCKETS):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, cost: float, rate: float, capacity: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def status(self) -> dict:
+        return {"backend": "memory", "buckets": len(self._buckets)}
+
+
+# Refill and spend atomically on the Redis server, using its clock
+REDIS_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBuckets:
+    """
+    Buckets shared by every worker through Redis
+
+    Raises:
+        ImportError: If the redis package is not installed
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(REDIS_TAKE_SCRIPT)
+
+    async def take(self, key: str, cost: float, rate: float, capacity: float) -> Tuple[bool, float]:
+        allowed, retry_after = await self.script(
+            keys=[f"rate_limit:{key}"], args=[rate, capacity, cost])
+        return bool(allowed), float(retry_after)
+
+    def status(self) -> dict:
+        return {"backend": "redis"}
+
+
+class RateLimiter:
+    """Token buckets keyed by caller; fails open if the shared backend is down"""
+
+    def __init__(self, rate: float = RATE_LIMIT_RATE, capacity: float = RATE_LIMIT_BURST,
+                 redis_url: Optional[str] = RATE_LIMIT_REDIS_URL):
+        self.rate = rate
+        self.capacity = capacity
+        self.backend = MemoryBuckets()
+        if redis_url:
+            try:
+                self.backend = RedisBuckets(redis_url)
+            except ImportError:
+                print("[RateLimit] redis package not installed, using in-memory buckets")
+        self.rejected = 0
+
+    async def take(self, key: str, cost: float) -> Tuple[bool, float]:
+        """
+        Spend `cost` tokens from a caller's bucket
+
+        Args:
+            key: Caller key (e.g. "user:12" or "ip:10.0.0.1")
+            cost: Tokens to spend (capped at the bucket capacity)
+
+        Returns:
+            (allowed, seconds until the request would be allowed)
+        """
+        cost = min(cost, self.capacity)
+        try:
+            allowed, retry_after = await self.backend.take(key, cost, self.rate, self.capacity)
+        except Exception as e:
+            print(f"[RateLimit] Backend error, allowing request: {e}")
+            return True, 0.0
+        if not allowed:
+            self.rejected += 1
+        return allowed, retry_after
+
+    def status(self) -> dict:
+        return {
+            **self.backend.status(),
+            "enabled": RATE_LIMIT_ENABLED,
+            "rate": self.rate,
+            "burst": self.capacity,
+            "rejected": self.rejected
+        }
+
+
+limiter = RateLimiter()
+
+
+def client_key(request: Request, user: Optional[UserSnapshot]) -> str:
+    """Bucket key of a request: the user when authenticated, otherwise the client IP"""
+    if user is not None:
+        return f"user:{user.id}"
+    forwarded = request.headers.get("x-forwarded-for") if RATE_LIMIT_TRUST_PROXY else None
+    if forwarded:
+        return f"ip:{forwarded.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def features_cost(feature_count: int, vertex_count: int) -> float:
+    """Tokens for reducing a batch of polygons (grows with their number and size)"""
+    return feature_count * COST_FEATURE + vertex_count / 1000 * COST_PER_1000_VERTICES
+
+
+def custom_region_cost(plan: dict) -> float:
+    """Tokens for reducing one drawn polygon, from its reduction plan (pixels, images, vertices)"""
+    pixels = plan['estimated_pixels'] * plan.get('estimated_images', 1)
+    return max(COST_CUSTOM_STATS,
+               pixels / 1e6 * COST_PER_MILLION_PIXELS
+               + plan['vertices']['simplified'] / 1000 * COST_PER_1000_VERTICES)
+
+
+async def enforce_rate_limit(request: Request, user: Optional[UserSnapshot], cost: float):
+    """
+    Spend `cost` tokens for a request
+
+    Raises:
+        HTTPException: 429 with Retry-After when the caller's bucket is empty
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    allowed, retry_after = await limiter.take(client_key(request, user), cost)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+async def wait_for_tokens(key: str, cost: float):
+    """
+    Wait until a caller's bucket can pay `cost`, then spend it
+
+    Used inside streamed responses, where a 429 can no longer be sent:
+    later batches of a large request are paced at the refill rate instead.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    while True:
+        allowed, retry_after = await limiter.take(key, cost)
+        if allowed:
+            return
+        await asyncio.sleep(retry_after)
+
+
+def rate_limit(cost: float):
+    """
+    Dependency spending `cost` tokens per request
+
+    Raises:
+        HTTPException: 429 with Retry-After when the caller's bucket is empty
+    """
+    async def dependency(request: Request,
+                         user: Optional[UserSnapshot] = Depends(get_current_user_optional)):
+        await enforce_rate_limit(request, user, cost)
+
+    return dependency
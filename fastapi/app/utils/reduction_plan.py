@@ -0,0 +1,128 @@
+"""
+Reduction planner for Earth Engine statistics
+
+Estimates how many pixels a reduceRegion call will touch from the geometry
+area and the dataset's native resolution, and picks a scale/tileScale that
+keeps the computation within a pixel budget instead of relying on bestEffort.
+"""
+
+import math
+import os
+from datetime import datetime
+from typing import Optional
+
+# Native resolution (meters) and revisit interval (days) of each dataset.
+# The single source of native scales (the NDVI router's INDEX_SCALES is derived from it).
+DATASETS = {
+    'NDVI': {
+        'collection': 'MODIS/061/MOD13Q1',
+        'native_scale': 250,
+        'revisit_days': 16
+    },
+    'NDMI': {
+        'collection': 'MODIS/061/MOD09A1',
+        'native_scale': 500,
+        'revisit_days': 8
+    },
+    'SPI': {
+        'collection': 'UCSB-CHG/CHIRPS/DAILY',
+        'native_scale': 5566,  # 0.05 degrees
+        'revisit_days': 1,
+        'periods': 2  # current period plus the historical reference period
+    }
+}
+
+# Maximum number of pixels a single reduction may touch
+PIXEL_BUDGET = int(os.getenv("EE_PIXEL_BUDGET", "10000000"))
+
+# Pixels per reduction tile above which tileScale is increased
+PIXELS_PER_TILE = int(os.getenv("EE_PIXELS_PER_TILE", "1000000"))
+MAX_TILE_SCALE = 16
+
+
+def estimate_image_count(index_type: str, start_date: str, end_date: str) -> int:
+    """
+    Estimate the number of images a composite over the period will read
+
+    Args:
+        index_type: NDVI, NDMI or SPI
+        start_date: Start date in YYYY-MM-DD format
+        end_date: End date in YYYY-MM-DD format
+
+    Returns:
+        Estimated image count (at least 1)
+    """
+    dataset = DATASETS[index_type]
+    try:
+        days = (datetime.strptime(end_date, '%Y-%m-%d') -
+                datetime.strptime(start_date, '%Y-%m-%d')).days
+    except (TypeError, ValueError):
+        days = 0
+    images = max(1, math.ceil(max(days, 1) / dataset['revisit_days']))
+    return images * dataset.get('periods', 1)
+
+
+def plan_reduction(
+    index_type: str,
+    area_km2: float,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    pixel_budget: Optional[int] = None
+) -> dict:
+    """
+    Choose scale and tileScale for reducing an index over an area
+
+    The scale is the smallest multiple of the native resolution whose pixel
+    count fits in the budget, so results are exact whenever the area allows it.
+
+    Args:
+        index_type: NDVI, NDMI or SPI
+        area_km2: Area of the region in square kilometers
+        start_date: Optional start date, used for the cost estimate
+        end_date: Optional end date, used for the cost estimate
+        pixel_budget: Optional budget override (capped at PIXEL_BUDGET)
+
+    Returns:
+        Dictionary describing the chosen scale, tileScale and estimated cost
+
+    Raises:
+        ValueError: If the index type is unknown or pixel_budget is not a positive integer
+    """
+    if index_type not in DATASETS:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    if pixel_budget is not None and (
+            isinstance(pixel_budget, bool) or not isinstance(pixel_budget, int) or pixel_budget <= 0):
+        raise ValueError("pixel_budget must be a positive integer")
+
+    dataset = DATASETS[index_type]
+    budget = min(pixel_budget or PIXEL_BUDGET, PIXEL_BUDGET)
+    native_scale = dataset['native_scale']
+    area_m2 = max(area_km2, 0) * 1e6
+
+    native_pixels = area_m2 / (native_scale ** 2)
+    factor = max(1, math.ceil(math.sqrt(native_pixels / budget))) if budget > 0 else 1
+    scale = native_scale * factor
+    pixels = math.ceil(area_m2 / (scale ** 2))
+
+    # Halve the tile size (tileScale doubles) for every PIXELS_PER_TILE step
+    tile_scale = 1
+    while tile_scale < MAX_TILE_SCALE and pixels / (tile_scale ** 2) > PIXELS_PER_TILE:
+        tile_scale *= 2
+
+    plan = {
+        "dataset": dataset['collection'],
+        "native_scale": native_scale,
+        "scale": scale,
+        "tile_scale": tile_scale,
+        "pixel_budget": budget,
+        "native_pixels": math.ceil(native_pixels),
+        "estimated_pixels": pixels,
+        "downsampled": factor > 1
+    }
+
+    if start_date and end_date:
+        images = estimate_image_count(index_type, start_date, end_date)
+        plan["estimated_images"] = images
+        plan["estimated_cost"] = pixels * images  # pixel reads
+
+    return plan
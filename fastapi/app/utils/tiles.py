@@ -0,0 +1,355 @@
+"""
+Local raster tile renderer
+
+Renders XYZ map tiles from cached index composites without calling Earth
+Engine. Composites are stored on disk as float32 overview pyramids
+(EPSG:4326 grids) and colored through precomputed palette lookup tables.
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import struct
+import threading
+import zlib
+from typing import Optional
+
+import numpy as np
+
+# Visualization parameters shared by the map-url handlers and the local renderer
+VIS_PARAMS = {
+    'NDVI': {
+        'min': -0.2,
+        'max': 0.8,
+        'palette': [
+            '#d73027',  # Red (very low NDVI)
+            '#fc8d59',  # Orange
+            '#fee08b',  # Yellow
+            '#d9ef8b',  # Light green
+            '#91cf60',  # Green
+            '#1a9850'   # Dark green (high NDVI)
+        ]
+    },
+    'NDMI': {
+        'min': -0.6,
+        'max': 0.6,
+        'palette': [
+            '#8B4513',  # Brown (very dry)
+            '#D2691E',  # Chocolate (dry)
+            '#F4A460',  # Sandy brown (slightly dry)
+            '#FFFF00',  # Yellow (moderate)
+            '#90EE90',  # Light green (high moisture)
+            '#008000',  # Green (very high moisture)
+            '#006400'   # Dark green (saturated)
+        ]
+    },
+    'SPI': {
+        'min': -50,
+        'max': 50,
+        'palette': [
+            '#8B0000',  # Dark red (severe drought)
+            '#FF0000',  # Red (moderate drought)
+            '#FFA500',  # Orange (mild drought)
+            '#FFFF00',  # Yellow (near normal)
+            '#90EE90',  # Light green (slightly wet)
+            '#008000',  # Green (moderately wet)
+            '#0000FF'   # Blue (very wet)
+        ]
+    }
+}
+
+TILE_SIZE = 256
+RASTER_CACHE_DIR = os.getenv("RASTER_CACHE_DIR", "/app/cache/rasters")
+# Disk space of the raster cache; the oldest composites are deleted beyond it
+RASTER_CACHE_MAX_BYTES = int(os.getenv("RASTER_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Value written by EE for masked pixels before they are converted to NaN
+NODATA = -9999.0
+
+
+def build_lut(palette: list, steps: int = 256) -> np.ndarray:
+    """
+    Build an RGBA lookup table interpolating linearly between palette colors
+
+    Returns:
+        uint8 array of shape (steps, 4)
+    """
+    colors = np.array([
+        [int(color.lstrip('#')[i:i + 2], 16) for i in (0, 2, 4)]
+        for color in palette
+    ], dtype=np.float64)
+    stops = np.linspace(0, 1, len(colors))
+    positions = np.linspace(0, 1, steps)
+    lut = np.empty((steps, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.round(np.interp(positions, stops, colors[:, channel]))
+    lut[:, 3] = 255
+    return lut
+
+
+# Precomputed lookup tables for every index
+LUTS = {index: build_lut(vis['palette']) for index, vis in VIS_PARAMS.items()}
+
+
+def tile_lonlat(z: int, x: int, y: int, size: int = TILE_SIZE):
+    """Longitudes of pixel columns and latitudes of pixel rows of a Web Mercator tile"""
+    n = 2 ** z
+    offsets = (np.arange(size) + 0.5) / size
+    lons = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return lons, lats
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """(west, south, east, north) of a Web Mercator tile in degrees"""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Encode an RGBA uint8 array as PNG using zlib only"""
+    height, width = rgba.shape[:2]
+    # Prefix every scanline with filter type 0 (None)
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (struct.pack('>I', len(data)) + tag + data +
+                struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(raw.tobytes(), 1)) + chunk(b'IEND', b''))
+
+
+def encode_tile(rgba: np.ndarray, image_format: str = 'png'):
+    """
+    Encode a rendered tile
+
+    WebP requires Pillow; PNG is used when it is not installed.
+
+    Returns:
+        Tuple of (bytes, media type)
+    """
+    if image_format == 'webp':
+        try:
+            from io import BytesIO
+            from PIL import Image
+            buffer = BytesIO()
+            Image.fromarray(rgba, 'RGBA').save(buffer, format='WEBP', lossless=True, method=0)
+            return buffer.getvalue(), 'image/webp'
+        except ImportError:
+            pass
+    return encode_png(rgba), 'image/png'
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+def cache_key(index_type: str, study_area: str, start_date: str, end_date: str) -> str:
+    """Directory name of a cached composite"""
+    area = re.sub(r'[^a-z0-9]+', '-', study_area.lower()).strip('-')
+    return f"{index_type.upper()}_{area}_{start_date}_{end_date}"
+
+
+def build_overviews(data: np.ndarray, min_size: int = TILE_SIZE) -> list:
+    """Build a pyramid of 2x2 NaN-aware mean overviews down to about one tile"""
+    levels = [data]
+    while min(levels[-1].shape) > min_size:
+        current = levels[-1]
+        height, width = (current.shape[0] // 2) * 2, (current.shape[1] // 2) * 2
+        blocks = current[:height, :width].reshape(height // 2, 2, width // 2, 2)
+        valid = ~np.isnan(blocks)
+        counts = valid.sum(axis=(1, 3))
+        sums = np.where(valid, blocks, 0).sum(axis=(1, 3))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            levels.append(np.where(counts > 0, sums / counts, np.nan).astype(np.float32))
+    return levels
+
+
+def save_raster(key: str, data: np.ndarray, bounds: list, metadata: dict) -> dict:
+    """
+    Store a composite and its overview pyramid in the raster cache
+
+    Args:
+        key: Cache key from cache_key()
+        data: 2D array (north-up) with NODATA or NaN for missing pixels
+        bounds: [west, south, east, north] of the array in degrees
+        metadata: Extra information kept alongside the raster
+
+    Returns:
+        Stored metadata
+    """
+    data = np.asarray(data, dtype=np.float32)
+    data[data == NODATA] = np.nan
+
+    tmp_dir = os.path.join(RASTER_CACHE_DIR, f".{key}.tmp")
+    final_dir = os.path.join(RASTER_CACHE_DIR, key)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    levels = build_overviews(data)
+    for level, array in enumerate(levels):
+        np.save(os.path.join(tmp_dir, f"level{level}.npy"), array)
+
+    meta = dict(metadata, bounds=bounds, levels=len(levels),
+                shape=[int(data.shape[0]), int(data.shape[1])])
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Swap the directory in place so readers never see a partial pyramid
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.rename(tmp_dir, final_dir)
+    _loaded.pop(key, None)
+    prune_raster_cache(keep=key)
+    return meta
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return total
+
+
+def prune_raster_cache(keep: Optional[str] = None, max_bytes: int = RASTER_CACHE_MAX_BYTES) -> list:
+    """
+    Delete the oldest cached composites until the cache fits in max_bytes
+
+    Args:
+        keep: Key that is never deleted (the composite just stored)
+        max_bytes: Size limit of the cache directory
+
+    Returns:
+        Keys of the deleted composites
+    """
+    entries = []
+    try:
+        names = os.listdir(RASTER_CACHE_DIR)
+    except OSError:
+        return []
+    for name in names:
+        directory = os.path.join(RASTER_CACHE_DIR, name)
+        if name.startswith('.'):
+            continue
+        try:
+            entries.append((os.path.getmtime(os.path.join(directory, "meta.json")),
+                            name, _directory_size(directory)))
+        except OSError:
+            continue
+
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for _, name, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(RASTER_CACHE_DIR, name), ignore_errors=True)
+        _loaded.pop(name, None)
+        total -= size
+        removed.append(name)
+    return removed
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_raster(key: str) -> Optional[dict]:
+    """Load (memory-mapped) pyramid levels of a cached composite, or None"""
+    directory = os.path.join(RASTER_CACHE_DIR, key)
+    meta_path = os.path.join(directory, "meta.json")
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+
+    cached = _loaded.get(key)
+    if cached is not None and cached['mtime'] == mtime:
+        return cached
+
+    with _loaded_lock:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        levels = [np.load(os.path.join(directory, f"level{level}.npy"), mmap_mode='r')
+                  for level in range(meta['levels'])]
+        raster = {'meta': meta, 'levels': levels, 'mtime': mtime}
+        _loaded[key] = raster
+        return raster
+
+
+def find_latest_raster(index_type: str, study_area: str) -> Optional[str]:
+    """Key of the most recent cached composite for an index and study area"""
+    prefix = cache_key(index_type, study_area, '', '').rstrip('_') + '_'
+    try:
+        keys = [name for name in os.listdir(RASTER_CACHE_DIR) if name.startswith(prefix)]
+    except OSError:
+        return None
+    # Keys end with _<start>_<end>, so sorting orders them by period
+    return max(keys) if keys else None
+
+
+def list_rasters() -> list:
+    """Metadata of every cached composite"""
+    try:
+        names = sorted(os.listdir(RASTER_CACHE_DIR))
+    except OSError:
+        return []
+    rasters = []
+    for name in names:
+        raster = None if name.startswith('.') else load_raster(name)
+        if raster is not None:
+            rasters.append(dict(raster['meta'], key=name))
+    return rasters
+
+
+def render_tile(raster: dict, index_type: str, z: int, x: int, y: int) -> Optional[np.ndarray]:
+    """
+    Render one tile from a cached pyramid
+
+    Picks the overview level closest to the tile resolution, samples it with
+    nearest neighbour and colors values through the index lookup table.
+
+    Returns:
+        RGBA uint8 array, or None if the tile does not overlap the raster
+    """
+    west, south, east, north = raster['meta']['bounds']
+    tile_west, tile_south, tile_east, tile_north = tile_bounds(z, x, y)
+    if tile_west >= east or tile_east <= west or tile_south >= north or tile_north <= south:
+        return None
+
+    levels = raster['levels']
+    base_res = (east - west) / levels[0].shape[1]
+    tile_res = (tile_east - tile_west) / TILE_SIZE
+    level = int(np.clip(np.floor(np.log2(max(tile_res / base_res, 1))), 0, len(levels) - 1))
+    data = levels[level]
+    height, width = data.shape
+    res_x = (east - west) / width
+    res_y = (north - south) / height
+
+    lons, lats = tile_lonlat(z, x, y)
+    cols = np.floor((lons - west) / res_x).astype(np.int64)
+    rows = np.floor((north - lats) / res_y).astype(np.int64)
+    col_ok = (cols >= 0) & (cols < width)
+    row_ok = (rows >= 0) & (rows < height)
+
+    values = np.asarray(data)[np.clip(rows, 0, height - 1)[:, None],
+                              np.clip(cols, 0, width - 1)[None, :]]
+    valid = row_ok[:, None] & col_ok[None, :] & ~np.isnan(values)
+
+    vis = VIS_PARAMS[index_type]
+    lut = LUTS[index_type]
+    scaled = (np.nan_to_num(values) - vis['min']) * ((len(lut) - 1) / (vis['max'] - vis['min']))
+    rgba = lut[np.clip(scaled, 0, len(lut) - 1).astype(np.uint8)]
+    rgba[~valid, 3] = 0
+    return rgba
@@ -0,0 +1,133 @@
+"""
+GeoJSON <-> (E)WKB conversion
+
+Used as the binary codec for the PostGIS `geometry` type on asyncpg
+connections, so geometries travel as WKB instead of WKT/GeoJSON text.
+"""
+
+import struct
+from itertools import chain
+
+GEOMETRY_TYPES = {
+    'Point': 1,
+    'LineString': 2,
+    'Polygon': 3,
+    'MultiPoint': 4,
+    'MultiLineString': 5,
+    'MultiPolygon': 6,
+    'GeometryCollection': 7
+}
+GEOMETRY_NAMES = {code: name for name, code in GEOMETRY_TYPES.items()}
+
+EWKB_Z = 0x80000000
+EWKB_M = 0x40000000
+EWKB_SRID = 0x20000000
+
+DEFAULT_SRID = 4326
+
+
+def _pack_points(points) -> bytes:
+    """Count-prefixed XY coordinates"""
+    return struct.pack(f'<I{2 * len(points)}d', len(points),
+                       *chain.from_iterable(p[:2] for p in points))
+
+
+def _pack_rings(rings) -> bytes:
+    return struct.pack('<I', len(rings)) + b''.join(_pack_points(ring) for ring in rings)
+
+
+def _encode(geometry: dict, srid=None) -> bytes:
+    geom_type = geometry['type']
+    code = GEOMETRY_TYPES[geom_type]
+    if srid is not None:
+        header = struct.pack('<BII', 1, code | EWKB_SRID, srid)
+    else:
+        header = struct.pack('<BI', 1, code)
+
+    if geom_type == 'GeometryCollection':
+        parts = geometry['geometries']
+        return header + struct.pack('<I', len(parts)) + b''.join(_encode(g) for g in parts)
+
+    coordinates = geometry['coordinates']
+    if geom_type == 'Point':
+        return header + struct.pack('<2d', *coordinates[:2])
+    if geom_type == 'LineString':
+        return header + _pack_points(coordinates)
+    if geom_type == 'Polygon':
+        return header + _pack_rings(coordinates)
+
+    # Multi* geometries are collections of complete WKB geometries
+    part_type = geom_type[len('Multi'):]
+    return header + struct.pack('<I', len(coordinates)) + b''.join(
+        _encode({'type': part_type, 'coordinates': part}) for part in coordinates)
+
+
+def geojson_to_ewkb(geometry: dict, srid: int = DEFAULT_SRID) -> bytes:
+    """
+    Encode a GeoJSON geometry as little-endian EWKB (2D)
+
+    Raises:
+        ValueError: If the geometry type or coordinates are malformed
+    """
+    try:
+        return _encode(geometry, srid)
+    except (KeyError, TypeError, IndexError, struct.error) as e:
+        raise ValueError(f"Invalid GeoJSON geometry: {e}")
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt: str):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def geometry(self) -> dict:
+        (order,) = self.unpack('B')
+        endian = '<' if order == 1 else '>'
+        (type_code,) = self.unpack(f'{endian}I')
+
+        dims = 2
+        if type_code & EWKB_Z:
+            dims += 1
+        if type_code & EWKB_M:
+            dims += 1
+        if type_code & EWKB_SRID:
+            self.unpack(f'{endian}I')
+        type_code &= 0x0fffffff
+        # ISO WKB: 1000s are Z, 2000s are M, 3000s are ZM
+        if type_code >= 1000:
+            dims = 2 + {1: 1, 2: 1, 3: 2}[type_code // 1000]
+            type_code %= 1000
+
+        geom_type = GEOMETRY_NAMES[type_code]
+
+        def points():
+            (count,) = self.unpack(f'{endian}I')
+            values = self.unpack(f'{endian}{count * dims}d')
+            return [list(values[i:i + dims]) for i in range(0, len(values), dims)]
+
+        def rings():
+            (count,) = self.unpack(f'{endian}I')
+            return [points() for _ in range(count)]
+
+        if geom_type == 'Point':
+            return {'type': 'Point', 'coordinates': list(self.unpack(f'{endian}{dims}d'))}
+        if geom_type == 'LineString':
+            return {'type': 'LineString', 'coordinates': points()}
+        if geom_type == 'Polygon':
+            return {'type': 'Polygon', 'coordinates': rings()}
+
+        (count,) = self.unpack(f'{endian}I')
+        parts = [self.geometry() for _ in range(count)]
+        if geom_type == 'GeometryCollection':
+            return {'type': 'GeometryCollection', 'geometries': parts}
+        return {'type': geom_type, 'coordinates': [part['coordinates'] for part in parts]}
+
+
+def ewkb_to_geojson(data: bytes) -> dict:
+    """Decode WKB or EWKB (any byte order, Z/M aware) into a GeoJSON geometry"""
+    return _Reader(bytes(data)).geometry()
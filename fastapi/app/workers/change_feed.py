@@ -0,0 +1,115 @@
+"""
+Parcel change feed
+
+One dedicated asyncpg connection LISTENs on the `survey_parcel_changes`
+channel (see postgis/init/10_survey_parcel_change_feed.sql) and fans the
+events out to WebSocket subscribers whose viewport intersects the change.
+Events are forwarded as the JSON text sent by PostgreSQL.
+"""
+
+import asyncio
+import json
+import os
+from typing import List, Optional
+
+import asyncpg
+
+from app.database import DATABASE_URL
+
+CHANNEL = "survey_parcel_changes"
+
+# Events buffered per subscriber before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "256"))
+KEEPALIVE_SECONDS = float(os.getenv("CHANGE_FEED_KEEPALIVE", "30"))
+RECONNECT_SECONDS = float(os.getenv("CHANGE_FEED_RECONNECT", "5"))
+
+# Sent when events may have been lost (listener reconnect or slow client)
+RESYNC_EVENT = json.dumps({"op": "resync"})
+
+
+def bbox_intersects(a: List[float], b: List[float]) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class Subscription:
+    """Queue of events for one WebSocket client, filtered by its viewport"""
+
+    def __init__(self, bbox: Optional[List[float]] = None):
+        self.bbox = bbox
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def wants(self, event_bbox: Optional[List[float]]) -> bool:
+        if self.bbox is None or not event_bbox or None in event_bbox:
+            return True
+        return bbox_intersects(self.bbox, event_bbox)
+
+    def push(self, message: str):
+        """Queue a message; a client that falls behind gets a single resync instead"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+
+class ChangeFeed:
+    """Single LISTEN connection shared by every subscriber"""
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.connected = False
+
+    def subscribe(self, bbox: Optional[List[float]] = None) -> Subscription:
+        subscription = Subscription(bbox)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+    def broadcast(self, message: str, bbox: Optional[List[float]] = None):
+        for subscription in list(self.subscriptions):
+            if subscription.wants(bbox):
+                subscription.push(message)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            bbox = json.loads(payload).get("bbox")
+        except ValueError:
+            bbox = None
+        self.broadcast(payload, bbox)
+
+    async def run(self):
+        """Listen until cancelled, reconnecting (and telling clients to resync) on failure"""
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn=DATABASE_URL)
+                await conn.add_listener(CHANNEL, self._on_notification)
+                if not self.connected:
+                    # Changes made while disconnected were not delivered
+                    self.broadcast(RESYNC_EVENT)
+                self.connected = True
+                print(f"[ChangeFeed] Listening on {CHANNEL}")
+                while True:
+                    await asyncio.sleep(KEEPALIVE_SECONDS)
+                    await conn.fetchval("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.connected = False
+                print(f"[ChangeFeed] Listener error: {e}; reconnecting in {RECONNECT_SECONDS}s")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    def status(self) -> dict:
+        return {"connected": self.connected, "subscribers": len(self.subscriptions)}
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,197 @@
+"""
+Background parcel enrichment
+
+Parcels saved without index statistics are queued by a trigger
+(survey_parcel_enrichment_queue). This worker claims pending parcels in
+batches, computes their statistics with one Earth Engine reduceRegions call
+per (index, period) group and writes every result back with a single
+set-based UPDATE.
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import get_async_pool, init_async_pool
+from app.routers import ndvi
+
+ENRICH_WORKER_ENABLED = os.getenv("ENRICH_WORKER_ENABLED", "true").lower() == "true"
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "200"))
+ENRICH_POLL_INTERVAL = float(os.getenv("ENRICH_POLL_INTERVAL", "30"))
+ENRICH_MAX_ATTEMPTS = int(os.getenv("ENRICH_MAX_ATTEMPTS", "5"))
+# Claimed parcels are hidden from other workers for this long
+ENRICH_LEASE_SECONDS = int(os.getenv("ENRICH_LEASE_SECONDS", "600"))
+# Base delay before retrying a failed parcel (doubled on every attempt)
+ENRICH_RETRY_SECONDS = int(os.getenv("ENRICH_RETRY_SECONDS", "300"))
+
+# Set by the API after inserting parcels so the worker does not wait for the next poll
+_wakeup = asyncio.Event()
+
+
+def wake_enrichment_worker():
+    """Ask the worker to look at the queue now"""
+    _wakeup.set()
+
+
+async def _connection_pool():
+    return get_async_pool() or await init_async_pool()
+
+
+async def claim_batch(conn, size: int) -> list:
+    """
+    Lease up to `size` due parcels and return them with their geometry
+
+    SKIP LOCKED lets several workers (or API replicas) claim disjoint batches.
+    """
+    return await conn.fetch("""
+        WITH claimed AS (
+            SELECT parcel_id
+            FROM survey_parcel_enrichment_queue
+            WHERE next_attempt_at <= CURRENT_TIMESTAMP AND attempts < $2
+            ORDER BY next_attempt_at
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE survey_parcel_enrichment_queue q
+        SET attempts = q.attempts + 1,
+            next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $3)
+        FROM claimed
+        JOIN survey_parcels p ON p.id = claimed.parcel_id
+        WHERE q.parcel_id = claimed.parcel_id
+        RETURNING p.id, p.selected_index, p.index_date_start, p.index_date_end, p.geom
+    """, size, ENRICH_MAX_ATTEMPTS, float(ENRICH_LEASE_SECONDS))
+
+
+def compute_group(index_type: str, start_date: str, end_date: str, parcels: list) -> list:
+    """Statistics for parcels sharing an index and period (blocking EE call)"""
+    return ndvi.compute_features_stats(
+        index_type, start_date, end_date,
+        [(parcel['id'], parcel['geom']) for parcel in parcels])
+
+
+async def save_results(conn, results: list, failures: dict):
+    """
+    Write statistics back and update the queue in one transaction
+
+    Args:
+        results: Result dictionaries from compute_features_stats()
+        failures: Mapping of parcel id to error message
+    """
+    async with conn.transaction():
+        if results:
+            await conn.execute("""
+                UPDATE survey_parcels p
+                SET index_mean = r.mean,
+                    index_min = r.min,
+                    index_max = r.max,
+                    index_std_dev = r.std_dev,
+                    interpretation = coalesce(p.interpretation, r.interpretation)
+                FROM unnest($1::int[], $2::float8[], $3::float8[], $4::float8[],
+                            $5::float8[], $6::text[])
+                    AS r(id, mean, min, max, std_dev, interpretation)
+                WHERE p.id = r.id
+            """,
+                [r["id"] for r in results],
+                [r["statistics"]["mean"] for r in results],
+                [r["statistics"]["min"] for r in results],
+                [r["statistics"]["max"] for r in results],
+                [r["statistics"]["std_dev"] for r in results],
+                [r["interpretation"] for r in results]
+            )
+            await conn.execute(
+                "DELETE FROM survey_parcel_enrichment_queue WHERE parcel_id = ANY($1::int[])",
+                [r["id"] for r in results])
+
+        if failures:
+            await conn.execute("""
+                UPDATE survey_parcel_enrichment_queue q
+                SET last_error = f.error,
+                    next_attempt_at = CURRENT_TIMESTAMP
+                        + make_interval(secs => $3 * power(2, q.attempts - 1))
+                FROM unnest($1::int[], $2::text[]) AS f(parcel_id, error)
+                WHERE q.parcel_id = f.parcel_id
+            """, list(failures), list(failures.values()), float(ENRICH_RETRY_SECONDS))
+
+
+async def enrich_batch(size: int = ENRICH_BATCH_SIZE) -> int:
+    """
+    Claim, compute and store one batch
+
+    Returns:
+        Number of parcels claimed
+    """
+    pool = await _connection_pool()
+    async with pool.acquire() as conn:
+        parcels = await claim_batch(conn, size)
+    if not parcels:
+        return 0
+
+    groups = defaultdict(list)
+    for parcel in parcels:
+        key = (parcel['selected_index'], parcel['index_date_start'].isoformat(),
+               parcel['index_date_end'].isoformat())
+        groups[key].append(parcel)
+
+    results, failures = [], {}
+    for (index_type, start_date, end_date), group in groups.items():
+        try:
+            computed = await run_in_threadpool(
+                compute_group, index_type, start_date, end_date, group)
+        except Exception as e:
+            failures.update({parcel['id']: f"Earth Engine error: {e}" for parcel in group})
+            continue
+        for result in computed:
+            if result["has_data"]:
+                results.append(result)
+            else:
+                failures[result["id"]] = f"No {index_type} data between {start_date} and {end_date}"
+
+    async with pool.acquire() as conn:
+        await save_results(conn, results, failures)
+
+    print(f"[Enrichment] {len(results)} parcels scored, {len(failures)} failed "
+          f"({len(groups)} reduceRegions calls)")
+    return len(parcels)
+
+
+async def run_enrichment_worker():
+    """Process the queue until cancelled, sleeping when it is empty"""
+    while True:
+        claimed = 0
+        try:
+            if ndvi.EE_INITIALIZED:
+                claimed = await enrich_batch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Enrichment] Batch failed: {e}")
+
+        # Keep going while batches come back full
+        if claimed < ENRICH_BATCH_SIZE:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=ENRICH_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def queue_status() -> dict:
+    """Pending and failed parcel counts"""
+    pool = await _connection_pool()
+    async with pool.acquire() as conn:
+        status = await conn.fetchrow("""
+            SELECT
+                count(*) FILTER (WHERE attempts < $1) AS pending,
+                count(*) FILTER (WHERE attempts >= $1) AS failed,
+                min(enqueued_at) FILTER (WHERE attempts < $1) AS oldest_pending
+            FROM survey_parcel_enrichment_queue
+        """, ENRICH_MAX_ATTEMPTS)
+    return {
+        "pending": status['pending'],
+        "failed": status['failed'],
+        "oldest_pending": status['oldest_pending'].isoformat() if status['oldest_pending'] else None,
+        "batch_size": ENRICH_BATCH_SIZE,
+        "max_attempts": ENRICH_MAX_ATTEMPTS
+    }
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Bulk import survey parcels from GeoJSON or CSV-with-WKT files
+Run inside the FastAPI container:
+
+    docker compose exec fastapi python import_parcels.py parcels.geojson
+    docker compose exec fastapi python import_parcels.py parcels.csv --dry-run
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+import asyncpg
+
+from app.database import DATABASE_URL
+from app.utils.parcel_import import IMPORT_FORMATS, guess_format, import_parcels, iter_import_rows
+
+
+async def run(args) -> dict:
+    import_format = args.format or guess_format(args.path)
+    conn = await asyncpg.connect(dsn=args.dsn)
+    try:
+        with open(args.path, encoding="utf-8-sig", newline="") as stream:
+            return await import_parcels(
+                conn, iter_import_rows(stream, import_format),
+                dry_run=args.dry_run, all_or_nothing=args.all_or_nothing)
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import survey parcels")
+    parser.add_argument("path", help="GeoJSON FeatureCollection, GeoJSON sequence or CSV file")
+    parser.add_argument("--format", choices=IMPORT_FORMATS,
+                        help="File format (default: from the file extension)")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, do not insert")
+    parser.add_argument("--all-or-nothing", action="store_true",
+                        help="Insert nothing if any row is invalid")
+    parser.add_argument("--dsn", default=DATABASE_URL, help="PostgreSQL connection URL")
+    args = parser.parse_args()
+
+    try:
+        result = asyncio.run(run(args))
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    for error in result["errors"]:
+        print(f"row {error['row']}: {error['error']}")
+    print(json.dumps({k: v for k, v in result.items() if k != "errors"}, indent=2))
+    print(f"✅ Imported {result['inserted']} of {result['received']} parcels")
+    sys.exit(1 if result["invalid"] and args.all_or_nothing else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import asyncio
 import os
 from typing import Optional
 import uvicorn
 from dotenv import load_dotenv
 from app.routers import ndvi, survey, auth
+from app.database import close_async_pool, init_async_pool, pool_status
+from app.dependencies import principal_cache_status
+from app.workers import enrichment
+from app.workers.change_feed import change_feed
 
 # Load environment variables from .env file
 load_dotenv()
@@ -30,6 +35,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Database pools and background tasks
+background_tasks = []
+
+
+@app.on_event("startup")
+async def startup():
+    try:
+        await init_async_pool()
+    except Exception as e:
+        # Survey endpoints retry creating the pool on first use
+        print(f"[DB] Could not create asyncpg pool: {e}")
+
+    try:
+        await survey.ensure_season_partitions()
+    except Exception as e:
+        print(f"[DB] Could not create season partitions: {e}")
+
+    if survey.STATS_REFRESH_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(survey.refresh_stats_periodically()))
+    if enrichment.ENRICH_WORKER_ENABLED:
+        background_tasks.append(asyncio.create_task(enrichment.run_enrichment_worker()))
+    background_tasks.append(asyncio.create_task(change_feed.run()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await close_async_pool()
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(ndvi.router)
@@ -42,6 +79,18 @@ app.include_router(survey.router)
 async def health_check():
     return {"status": "healthy", "message": "CMU APSCO API is running"}
 
+# Database pool health
+
+
+@app.get("/health/db")
+async def database_health_check():
+    return {
+        "status": "healthy",
+        "pool": pool_status(),
+        "change_feed": change_feed.status(),
+        "auth_cache": principal_cache_status()
+    }
+
 # Root endpoint
 
 
@@ -0,0 +1,108 @@
+"""Repairs and rejections of the local polygon pipeline"""
+
+import math
+
+import pytest
+
+from app.utils.geometry import (
+    GeometryError, clean_geometry, count_vertices, geodesic_area_km2, simplify_for_reduction)
+
+# Counter-clockwise 0.01 degree square near Chiang Mai
+SQUARE = [[98.9, 18.7], [98.91, 18.7], [98.91, 18.71], [98.9, 18.71], [98.9, 18.7]]
+HOLE = [[98.902, 18.702], [98.902, 18.705], [98.905, 18.705], [98.905, 18.702], [98.902, 18.702]]
+
+
+def polygon(*rings):
+    return {'type': 'Polygon', 'coordinates': list(rings)}
+
+
+def test_valid_polygon_is_unchanged():
+    repairs = []
+    assert clean_geometry(polygon(SQUARE, HOLE), repairs) == polygon(SQUARE, HOLE)
+    assert repairs == []
+
+
+def test_feature_is_unwrapped():
+    feature = {'type': 'Feature', 'properties': {}, 'geometry': polygon(SQUARE)}
+    assert clean_geometry(feature) == polygon(SQUARE)
+
+
+def test_closes_open_ring():
+    repairs = []
+    assert clean_geometry(polygon(SQUARE[:-1]), repairs) == polygon(SQUARE)
+    assert "closed open ring" in repairs
+
+
+def test_removes_duplicate_vertices():
+    ring = SQUARE[:2] + [SQUARE[1]] + SQUARE[2:]
+    repairs = []
+    assert clean_geometry(polygon(ring), repairs) == polygon(SQUARE)
+    assert "removed duplicate vertices" in repairs
+
+
+def test_reorients_rings():
+    repairs = []
+    cleaned = clean_geometry(polygon(SQUARE[::-1], HOLE[::-1]), repairs)
+    assert cleaned == polygon(SQUARE, HOLE)
+    assert repairs == ["reoriented ring"]
+
+
+def test_drops_degenerate_hole():
+    repairs = []
+    hole = [[98.902, 18.702], [98.903, 18.703], [98.902, 18.702]]
+    assert clean_geometry(polygon(SQUARE, hole), repairs) == polygon(SQUARE)
+    assert "dropped degenerate hole" in repairs
+
+
+def test_rounds_coordinates():
+    ring = [[lon + 1e-9, lat] for lon, lat in SQUARE]
+    assert clean_geometry(polygon(ring)) == polygon(SQUARE)
+
+
+def test_multipolygon():
+    other = [[round(lon + 0.1, 7), lat] for lon, lat in SQUARE]
+    geometry = {'type': 'MultiPolygon', 'coordinates': [[SQUARE[::-1]], [other]]}
+    cleaned = clean_geometry(geometry)
+    assert cleaned == {'type': 'MultiPolygon', 'coordinates': [[SQUARE], [other]]}
+    assert count_vertices(cleaned) == 10
+
+
+@pytest.mark.parametrize("geometry, message", [
+    ("not a geometry", "GeoJSON object"),
+    ({'type': 'Feature', 'geometry': 7}, "GeoJSON object"),
+    ({'type': 'Point', 'coordinates': [98.9, 18.7]}, "Expected Polygon or MultiPolygon"),
+    (polygon(), "no coordinates"),
+    ({'type': 'MultiPolygon', 'coordinates': [[]]}, "no rings"),
+    (polygon([[98.9, 18.7], [98.91, 18.7], [98.9, 18.7]]), "at least 3 distinct vertices"),
+    (polygon([[98.9, 18.7], [98.91, 18.7], [98.92, 18.7], [98.9, 18.7]]), "zero area"),
+    (polygon([[98.9, 18.7], [181, 18.7], [98.91, 18.71], [98.9, 18.7]]), "out of range"),
+    (polygon([[98.9, 18.7], [math.nan, 18.7], [98.91, 18.71], [98.9, 18.7]]), "finite numbers"),
+    (polygon([[98.9], [98.91, 18.7], [98.91, 18.71], [98.9]]), "pairs"),
+    # Bow tie: edges cross in the middle
+    (polygon([[98.9, 18.7], [98.92, 18.72], [98.92, 18.7], [98.9, 18.71], [98.9, 18.7]]), "cross"),
+])
+def test_rejections(geometry, message):
+    with pytest.raises(GeometryError, match=message):
+        clean_geometry(geometry)
+
+
+def test_geodesic_area():
+    # 0.01 degrees is about 1.11 km north-south and 1.05 km east-west at 18.7 N
+    area = geodesic_area_km2(polygon(SQUARE))
+    assert area == pytest.approx(1.113 * 1.054, rel=0.01)
+    assert geodesic_area_km2(polygon(SQUARE, HOLE)) < area
+
+
+def test_simplify_for_reduction_drops_gps_noise():
+    # Points 0.3 m off the straight edges are removed
+    jitter = 0.3 / 111320
+    edge = [[98.9 + i * 0.001, 18.7 + (jitter if i % 2 else 0)] for i in range(10)]
+    cleaned = clean_geometry(polygon(edge + SQUARE[1:]))
+    simplified = simplify_for_reduction(cleaned)
+    assert count_vertices(simplified) < count_vertices(cleaned)
+    assert geodesic_area_km2(simplified) == pytest.approx(geodesic_area_km2(cleaned), rel=0.01)
+
+
+def test_simplify_for_reduction_keeps_small_polygons():
+    cleaned = clean_geometry(polygon(SQUARE))
+    assert simplify_for_reduction(cleaned) is cleaned
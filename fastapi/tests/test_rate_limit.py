@@ -0,0 +1,129 @@
+"""Token buckets, caller keys and request costs of the rate limiter"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils import rate_limit
+from app.utils.rate_limit import (
+    COST_CUSTOM_STATS, MemoryBuckets, RateLimiter, client_key, custom_region_cost,
+    enforce_rate_limit, features_cost, wait_for_tokens)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    return clock
+
+
+def make_request(host='10.0.0.1', forwarded=None):
+    headers = [(b'x-forwarded-for', forwarded.encode())] if forwarded else []
+    return Request({'type': 'http', 'headers': headers, 'client': (host, 1234)})
+
+
+class User:
+    id = 12
+
+
+def take(buckets, key, cost, rate=2.0, capacity=10.0):
+    return asyncio.run(buckets.take(key, cost, rate, capacity))
+
+
+def test_bucket_spends_and_refills(clock):
+    buckets = MemoryBuckets()
+    assert take(buckets, 'a', 6) == (True, 0.0)
+    allowed, retry_after = take(buckets, 'a', 6)
+    assert not allowed
+    assert retry_after == pytest.approx(1.0)  # 2 tokens missing at 2 tokens/s
+
+    clock.now += 1.0
+    assert take(buckets, 'a', 6)[0]
+    # Buckets are independent and refills never exceed the capacity
+    assert take(buckets, 'b', 10)[0]
+    clock.now += 3600
+    assert take(buckets, 'b', 10)[0]
+    assert not take(buckets, 'b', 1)[0]
+
+
+def test_least_recently_used_buckets_are_dropped(clock):
+    buckets = MemoryBuckets(maxsize=2)
+    for key in ('a', 'b', 'c'):
+        take(buckets, key, 1)
+    assert buckets.status()['buckets'] == 2
+
+
+def test_limiter_caps_cost_and_counts_rejections(clock):
+    limiter = RateLimiter(rate=1, capacity=5, redis_url=None)
+    # A cost above the capacity empties a full bucket instead of never passing
+    assert asyncio.run(limiter.take('a', 50)) == (True, 0.0)
+    assert not asyncio.run(limiter.take('a', 1))[0]
+    assert limiter.status()['rejected'] == 1
+
+
+def test_limiter_fails_open():
+    class Broken:
+        async def take(self, *args):
+            raise ConnectionError("redis down")
+
+    limiter = RateLimiter(redis_url=None)
+    limiter.backend = Broken()
+    assert asyncio.run(limiter.take('a', 1)) == (True, 0.0)
+
+
+def test_client_key(monkeypatch):
+    request = make_request(forwarded='203.0.113.7, 10.0.0.2')
+    assert client_key(request, User()) == 'user:12'
+    assert client_key(request, None) == 'ip:10.0.0.1'
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_TRUST_PROXY', True)
+    assert client_key(request, None) == 'ip:203.0.113.7'
+
+
+def test_costs_grow_with_size():
+    assert features_cost(10, 2000) > features_cost(10, 1000) > features_cost(5, 1000)
+
+    small = {'estimated_pixels': 1000, 'vertices': {'simplified': 5}}
+    assert custom_region_cost(small) == COST_CUSTOM_STATS
+    large = {'estimated_pixels': 10 ** 7, 'estimated_images': 12, 'vertices': {'simplified': 5000}}
+    assert custom_region_cost(large) > custom_region_cost(dict(large, estimated_images=1))
+    assert custom_region_cost(large) > COST_CUSTOM_STATS
+
+
+def test_enforce_raises_429_with_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setattr(rate_limit, 'limiter', RateLimiter(rate=0.5, capacity=4, redis_url=None))
+    request = make_request()
+    asyncio.run(enforce_rate_limit(request, None, 3))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(enforce_rate_limit(request, None, 3))
+    assert error.value.status_code == 429
+    assert error.value.headers['Retry-After'] == '4'  # 2 tokens at 0.5/s
+
+
+def test_wait_for_tokens_sleeps_until_refilled(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setattr(rate_limit, 'limiter', RateLimiter(rate=1, capacity=4, redis_url=None))
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limit.asyncio, 'sleep', sleep)
+
+    async def spend_twice():
+        await wait_for_tokens('a', 3)
+        await wait_for_tokens('a', 3)
+
+    asyncio.run(spend_twice())
+    assert sleeps == [pytest.approx(2.0)]
@@ -0,0 +1,62 @@
+"""Scale, tileScale and cost choices of the Earth Engine reduction planner"""
+
+import pytest
+
+from app.utils.reduction_plan import (
+    DATASETS, MAX_TILE_SCALE, PIXELS_PER_TILE, estimate_image_count, plan_reduction)
+
+
+@pytest.mark.parametrize("index_type", sorted(DATASETS))
+def test_small_area_uses_native_scale(index_type):
+    plan = plan_reduction(index_type, 1.0)
+    assert plan["scale"] == DATASETS[index_type]["native_scale"]
+    assert plan["tile_scale"] == 1
+    assert not plan["downsampled"]
+
+
+def test_scale_is_coarsened_to_fit_the_budget():
+    # 10,000 km² at 250 m is 160,000 pixels
+    plan = plan_reduction('NDVI', 10000, pixel_budget=50000)
+    assert plan["native_pixels"] == 160000
+    assert plan["downsampled"]
+    assert plan["scale"] == 250 * 2
+    assert plan["estimated_pixels"] <= 50000
+    assert plan["scale"] % plan["native_scale"] == 0
+
+
+def test_budget_override_is_capped():
+    plan = plan_reduction('NDVI', 1.0, pixel_budget=10 ** 12)
+    assert plan["pixel_budget"] == plan_reduction('NDVI', 1.0)["pixel_budget"]
+
+
+def test_tile_scale_grows_with_pixels_per_tile():
+    area_km2 = 4 * PIXELS_PER_TILE * 0.25 * 0.25 * 1.5
+    plan = plan_reduction('NDVI', area_km2, pixel_budget=10 * PIXELS_PER_TILE)
+    assert 1 < plan["tile_scale"] <= MAX_TILE_SCALE
+    assert plan["estimated_pixels"] / plan["tile_scale"] ** 2 <= PIXELS_PER_TILE
+
+
+def test_cost_estimate_needs_both_dates():
+    assert "estimated_cost" not in plan_reduction('NDVI', 10, '2024-01-01')
+    plan = plan_reduction('NDVI', 10, '2024-01-01', '2024-03-01')
+    assert plan["estimated_images"] == 4  # 60 days / 16-day revisit
+    assert plan["estimated_cost"] == plan["estimated_pixels"] * 4
+
+
+def test_image_count():
+    assert estimate_image_count('NDMI', '2024-01-01', '2024-01-17') == 2
+    # SPI reads the period and its historical reference
+    assert estimate_image_count('SPI', '2024-01-01', '2024-01-31') == 60
+    assert estimate_image_count('NDVI', '2024-02-01', '2024-01-01') == 1
+    assert estimate_image_count('NDVI', 'bad', None) == 1
+
+
+@pytest.mark.parametrize("pixel_budget", [0, -5, 1.5, "1000", True])
+def test_invalid_pixel_budget(pixel_budget):
+    with pytest.raises(ValueError, match="pixel_budget"):
+        plan_reduction('NDVI', 10, pixel_budget=pixel_budget)
+
+
+def test_unknown_index_type():
+    with pytest.raises(ValueError, match="Unsupported index type"):
+        plan_reduction('EVI', 10)
@@ -0,0 +1,119 @@
+"""Local tile rendering: PNG encoding, tile sampling and the raster cache"""
+
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from app.utils import tiles
+from app.utils.tiles import (
+    EMPTY_TILE, LUTS, NODATA, TILE_SIZE, VIS_PARAMS, build_overviews, cache_key, encode_png,
+    render_tile, tile_bounds)
+
+
+def decode_png(data: bytes) -> np.ndarray:
+    """Minimal decoder for the unfiltered 8-bit RGBA PNGs written by encode_png"""
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    offset, chunks = 8, {}
+    while offset < len(data):
+        (length,) = struct.unpack_from('>I', data, offset)
+        tag = data[offset + 4:offset + 8]
+        body = data[offset + 8:offset + 8 + length]
+        (crc,) = struct.unpack_from('>I', data, offset + 8 + length)
+        assert crc == zlib.crc32(tag + body) & 0xffffffff
+        chunks[tag] = body
+        offset += 12 + length
+    assert b'IEND' in chunks
+    width, height, depth, color_type = struct.unpack_from('>IIBB', chunks[b'IHDR'])
+    assert (depth, color_type) == (8, 6)
+    raw = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype=np.uint8).reshape(height, -1)
+    assert (raw[:, 0] == 0).all()
+    return raw[:, 1:].reshape(height, width, 4)
+
+
+def test_png_round_trip():
+    rgba = np.random.default_rng(0).integers(0, 256, (3, 5, 4), dtype=np.uint8)
+    assert np.array_equal(decode_png(encode_png(rgba)), rgba)
+
+
+def test_png_opens_with_pillow():
+    Image = pytest.importorskip("PIL.Image")
+    from io import BytesIO
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    rgba[:, :, 1] = 200
+    rgba[:, :, 3] = 255
+    image = Image.open(BytesIO(encode_png(rgba)))
+    assert image.mode == 'RGBA'
+    assert np.array_equal(np.asarray(image), rgba)
+
+
+def test_empty_tile_is_transparent():
+    decoded = decode_png(EMPTY_TILE)
+    assert decoded.shape == (TILE_SIZE, TILE_SIZE, 4)
+    assert not decoded[:, :, 3].any()
+
+
+def test_luts_span_the_palette():
+    for index_type, vis in VIS_PARAMS.items():
+        first, last = vis['palette'][0], vis['palette'][-1]
+        assert '#%02x%02x%02x' % tuple(LUTS[index_type][0, :3]) == first.lower()
+        assert '#%02x%02x%02x' % tuple(LUTS[index_type][-1, :3]) == last.lower()
+
+
+def test_cache_key():
+    assert cache_key('ndvi', 'Chiang Mai', '2024-01-01', '2024-01-31') == \
+        'NDVI_chiang-mai_2024-01-01_2024-01-31'
+
+
+def test_overviews_ignore_nan():
+    data = np.array([[1, np.nan, 3, 3], [1, 1, 3, 3]] * 2, dtype=np.float32)
+    levels = build_overviews(data, min_size=2)
+    assert len(levels) == 2
+    assert np.array_equal(levels[1], np.array([[1, 3], [1, 3]], dtype=np.float32))
+
+
+def make_raster(data, bounds):
+    return {'meta': {'bounds': bounds}, 'levels': build_overviews(np.asarray(data, dtype=np.float32))}
+
+
+def test_render_tile_colors_and_masks():
+    z, x, y = 10, 792, 460  # Tile over Chiang Mai
+    west, south, east, north = tile_bounds(z, x, y)
+    # Left half at the NDVI maximum, right half missing
+    data = np.full((64, 64), 0.8, dtype=np.float32)
+    data[:, 32:] = np.nan
+    rgba = render_tile(make_raster(data, [west, south, east, north]), 'NDVI', z, x, y)
+
+    assert rgba.shape == (TILE_SIZE, TILE_SIZE, 4)
+    assert (rgba[:, :120, :] == LUTS['NDVI'][-1]).all()
+    assert not rgba[:, 136:, 3].any()
+
+
+def test_render_tile_outside_raster():
+    raster = make_raster(np.zeros((4, 4)), [98.0, 18.0, 99.0, 19.0])
+    assert render_tile(raster, 'NDVI', 10, 0, 0) is None
+
+
+def test_save_load_and_prune(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiles, 'RASTER_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(tiles, 'RASTER_CACHE_MAX_BYTES', 10 ** 9)
+    data = np.full((300, 300), 0.5, dtype=np.float32)
+    data[0, 0] = NODATA
+
+    first = cache_key('NDVI', 'Chiang Mai', '2024-01-01', '2024-01-31')
+    meta = tiles.save_raster(first, data, [98.0, 18.0, 99.0, 19.0], {'index_type': 'NDVI'})
+    assert meta['levels'] == 2
+    raster = tiles.load_raster(first)
+    assert np.isnan(raster['levels'][0][0, 0])
+    assert tiles.load_raster('missing') is None
+
+    second = cache_key('NDVI', 'Chiang Mai', '2024-02-01', '2024-02-29')
+    tiles.save_raster(second, data, [98.0, 18.0, 99.0, 19.0], {'index_type': 'NDVI'})
+    assert tiles.find_latest_raster('NDVI', 'Chiang Mai') == second
+    assert [r['key'] for r in tiles.list_rasters()] == [first, second]
+
+    # A limit below both composites keeps only the one being stored
+    assert tiles.prune_raster_cache(keep=second, max_bytes=1) == [first]
+    assert tiles.find_latest_raster('NDVI', 'Chiang Mai') == second
+    assert tiles.load_raster(first) is None
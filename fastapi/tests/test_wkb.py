@@ -0,0 +1,66 @@
+"""Round trips of the GeoJSON <-> EWKB codec used for PostGIS geometries"""
+
+import struct
+
+import pytest
+
+from app.utils.wkb import EWKB_SRID, EWKB_Z, ewkb_to_geojson, geojson_to_ewkb
+
+SQUARE = [[100.0, 18.0], [100.1, 18.0], [100.1, 18.1], [100.0, 18.1], [100.0, 18.0]]
+HOLE = [[100.02, 18.02], [100.02, 18.05], [100.05, 18.05], [100.05, 18.02], [100.02, 18.02]]
+
+
+@pytest.mark.parametrize("geometry", [
+    {'type': 'Polygon', 'coordinates': [SQUARE]},
+    {'type': 'Polygon', 'coordinates': [SQUARE, HOLE]},
+    {'type': 'MultiPolygon', 'coordinates': [
+        [SQUARE, HOLE],
+        [[[101.0, 19.0], [101.2, 19.0], [101.2, 19.2], [101.0, 19.0]]]
+    ]},
+    {'type': 'Point', 'coordinates': [98.98, 18.79]},
+    {'type': 'LineString', 'coordinates': [[98.0, 18.0], [99.0, 19.0]]},
+])
+def test_round_trip(geometry):
+    assert ewkb_to_geojson(geojson_to_ewkb(geometry)) == geometry
+
+
+def test_srid_is_written():
+    data = geojson_to_ewkb({'type': 'Polygon', 'coordinates': [SQUARE]}, srid=32647)
+    order, type_code, srid = struct.unpack_from('<BII', data)
+    assert order == 1
+    assert type_code == 3 | EWKB_SRID
+    assert srid == 32647
+
+
+def test_3d_input_is_written_as_2d():
+    ring = [p + [350.0] for p in SQUARE]
+    data = geojson_to_ewkb({'type': 'Polygon', 'coordinates': [ring]})
+    assert not struct.unpack_from('<BI', data)[1] & EWKB_Z
+    assert ewkb_to_geojson(data) == {'type': 'Polygon', 'coordinates': [SQUARE]}
+
+
+def test_decodes_ewkb_z_with_srid():
+    points = [[100.0, 18.0, 1.0], [100.1, 18.0, 2.0], [100.1, 18.1, 3.0], [100.0, 18.0, 1.0]]
+    data = struct.pack('<BIIII', 1, 3 | EWKB_Z | EWKB_SRID, 4326, 1, len(points))
+    data += struct.pack(f'<{3 * len(points)}d', *[v for p in points for v in p])
+    assert ewkb_to_geojson(data) == {'type': 'Polygon', 'coordinates': [points]}
+
+
+def test_decodes_big_endian_iso_z():
+    data = struct.pack('>BI3d', 0, 1001, 98.98, 18.79, 310.0)
+    assert ewkb_to_geojson(data) == {'type': 'Point', 'coordinates': [98.98, 18.79, 310.0]}
+
+
+def test_decodes_memoryview():
+    geometry = {'type': 'Polygon', 'coordinates': [SQUARE]}
+    assert ewkb_to_geojson(memoryview(geojson_to_ewkb(geometry))) == geometry
+
+
+@pytest.mark.parametrize("geometry", [
+    {'type': 'Polygon'},
+    {'type': 'Circle', 'coordinates': [0, 0]},
+    {'type': 'Polygon', 'coordinates': [[[1.0], [2.0, 3.0]]]},
+])
+def test_malformed_geometry_raises_value_error(geometry):
+    with pytest.raises(ValueError):
+        geojson_to_ewkb(geometry)
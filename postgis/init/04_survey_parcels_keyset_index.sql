@@ -0,0 +1,5 @@
+-- Composite index backing keyset pagination of survey parcels
+-- Matches ORDER BY created_at DESC, id DESC and the (created_at, id) < (...) cursor predicate
+
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_created_at_id
+    ON survey_parcels (created_at DESC, id DESC);
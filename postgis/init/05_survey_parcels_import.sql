@@ -0,0 +1,29 @@
+-- Helpers for bulk parcel import
+-- Rows are COPY'd into a temporary staging table as text and validated set-based;
+-- these functions turn unparsable values into NULL instead of aborting the batch
+
+-- Parse GeoJSON or WKT into an SRID 4326 geometry, NULL on error
+CREATE OR REPLACE FUNCTION survey_try_geometry(source TEXT)
+RETURNS GEOMETRY AS $$
+BEGIN
+    IF source IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF left(ltrim(source), 1) = '{' THEN
+        RETURN ST_SetSRID(ST_GeomFromGeoJSON(source), 4326);
+    END IF;
+    RETURN ST_SetSRID(ST_GeomFromText(source), 4326);
+EXCEPTION WHEN OTHERS THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Parse a YYYY-MM-DD date, NULL on error
+CREATE OR REPLACE FUNCTION survey_try_date(source TEXT)
+RETURNS DATE AS $$
+BEGIN
+    RETURN source::DATE;
+EXCEPTION WHEN OTHERS THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
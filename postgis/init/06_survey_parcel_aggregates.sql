@@ -0,0 +1,140 @@
+-- Incrementally maintained survey statistics
+-- survey_parcel_aggregates holds one row per (province, selected_index, crop_type, land_use)
+-- group and is kept current by statement-level triggers, so dashboard stats
+-- read O(groups) rows instead of scanning survey_parcels.
+-- NULL group values are stored as '' so they can be part of the primary key.
+
+CREATE TABLE IF NOT EXISTS survey_parcel_aggregates (
+    province VARCHAR(100) NOT NULL DEFAULT '',
+    selected_index VARCHAR(10) NOT NULL,
+    crop_type VARCHAR(100) NOT NULL DEFAULT '',
+    land_use VARCHAR(100) NOT NULL DEFAULT '',
+    parcel_count BIGINT NOT NULL DEFAULT 0,
+    area_hectares_sum NUMERIC NOT NULL DEFAULT 0,
+    index_mean_sum NUMERIC NOT NULL DEFAULT 0,
+    index_mean_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (province, selected_index, crop_type, land_use)
+);
+
+COMMENT ON TABLE survey_parcel_aggregates IS 'Per-group parcel counts, area and index sums maintained by triggers on survey_parcels';
+
+-- Apply the rows changed by one statement as +1/-1 deltas.
+-- Transition tables (new_rows/old_rows) make bulk imports cost one upsert per group.
+CREATE OR REPLACE FUNCTION survey_parcel_aggregates_apply()
+RETURNS TRIGGER AS $$
+DECLARE
+    changes TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := 'SELECT province, selected_index, crop_type, land_use, area_hectares, index_mean, 1 AS sign FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := 'SELECT province, selected_index, crop_type, land_use, area_hectares, index_mean, -1 AS sign FROM old_rows';
+    ELSE
+        changes := 'SELECT province, selected_index, crop_type, land_use, area_hectares, index_mean, 1 AS sign FROM new_rows
+                    UNION ALL
+                    SELECT province, selected_index, crop_type, land_use, area_hectares, index_mean, -1 AS sign FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO survey_parcel_aggregates AS a
+            (province, selected_index, crop_type, land_use,
+             parcel_count, area_hectares_sum, index_mean_sum, index_mean_count)
+        SELECT coalesce(province, ''), selected_index, coalesce(crop_type, ''), coalesce(land_use, ''),
+               sum(sign),
+               sum(sign * coalesce(area_hectares, 0)),
+               sum(sign * coalesce(index_mean, 0)),
+               sum(CASE WHEN index_mean IS NULL THEN 0 ELSE sign END)
+        FROM (%s) changes
+        GROUP BY 1, 2, 3, 4
+        HAVING sum(sign) <> 0
+            OR sum(sign * coalesce(area_hectares, 0)) <> 0
+            OR sum(sign * coalesce(index_mean, 0)) <> 0
+            OR sum(CASE WHEN index_mean IS NULL THEN 0 ELSE sign END) <> 0
+        -- Lock groups in key order so concurrent statements cannot deadlock
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (province, selected_index, crop_type, land_use) DO UPDATE SET
+            parcel_count = a.parcel_count + EXCLUDED.parcel_count,
+            area_hectares_sum = a.area_hectares_sum + EXCLUDED.area_hectares_sum,
+            index_mean_sum = a.index_mean_sum + EXCLUDED.index_mean_sum,
+            index_mean_count = a.index_mean_count + EXCLUDED.index_mean_count
+    $sql$, changes);
+
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM survey_parcel_aggregates WHERE parcel_count <= 0;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow only one event per trigger
+DROP TRIGGER IF EXISTS survey_parcel_aggregates_insert ON survey_parcels;
+CREATE TRIGGER survey_parcel_aggregates_insert
+    AFTER INSERT ON survey_parcels
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_aggregates_apply();
+
+DROP TRIGGER IF EXISTS survey_parcel_aggregates_update ON survey_parcels;
+CREATE TRIGGER survey_parcel_aggregates_update
+    AFTER UPDATE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_aggregates_apply();
+
+DROP TRIGGER IF EXISTS survey_parcel_aggregates_delete ON survey_parcels;
+CREATE TRIGGER survey_parcel_aggregates_delete
+    AFTER DELETE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_aggregates_apply();
+
+-- Recompute every group from survey_parcels (initial load or repair after drift)
+CREATE OR REPLACE FUNCTION survey_parcel_aggregates_rebuild()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE survey_parcel_aggregates IN EXCLUSIVE MODE;
+    DELETE FROM survey_parcel_aggregates;
+    INSERT INTO survey_parcel_aggregates
+        (province, selected_index, crop_type, land_use,
+         parcel_count, area_hectares_sum, index_mean_sum, index_mean_count)
+    SELECT coalesce(province, ''), selected_index, coalesce(crop_type, ''), coalesce(land_use, ''),
+           count(*), coalesce(sum(area_hectares), 0), coalesce(sum(index_mean), 0), count(index_mean)
+    FROM survey_parcels
+    GROUP BY 1, 2, 3, 4;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT survey_parcel_aggregates_rebuild();
+
+-- Percentiles cannot be maintained incrementally; they come from a
+-- materialized view refreshed periodically by the API.
+-- CUBE produces every combination of group columns; grouping_id has a bit set
+-- for each rolled-up column (province = 8, selected_index = 4, crop_type = 2, land_use = 1).
+DROP MATERIALIZED VIEW IF EXISTS survey_parcel_percentiles;
+CREATE MATERIALIZED VIEW survey_parcel_percentiles AS
+SELECT
+    GROUPING(province, selected_index, crop_type, land_use) AS grouping_id,
+    coalesce(province, '') AS province,
+    coalesce(selected_index, '') AS selected_index,
+    coalesce(crop_type, '') AS crop_type,
+    coalesce(land_use, '') AS land_use,
+    count(*) AS parcel_count,
+    percentile_cont(0.1) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p10,
+    percentile_cont(0.25) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p25,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p50,
+    percentile_cont(0.75) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p75,
+    percentile_cont(0.9) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p90,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY area_hectares) AS area_hectares_p50,
+    CURRENT_TIMESTAMP AS refreshed_at
+FROM (
+    SELECT coalesce(province, '') AS province, selected_index,
+           coalesce(crop_type, '') AS crop_type, coalesce(land_use, '') AS land_use,
+           index_mean, area_hectares
+    FROM survey_parcels
+) parcels
+GROUP BY CUBE (province, selected_index, crop_type, land_use);
+
+-- Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_survey_parcel_percentiles_group
+    ON survey_parcel_percentiles (grouping_id, province, selected_index, crop_type, land_use);
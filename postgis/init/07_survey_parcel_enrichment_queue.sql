@@ -0,0 +1,60 @@
+-- Queue of parcels waiting for index statistics
+-- Parcels inserted without index_mean are queued by trigger; the API's
+-- enrichment worker claims them in batches (FOR UPDATE SKIP LOCKED), computes
+-- the statistics with one Earth Engine reduceRegions per batch and removes them.
+
+CREATE TABLE IF NOT EXISTS survey_parcel_enrichment_queue (
+    parcel_id INTEGER PRIMARY KEY REFERENCES survey_parcels(id) ON DELETE CASCADE,
+    enqueued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_survey_parcel_enrichment_queue_next_attempt
+    ON survey_parcel_enrichment_queue (next_attempt_at);
+
+COMMENT ON TABLE survey_parcel_enrichment_queue IS 'Parcels waiting for background index statistics';
+
+-- Queue new parcels without statistics (one statement per insert batch)
+CREATE OR REPLACE FUNCTION survey_parcel_enqueue_inserted()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO survey_parcel_enrichment_queue (parcel_id)
+    SELECT id FROM new_rows WHERE index_mean IS NULL
+    ON CONFLICT (parcel_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS survey_parcel_enqueue_insert ON survey_parcels;
+CREATE TRIGGER survey_parcel_enqueue_insert
+    AFTER INSERT ON survey_parcels
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_enqueue_inserted();
+
+-- Re-queue parcels whose geometry, index or period changed and whose stats were cleared
+CREATE OR REPLACE FUNCTION survey_parcel_enqueue_updated()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO survey_parcel_enrichment_queue (parcel_id)
+    VALUES (NEW.id)
+    ON CONFLICT (parcel_id) DO UPDATE SET
+        next_attempt_at = CURRENT_TIMESTAMP, attempts = 0, last_error = NULL;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS survey_parcel_enqueue_update ON survey_parcels;
+CREATE TRIGGER survey_parcel_enqueue_update
+    AFTER UPDATE OF geom, selected_index, index_date_start, index_date_end, index_mean
+    ON survey_parcels
+    FOR EACH ROW
+    WHEN (NEW.index_mean IS NULL)
+    EXECUTE FUNCTION survey_parcel_enqueue_updated();
+
+-- Queue existing parcels that never got statistics
+INSERT INTO survey_parcel_enrichment_queue (parcel_id)
+SELECT id FROM survey_parcels WHERE index_mean IS NULL
+ON CONFLICT (parcel_id) DO NOTHING;
@@ -0,0 +1,32 @@
+-- Survey data version
+-- A single counter bumped by every statement that changes survey_parcels.
+-- Derived results (hex bins, ETags) are cached under the current version, so
+-- they are invalidated exactly when the data changes. The bump is
+-- transactional: readers only see the new version once the change is committed.
+
+CREATE TABLE IF NOT EXISTS survey_data_version (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO survey_data_version (singleton) VALUES (TRUE)
+ON CONFLICT (singleton) DO NOTHING;
+
+COMMENT ON TABLE survey_data_version IS 'Version counter of survey_parcels, bumped once per modifying statement';
+
+CREATE OR REPLACE FUNCTION survey_data_version_bump()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE survey_data_version
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE singleton;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS survey_data_version_bump ON survey_parcels;
+CREATE TRIGGER survey_data_version_bump
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON survey_parcels
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_data_version_bump();
@@ -0,0 +1,35 @@
+-- Full-text and fuzzy search over survey parcels
+-- search_vector feeds ranked full-text matches (GIN); search_text feeds
+-- trigram word similarity for misspelled or partial terms (GIN, pg_trgm).
+-- The 'simple' configuration is used because names and notes mix Thai and English.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE survey_parcels
+ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(parcel_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(crop_type, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(surveyor_name, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(description, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce(notes, '')), 'D')
+) STORED;
+
+ALTER TABLE survey_parcels
+ADD COLUMN IF NOT EXISTS search_text TEXT GENERATED ALWAYS AS (
+    lower(
+        coalesce(parcel_name, '') || ' ' ||
+        coalesce(crop_type, '') || ' ' ||
+        coalesce(surveyor_name, '') || ' ' ||
+        coalesce(description, '') || ' ' ||
+        coalesce(notes, '')
+    )
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_search_vector
+    ON survey_parcels USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_search_text_trgm
+    ON survey_parcels USING GIN (search_text gin_trgm_ops);
+
+COMMENT ON COLUMN survey_parcels.search_vector IS 'Weighted full-text document (name A, crop/surveyor B, description C, notes D)';
+COMMENT ON COLUMN survey_parcels.search_text IS 'Lower-cased searchable text for trigram matching';
@@ -0,0 +1,85 @@
+-- Parcel change feed
+-- Every statement that changes survey_parcels sends compact JSON events on the
+-- survey_parcel_changes channel (delivered on commit). The API holds one
+-- LISTEN connection and fans events out to WebSocket clients by bbox.
+--   {"id": 12, "op": "update", "bbox": [xmin, ymin, xmax, ymax], "updated_at": "..."}
+-- Statements touching more than survey_parcel_notify_limit() rows send a single
+--   {"op": "bulk", "action": "insert", "count": 5000, "bbox": [...]}
+-- event instead, telling clients to reload the affected area.
+-- Update events cover both the old and the new geometry.
+
+CREATE OR REPLACE FUNCTION survey_parcel_notify_limit()
+RETURNS INTEGER AS $$
+    SELECT 100
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION survey_parcel_notify_changes()
+RETURNS TRIGGER AS $$
+DECLARE
+    changes TEXT;
+    total INTEGER;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := 'SELECT id, geom, updated_at FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := 'SELECT id, geom, NULL::timestamp AS updated_at FROM old_rows';
+    ELSE
+        changes := 'SELECT n.id, ST_Collect(o.geom, n.geom) AS geom, n.updated_at
+                    FROM new_rows n JOIN old_rows o ON o.id = n.id';
+    END IF;
+
+    EXECUTE format('SELECT count(*) FROM (%s) c', changes) INTO total;
+    IF total = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    IF total > survey_parcel_notify_limit() THEN
+        EXECUTE format($sql$
+            SELECT pg_notify('survey_parcel_changes', json_build_object(
+                'op', 'bulk',
+                'action', %L,
+                'count', count(*),
+                'bbox', json_build_array(
+                    round(ST_XMin(ST_Extent(geom))::numeric, 6), round(ST_YMin(ST_Extent(geom))::numeric, 6),
+                    round(ST_XMax(ST_Extent(geom))::numeric, 6), round(ST_YMax(ST_Extent(geom))::numeric, 6))
+            )::text)
+            FROM (%s) c
+        $sql$, lower(TG_OP), changes);
+    ELSE
+        EXECUTE format($sql$
+            SELECT pg_notify('survey_parcel_changes', json_build_object(
+                'id', id,
+                'op', %L,
+                'bbox', json_build_array(
+                    round(ST_XMin(geom)::numeric, 6), round(ST_YMin(geom)::numeric, 6),
+                    round(ST_XMax(geom)::numeric, 6), round(ST_YMax(geom)::numeric, 6)),
+                'updated_at', updated_at
+            )::text)
+            FROM (%s) c
+        $sql$, lower(TG_OP), changes);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS survey_parcel_notify_insert ON survey_parcels;
+CREATE TRIGGER survey_parcel_notify_insert
+    AFTER INSERT ON survey_parcels
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_notify_changes();
+
+DROP TRIGGER IF EXISTS survey_parcel_notify_update ON survey_parcels;
+CREATE TRIGGER survey_parcel_notify_update
+    AFTER UPDATE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_notify_changes();
+
+DROP TRIGGER IF EXISTS survey_parcel_notify_delete ON survey_parcels;
+CREATE TRIGGER survey_parcel_notify_delete
+    AFTER DELETE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_notify_changes();
@@ -0,0 +1,37 @@
+-- Polygon and MultiPolygon parcels with server-side repair
+-- geom accepts any polygonal geometry; incoming geometries are repaired with
+-- survey_clean_geometry() instead of being rejected.
+
+ALTER TABLE survey_parcels
+ALTER COLUMN geom TYPE GEOMETRY(Geometry, 4326);
+
+ALTER TABLE survey_parcels DROP CONSTRAINT IF EXISTS survey_parcels_geom_polygonal;
+ALTER TABLE survey_parcels
+ADD CONSTRAINT survey_parcels_geom_polygonal
+CHECK (GeometryType(geom) IN ('POLYGON', 'MULTIPOLYGON'));
+
+COMMENT ON COLUMN survey_parcels.geom IS 'Polygon or MultiPolygon geometry in WGS84 (EPSG:4326)';
+
+-- Make a geometry valid, keep only its polygonal parts and snap coordinates
+-- to `grid` degrees (1e-7 is about 1 cm). Single-part results are returned
+-- as Polygon. Returns NULL when nothing polygonal is left.
+CREATE OR REPLACE FUNCTION survey_clean_geometry(source GEOMETRY, grid FLOAT8 DEFAULT 1e-7)
+RETURNS GEOMETRY AS $$
+    SELECT CASE
+        WHEN ST_IsEmpty(cleaned) THEN NULL
+        WHEN ST_NumGeometries(cleaned) = 1 THEN ST_GeometryN(cleaned, 1)
+        ELSE cleaned
+    END
+    FROM (
+        SELECT ST_CollectionExtract(
+            ST_ReducePrecision(
+                ST_CollectionExtract(ST_MakeValid(ST_Force2D(ST_SetSRID(source, 4326))), 3),
+                grid),
+            3) AS cleaned
+    ) repaired
+$$ LANGUAGE sql IMMUTABLE STRICT;
+
+-- Repair parcels stored before the function existed
+UPDATE survey_parcels
+SET geom = survey_clean_geometry(geom)
+WHERE NOT ST_IsValid(geom) AND survey_clean_geometry(geom) IS NOT NULL;
@@ -0,0 +1,214 @@
+-- Range-partition survey_parcels by survey_date (one partition per season year)
+-- The table is rebuilt as a partitioned table with the same columns, so the
+-- API keeps reading and writing `survey_parcels` unchanged. Queries filtered
+-- on survey_date (the API's `season` parameter) only scan matching partitions,
+-- and old seasons can be detached as standalone archive tables.
+--
+-- Partitioned tables cannot have a primary key or unique index without the
+-- partition key, so the key becomes (id, survey_date); ids still come from
+-- the same sequence. The enrichment queue's foreign key is replaced by a
+-- delete trigger.
+
+BEGIN;
+
+DROP MATERIALIZED VIEW IF EXISTS survey_parcel_percentiles;
+ALTER TABLE survey_parcel_enrichment_queue
+    DROP CONSTRAINT IF EXISTS survey_parcel_enrichment_queue_parcel_id_fkey;
+
+ALTER TABLE survey_parcels RENAME TO survey_parcels_unpartitioned;
+
+CREATE TABLE survey_parcels (
+    LIKE survey_parcels_unpartitioned
+    INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED INCLUDING COMMENTS
+) PARTITION BY RANGE (survey_date);
+
+ALTER TABLE survey_parcels ALTER COLUMN survey_date SET NOT NULL;
+ALTER TABLE survey_parcels ADD PRIMARY KEY (id, survey_date);
+ALTER TABLE survey_parcels
+    ADD CONSTRAINT survey_parcels_user_id_fkey
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL;
+ALTER SEQUENCE survey_parcels_id_seq OWNED BY survey_parcels.id;
+
+COMMENT ON TABLE survey_parcels IS 'Survey data for drought monitoring including polygon geometries and index calculations (partitioned by survey_date year)';
+
+-- Rows outside every season partition
+CREATE TABLE IF NOT EXISTS survey_parcels_default PARTITION OF survey_parcels DEFAULT;
+
+-- Create the partition of one season year (no-op if it exists).
+-- Fails if survey_parcels_default already holds rows of that year.
+CREATE OR REPLACE FUNCTION survey_parcels_create_partition(season_year INTEGER)
+RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := format('survey_parcels_%s', season_year);
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF survey_parcels FOR VALUES FROM (%L) TO (%L)',
+            partition_name, make_date(season_year, 1, 1), make_date(season_year + 1, 1, 1));
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Detach a season as a standalone archive table (survey_parcels_<year>).
+-- Its rows leave the aggregates, so they are rebuilt and the data version bumped.
+CREATE OR REPLACE FUNCTION survey_parcels_detach_partition(season_year INTEGER)
+RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := format('survey_parcels_%s', season_year);
+BEGIN
+    EXECUTE format('ALTER TABLE survey_parcels DETACH PARTITION %I', partition_name);
+    PERFORM survey_parcel_aggregates_rebuild();
+    UPDATE survey_data_version
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE singleton;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT survey_parcels_create_partition(season_year::INTEGER)
+FROM generate_series(
+    least(
+        coalesce((SELECT min(extract(year FROM coalesce(survey_date, created_at)))
+                  FROM survey_parcels_unpartitioned), extract(year FROM CURRENT_DATE)),
+        extract(year FROM CURRENT_DATE)),
+    extract(year FROM CURRENT_DATE) + 1
+) AS season_year;
+
+-- Copy before creating triggers and indexes (no per-row side effects, faster index builds)
+INSERT INTO survey_parcels
+    (id, parcel_name, description, geom, survey_date, surveyor_name, selected_index,
+     index_date_start, index_date_end, index_mean, index_min, index_max, index_std_dev,
+     interpretation, area_hectares, province, land_use, crop_type, notes,
+     created_at, updated_at, user_id)
+SELECT id, parcel_name, description, geom,
+       coalesce(survey_date, created_at, CURRENT_TIMESTAMP), surveyor_name, selected_index,
+       index_date_start, index_date_end, index_mean, index_min, index_max, index_std_dev,
+       interpretation, area_hectares, province, land_use, crop_type, notes,
+       created_at, updated_at, user_id
+FROM survey_parcels_unpartitioned;
+
+DROP TABLE survey_parcels_unpartitioned CASCADE;
+
+-- Indexes (created on every partition, present and future)
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_geom ON survey_parcels USING GIST (geom);
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_survey_date_brin ON survey_parcels USING BRIN (survey_date);
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_index_type ON survey_parcels (selected_index);
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_user_id ON survey_parcels (user_id);
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_created_at_id ON survey_parcels (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_search_vector ON survey_parcels USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_survey_parcels_search_text_trgm ON survey_parcels USING GIN (search_text gin_trgm_ops);
+
+-- Row triggers (cloned to every partition)
+CREATE TRIGGER update_survey_parcels_updated_at
+    BEFORE UPDATE ON survey_parcels
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER calculate_survey_parcel_area
+    BEFORE INSERT OR UPDATE ON survey_parcels
+    FOR EACH ROW
+    EXECUTE FUNCTION calculate_area_hectares();
+
+CREATE TRIGGER survey_parcel_enqueue_update
+    AFTER UPDATE OF geom, selected_index, index_date_start, index_date_end, index_mean
+    ON survey_parcels
+    FOR EACH ROW
+    WHEN (NEW.index_mean IS NULL)
+    EXECUTE FUNCTION survey_parcel_enqueue_updated();
+
+-- Statement triggers on the partitioned table
+CREATE TRIGGER survey_parcel_aggregates_insert
+    AFTER INSERT ON survey_parcels
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_aggregates_apply();
+
+CREATE TRIGGER survey_parcel_aggregates_update
+    AFTER UPDATE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_aggregates_apply();
+
+CREATE TRIGGER survey_parcel_aggregates_delete
+    AFTER DELETE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_aggregates_apply();
+
+CREATE TRIGGER survey_parcel_enqueue_insert
+    AFTER INSERT ON survey_parcels
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_enqueue_inserted();
+
+CREATE TRIGGER survey_data_version_bump
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON survey_parcels
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_data_version_bump();
+
+CREATE TRIGGER survey_parcel_notify_insert
+    AFTER INSERT ON survey_parcels
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_notify_changes();
+
+CREATE TRIGGER survey_parcel_notify_update
+    AFTER UPDATE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_notify_changes();
+
+CREATE TRIGGER survey_parcel_notify_delete
+    AFTER DELETE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_notify_changes();
+
+-- Replaces ON DELETE CASCADE from the enrichment queue
+CREATE OR REPLACE FUNCTION survey_parcel_dequeue_deleted()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM survey_parcel_enrichment_queue
+    WHERE parcel_id IN (SELECT id FROM old_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER survey_parcel_dequeue_delete
+    AFTER DELETE ON survey_parcels
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION survey_parcel_dequeue_deleted();
+
+DELETE FROM survey_parcel_enrichment_queue q
+WHERE NOT EXISTS (SELECT 1 FROM survey_parcels p WHERE p.id = q.parcel_id);
+
+-- Percentile view (dropped above because it depended on the old table)
+CREATE MATERIALIZED VIEW survey_parcel_percentiles AS
+SELECT
+    GROUPING(province, selected_index, crop_type, land_use) AS grouping_id,
+    coalesce(province, '') AS province,
+    coalesce(selected_index, '') AS selected_index,
+    coalesce(crop_type, '') AS crop_type,
+    coalesce(land_use, '') AS land_use,
+    count(*) AS parcel_count,
+    percentile_cont(0.1) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p10,
+    percentile_cont(0.25) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p25,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p50,
+    percentile_cont(0.75) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p75,
+    percentile_cont(0.9) WITHIN GROUP (ORDER BY index_mean) AS index_mean_p90,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY area_hectares) AS area_hectares_p50,
+    CURRENT_TIMESTAMP AS refreshed_at
+FROM (
+    SELECT coalesce(province, '') AS province, selected_index,
+           coalesce(crop_type, '') AS crop_type, coalesce(land_use, '') AS land_use,
+           index_mean, area_hectares
+    FROM survey_parcels
+) parcels
+GROUP BY CUBE (province, selected_index, crop_type, land_use);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_survey_parcel_percentiles_group
+    ON survey_parcel_percentiles (grouping_id, province, selected_index, crop_type, land_use);
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- Duplicate parcel detection
+-- Field teams often redraw the same field. Two parcels are considered
+-- duplicates when their intersection-over-union (IoU) reaches a threshold;
+-- the API finds them with the GIST index (geom && ...) and only computes
+-- intersections for the few parcels whose bounding boxes overlap.
+
+-- IoU of two polygons: area(a ∩ b) / (area(a) + area(b) - area(a ∩ b)).
+-- Planar areas in degrees are used: the ratio between two shapes a few
+-- hundred metres apart is unaffected and it avoids geography casts.
+CREATE OR REPLACE FUNCTION survey_parcel_iou(a GEOMETRY, b GEOMETRY)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT CASE WHEN overlap > 0 THEN overlap / (ST_Area(a) + ST_Area(b) - overlap) ELSE 0 END
+    FROM (SELECT ST_Area(ST_Intersection(a, b)) AS overlap) i
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+-- Upper bound of the IoU from the areas alone (the smaller shape fully
+-- inside the larger one); used to skip the intersection for pairs whose
+-- sizes are too different to ever reach the threshold.
+CREATE OR REPLACE FUNCTION survey_parcel_iou_bound(a GEOMETRY, b GEOMETRY)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT CASE WHEN greatest(area_a, area_b) > 0
+                THEN least(area_a, area_b) / greatest(area_a, area_b) ELSE 0 END
+    FROM (SELECT ST_Area(a) AS area_a, ST_Area(b) AS area_b) areas
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;